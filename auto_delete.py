@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Auto-delete scheduler for the FileStore Bot
+
+Deliveries register their messages here instead of starting one sleeping
+task each. Pending deletions live in a single heap of small tuples that is
+saved to disk, so they survive a restart. One background task drains due
+entries in batches and hands the deletions to the shared deleter; entries
+it could not finish go back on the heap.
+"""
+
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import time
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+from pyrogram import Client
+from pyrogram.errors import FloodWait
+from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from config import Config
+from deleter import MAX_ATTEMPTS, deleter
+from ratelimit import TokenBucket, api_limiter
+
+logger = logging.getLogger(__name__)
+
+DELETED_TEXT = (
+    "<b>ʏᴏᴜʀ ᴠɪᴅᴇᴏ / ꜰɪʟᴇ ɪꜱ ꜱᴜᴄᴄᴇꜱꜱꜰᴜʟʟʏ ᴅᴇʟᴇᴛᴇᴅ !!\n\n"
+    "ᴄʟɪᴄᴋ ʙᴇʟᴏᴡ ʙᴜᴛᴛᴏɴ ᴛᴏ ɢᴇᴛ ʏᴏᴜʀ ᴅᴇʟᴇᴛᴇᴅ ᴠɪᴅᴇᴏ / ꜰɪʟᴇ 👇</b>"
+)
+
+# (due_at, seq, chat_id, message_ids, notification_id, start_payload, attempts)
+Entry = Tuple[float, int, int, Tuple[int, ...], Optional[int], Optional[str], int]
+
+# Messages that could not be deleted are tried again this much later, a few times
+RETRY_DELAY = 60
+MAX_RETRIES = 5
+
+
+class AutoDeleteScheduler:
+    def __init__(self, path: str, limiter: TokenBucket, batch_size: int = 500, save_interval: float = 5):
+        self.path = path
+        self.limiter = limiter
+        self.batch_size = batch_size
+        self.save_interval = save_interval
+
+        self._heap: List[Entry] = []
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._dirty: bool = False
+        self._last_save: float = 0.0
+
+        self.client: Optional[Client] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.deleted: int = 0
+        self.failed: int = 0
+
+    async def start(self, client: Client):
+        """Load pending deletions and start the drain loop"""
+        self.client = client
+        if self._task:
+            return
+
+        entries = await asyncio.to_thread(self._load)
+        # Entries saved before retries were counted have no attempts field
+        self._heap = [
+            (due_at, next(self._seq), chat_id, tuple(message_ids), notification_id, start_payload,
+             attempts[0] if attempts else 0)
+            for due_at, chat_id, message_ids, notification_id, start_payload, *attempts in entries
+        ]
+        heapq.heapify(self._heap)
+
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Auto-delete scheduler started with {len(self._heap)} pending deletions")
+
+    async def stop(self):
+        """Stop the drain loop and save what is still pending"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        if self._dirty:
+            await self._save()
+
+    async def schedule(self, chat_id: int, message_ids: Sequence[int], delay: float,
+                       notification_id: Optional[int] = None, start_payload: Optional[str] = None):
+        """Delete messages from a chat after delay seconds
+
+        When a notification message is given it is edited into a "get file
+        again" button for the start payload once the messages are gone.
+        """
+        self._push((time.time() + delay, next(self._seq), chat_id, tuple(message_ids),
+                    notification_id, start_payload, 0))
+
+    def _push(self, entry: Entry):
+        heapq.heappush(self._heap, entry)
+        self._dirty = True
+
+        # Only an earlier deadline changes how long the loop should sleep
+        if self._heap[0] is entry:
+            self._wakeup.set()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def stats(self) -> Dict:
+        """Get scheduler statistics"""
+        return {
+            'pending': len(self._heap),
+            'next_due': self._heap[0][0] if self._heap else None,
+            'deleted': self.deleted,
+            'failed': self.failed
+        }
+
+    # Persistence
+    def _load(self) -> list:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError) as e:
+            logger.error(f"Error loading pending auto-deletes from {self.path}: {e}")
+            return []
+
+    def _write(self, entries: list):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(entries, f, separators=(",", ":"))
+        os.replace(self.path + ".tmp", self.path)
+
+    async def _save(self):
+        entries = [
+            (due_at, chat_id, message_ids, notification_id, start_payload, attempts)
+            for due_at, _, chat_id, message_ids, notification_id, start_payload, attempts in self._heap
+        ]
+        self._dirty = False
+        self._last_save = time.monotonic()
+        try:
+            await asyncio.to_thread(self._write, entries)
+        except Exception as e:
+            self._dirty = True
+            logger.error(f"Error saving pending auto-deletes: {e}")
+
+    # Drain loop
+    async def _run(self):
+        while True:
+            due = []
+            now = time.time()
+            while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+                due.append(heapq.heappop(self._heap))
+
+            if due:
+                self._dirty = True
+                try:
+                    await self._process(due)
+                except asyncio.CancelledError:
+                    # Stopped mid-drain: keep the batch for the next start. Deleting a
+                    # message or editing a notification twice is harmless, losing it is not
+                    for entry in due:
+                        heapq.heappush(self._heap, entry)
+                    raise
+                except Exception as e:
+                    logger.error(f"Error processing auto-deletes: {e}")
+                    for entry in due:
+                        self._retry(entry, entry[3])
+                continue
+
+            if self._dirty and time.monotonic() - self._last_save >= self.save_interval:
+                await self._save()
+
+            timeout = self.save_interval if self._dirty else None
+            if self._heap:
+                until_due = self._heap[0][0] - time.time()
+                timeout = until_due if timeout is None else min(timeout, until_due)
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(timeout, 0) if timeout is not None else None)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _process(self, due: List[Entry]):
+        deleted, failed = await deleter.delete(
+            self.client, ((entry[2], entry[3]) for entry in due)
+        )
+        self.deleted += deleted
+        failed_ids = {(chat_id, message_id) for chat_id, chunk in failed for message_id in chunk}
+
+        # The notification is edited only once all of an entry's messages are gone
+        for entry in due:
+            _, _, chat_id, message_ids, notification_id, start_payload, _ = entry
+            remaining = tuple(message_id for message_id in message_ids if (chat_id, message_id) in failed_ids)
+            if remaining:
+                self._retry(entry, remaining)
+            elif notification_id and start_payload:
+                await self._notify(chat_id, notification_id, start_payload)
+
+    def _retry(self, entry: Entry, message_ids: Tuple[int, ...]):
+        """Put an entry back for the messages that could not be deleted"""
+        _, _, chat_id, _, notification_id, start_payload, attempts = entry
+        if attempts >= MAX_RETRIES:
+            self.failed += len(message_ids)
+            logger.error(f"Giving up auto-deleting {len(message_ids)} messages in {chat_id} after {attempts + 1} attempts")
+            return
+        self._push((time.time() + RETRY_DELAY, next(self._seq), chat_id, message_ids,
+                    notification_id, start_payload, attempts + 1))
+
+    async def _notify(self, chat_id: int, notification_id: int, start_payload: str):
+        reload_url = f"https://t.me/{self.client.username}?start={start_payload}"
+        keyboard = InlineKeyboardMarkup([[InlineKeyboardButton("ɢᴇᴛ ғɪʟᴇ ᴀɢᴀɪɴ!", url=reload_url)]])
+        # A drain can edit hundreds of notifications, so they share the API rate limiter
+        for _ in range(MAX_ATTEMPTS):
+            await self.limiter.acquire()
+            try:
+                await self.client.edit_message_text(chat_id, notification_id, DELETED_TEXT, reply_markup=keyboard)
+                return
+            except FloodWait as e:
+                self.limiter.pause(e.value)
+            except Exception as e:
+                logger.error(f"Error updating auto-delete notification: {e}")
+                return
+
+        logger.error(f"Giving up updating auto-delete notification in {chat_id} after repeated FloodWait")
+
+
+# Global scheduler instance
+auto_delete = AutoDeleteScheduler(Config.AUTO_DELETE_PATH, api_limiter)
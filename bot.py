@@ -12,7 +12,11 @@ from pyrogram import Client, __version__
 from pyrogram.raw.all import layer
 from pyrogram.errors import SessionRevoked, Unauthorized
 from config import Config
-from database.database import Database
+from database.database import create_database
+from auto_delete import auto_delete
+from broadcast_jobs import broadcast_jobs
+from invite_links import invite_links
+from plugins.broadcast import resume_broadcasts
 
 # Configure logging
 logging.basicConfig(
@@ -33,7 +37,7 @@ class Bot(Client):
             plugins={"root": "plugins"},
             sleep_threshold=5,
         )
-        self.db = Database()
+        self.db = create_database()
 
     async def start(self):
         """Start the bot"""
@@ -45,6 +49,9 @@ class Bot(Client):
             self.id = me.id
 
             await self.db.initialize(self)
+            await auto_delete.start(self)
+            await invite_links.start(self)
+            await self.resume_broadcasts()
 
             logger.info(f"✅ Bot started as @{self.username}")
             logger.info(f"🤖 Pyrogram v{__version__} (Layer {layer}) running")
@@ -66,6 +73,9 @@ class Bot(Client):
             self.id = me.id
 
             await self.db.initialize(self)
+            await auto_delete.start(self)
+            await invite_links.start(self)
+            await self.resume_broadcasts()
 
             logger.info(f"✅ New session created for @{self.username}")
 
@@ -73,9 +83,22 @@ class Bot(Client):
             logger.error(f"❌ Failed to start bot: {e}", exc_info=True)
             await self.stop()
 
+    async def resume_broadcasts(self):
+        """Pick up broadcasts cut off by the last shutdown"""
+        await broadcast_jobs.load()
+        if Config.BROADCAST_AUTO_RESUME:
+            jobs = await resume_broadcasts(self)
+            if jobs:
+                logger.info(f"🔄 Resuming {len(jobs)} unfinished broadcasts")
+
     async def stop(self, *args):
         """Stop the bot"""
+        # Background jobs still call the API, so they stop before the client does
+        await broadcast_jobs.close()
+        await auto_delete.stop()
+        await invite_links.stop()
         await super().stop()
+        await self.db.close()
         logger.info("🛑 Bot stopped")
 
 
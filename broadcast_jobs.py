@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Checkpointed broadcast jobs for the FileStore Bot
+
+A broadcast sends to users in ascending ID order. Progress is kept as a
+low watermark (every target at or below it is finished) plus the small
+set of finished IDs above it, which only holds the sends that completed
+out of order. Jobs are saved to disk in batches, so a broadcast cut off
+by a restart continues where it stopped. Only sends finished after the
+last checkpoint (at most flush_every, or flush_interval seconds' worth)
+can be repeated.
+"""
+
+import asyncio
+import bisect
+import json
+import os
+import time
+import logging
+from typing import Dict, Iterable, List, Optional
+from config import Config
+from database.ids import SnowflakeGenerator
+
+logger = logging.getLogger(__name__)
+
+
+class BroadcastJob:
+    """One broadcast and how far it has got"""
+
+    def __init__(self, job_id: str, source_chat_id: int, source_message_id: int, mode: str,
+                 status_chat_id: int, segment: str = "reachable", days: int = 0,
+                 total: int = 0, watermark: int = 0, done: Iterable[int] = (),
+                 counts: Optional[Dict[str, int]] = None, started: Optional[float] = None):
+        self.job_id = job_id
+        self.source_chat_id = source_chat_id
+        self.source_message_id = source_message_id
+        self.mode = mode
+        self.status_chat_id = status_chat_id
+        self.segment = segment
+        self.days = days
+        self.total = total
+        self.watermark = watermark
+        self.done = set(done)
+        self.counts = counts or {'sent': 0, 'failed': 0, 'blocked': 0, 'deleted': 0}
+        self.started = started or time.time()
+
+        # Targets still ahead of the watermark, in send order (not saved)
+        self._order: List[int] = []
+        self._pos: int = 0
+
+    def remaining(self, user_ids: Iterable[int]) -> List[int]:
+        """Sorted targets that have not been handled yet"""
+        order = sorted(user_ids)
+        order = order[bisect.bisect_right(order, self.watermark):]
+        if self.done:
+            order = [uid for uid in order if uid not in self.done]
+        self._order = order
+        self._pos = 0
+        return self._order
+
+    def mark(self, user_id: int, outcome: str):
+        """Record a finished target and advance the watermark past finished ones"""
+        self.counts[outcome] = self.counts.get(outcome, 0) + 1
+        self.done.add(user_id)
+
+        order = self._order
+        while self._pos < len(order) and order[self._pos] in self.done:
+            self.watermark = order[self._pos]
+            self._pos += 1
+        # Everything at or below the watermark is implied by it
+        if self.done and min(self.done) <= self.watermark:
+            self.done = {uid for uid in self.done if uid > self.watermark}
+
+    @property
+    def processed(self) -> int:
+        return sum(self.counts.values())
+
+    def to_dict(self) -> Dict:
+        return {
+            'job_id': self.job_id,
+            'source_chat_id': self.source_chat_id,
+            'source_message_id': self.source_message_id,
+            'mode': self.mode,
+            'status_chat_id': self.status_chat_id,
+            'segment': self.segment,
+            'days': self.days,
+            'total': self.total,
+            'watermark': self.watermark,
+            'done': sorted(self.done),
+            'counts': self.counts,
+            'started': self.started
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'BroadcastJob':
+        return cls(**data)
+
+
+class BroadcastJobStore:
+    def __init__(self, path: str, flush_every: int = 200, flush_interval: float = 5):
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+
+        self.jobs: Dict[str, BroadcastJob] = {}
+        # Two broadcasts of the same message in one second still get distinct IDs
+        self.id_generator = SnowflakeGenerator(Config.SHARD_ID)
+        self._unsaved: int = 0
+        self._last_save: float = 0.0
+        self._lock = asyncio.Lock()
+        self._closed: bool = False
+
+    async def load(self):
+        """Load unfinished jobs from disk"""
+        entries = await asyncio.to_thread(self._load)
+        self.jobs = {}
+        for data in entries:
+            try:
+                job = BroadcastJob.from_dict(data)
+                self.jobs[job.job_id] = job
+            except TypeError as e:
+                logger.error(f"Skipping malformed broadcast job: {e}")
+        if self.jobs:
+            logger.info(f"Found {len(self.jobs)} unfinished broadcasts")
+
+    async def create(self, source_chat_id: int, source_message_id: int, mode: str,
+                     status_chat_id: int, segment: str = "reachable", days: int = 0) -> BroadcastJob:
+        """Register a new broadcast and save it before the first send"""
+        job_id = f"{self.id_generator.next_id()}_{source_message_id}"
+        job = BroadcastJob(job_id, source_chat_id, source_message_id, mode, status_chat_id, segment, days)
+        self.jobs[job_id] = job
+        await self.save()
+        return job
+
+    async def checkpoint(self, job: BroadcastJob, user_id: int, outcome: str):
+        """Mark a target finished; saves once enough progress has piled up"""
+        job.mark(user_id, outcome)
+        self._unsaved += 1
+        if self._unsaved >= self.flush_every or time.monotonic() - self._last_save >= self.flush_interval:
+            await self.save()
+
+    async def finish(self, job: BroadcastJob):
+        """Forget a completed broadcast"""
+        self.jobs.pop(job.job_id, None)
+        await self.save()
+
+    def pending(self) -> List[BroadcastJob]:
+        return sorted(self.jobs.values(), key=lambda job: job.started)
+
+    # Persistence
+    def _load(self) -> list:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError) as e:
+            logger.error(f"Error loading broadcast jobs from {self.path}: {e}")
+            return []
+
+    def _write(self, entries: list):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(entries, f, separators=(",", ":"))
+        os.replace(self.path + ".tmp", self.path)
+
+    async def close(self):
+        """Save a final checkpoint; later progress is not written
+
+        Sends that fail while the client shuts down must not be recorded as
+        finished, so the store stops saving before the client stops.
+        """
+        await self.save()
+        self._closed = True
+
+    async def save(self):
+        """Write every unfinished job to disk"""
+        if self._closed:
+            return
+        async with self._lock:
+            entries = [job.to_dict() for job in self.jobs.values()]
+            self._unsaved = 0
+            self._last_save = time.monotonic()
+            try:
+                await asyncio.to_thread(self._write, entries)
+            except Exception as e:
+                logger.error(f"Error saving broadcast jobs: {e}")
+
+
+# Global broadcast job store
+broadcast_jobs = BroadcastJobStore(Config.BROADCAST_JOBS_PATH)
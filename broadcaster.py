@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Concurrent broadcast engine for the FileStore Bot
+
+Several senders share the global API rate limiter. The number of sends
+in flight adapts AIMD-style: it is halved on a FloodWait and grows
+back by one after each run of clean sends.
+"""
+
+import asyncio
+import time
+import logging
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Tuple
+from pyrogram.errors import FloodWait, UserIsBlocked, InputUserDeactivated, PeerIdInvalid
+from pyrogram.types import Message
+from config import Config
+from ratelimit import TokenBucket, api_limiter
+
+logger = logging.getLogger(__name__)
+
+# Attempts per user when Telegram keeps answering with FloodWait
+MAX_ATTEMPTS = 3
+
+
+class AdaptiveConcurrency:
+    """Semaphore whose limit can shrink and grow while it is in use"""
+
+    def __init__(self, initial: int, maximum: int, minimum: int = 1):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = max(minimum, min(initial, maximum))
+        self._active = 0
+        self._successes = 0
+        self._backoff_until = 0.0
+        self._changed = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._changed:
+            await self._changed.wait_for(lambda: self._active < self.limit)
+            self._active += 1
+
+    async def release(self):
+        async with self._changed:
+            self._active -= 1
+            self._changed.notify_all()
+
+    async def on_success(self):
+        # Additive increase: one more slot after `limit` clean sends in a row
+        self._successes += 1
+        if self._successes >= self.limit and self.limit < self.maximum:
+            self._successes = 0
+            async with self._changed:
+                self.limit += 1
+                self._changed.notify_all()
+
+    def on_flood(self, wait: float):
+        # Multiplicative decrease, once per FloodWait: sends already in flight
+        # usually hit the same limit and must not halve the window again
+        self._successes = 0
+        now = time.monotonic()
+        if now >= self._backoff_until:
+            self._backoff_until = now + wait
+            self.limit = max(self.minimum, self.limit // 2)
+
+
+class Broadcaster:
+    def __init__(self, limiter: TokenBucket, max_senders: int = 20):
+        self.limiter = limiter
+        self.max_senders = max_senders
+
+    async def run(self, user_ids: Iterable[int], send: Callable[[int], Awaitable[Optional[Message]]],
+                  progress: Optional[Callable[[Dict], Awaitable]] = None,
+                  on_done: Optional[Callable[[int, str, Optional[Message]], Awaitable]] = None) -> Dict:
+        """Call send(user_id) for every user and return the result counts
+
+        send does the actual API work for one user and returns the sent
+        message. on_done(user_id, outcome, message) is awaited as each user
+        finishes, e.g. to checkpoint the broadcast, and then progress(stats)
+        with the running counts; progress is expected to throttle itself
+        (see progress.ProgressReporter).
+        """
+        user_ids = list(user_ids)
+        stats = {
+            'total': len(user_ids),
+            'done': 0,
+            'sent': 0,
+            'failed': 0,
+            'blocked': 0,
+            'deleted': 0,
+            'flood_waits': 0,
+            'concurrency': 0,
+            'started': time.time(),
+        }
+        concurrency = AdaptiveConcurrency(self.max_senders // 2 or 1, self.max_senders)
+        pending = iter(user_ids)
+
+        async def sender():
+            for user_id in pending:
+                await concurrency.acquire()
+                try:
+                    result = await self._send_one(send, user_id, concurrency, stats)
+                finally:
+                    await concurrency.release()
+
+                stats[result[0]] += 1
+                stats['done'] += 1
+                if on_done:
+                    await on_done(user_id, *result)
+                if progress:
+                    stats['concurrency'] = concurrency.limit
+                    await progress(stats)
+
+        await asyncio.gather(*(sender() for _ in range(min(self.max_senders, len(user_ids)))))
+
+        stats['concurrency'] = concurrency.limit
+        stats['elapsed'] = time.time() - stats['started']
+        return stats
+
+    async def _send_one(self, send, user_id: int, concurrency: AdaptiveConcurrency,
+                        stats: Dict) -> Tuple[str, Optional[Message]]:
+        for _ in range(MAX_ATTEMPTS):
+            await self.limiter.acquire()
+            try:
+                sent_msg = await send(user_id)
+                await concurrency.on_success()
+                return 'sent', sent_msg
+            except FloodWait as e:
+                stats['flood_waits'] += 1
+                concurrency.on_flood(e.value)
+                self.limiter.pause(e.value)
+            except UserIsBlocked:
+                return 'blocked', None
+            except (InputUserDeactivated, PeerIdInvalid):
+                return 'deleted', None
+            except Exception as e:
+                logger.error(f"Error broadcasting to {user_id}: {e}")
+                return 'failed', None
+
+        return 'failed', None
+
+
+# Global broadcaster instance
+broadcaster = Broadcaster(api_limiter, Config.BROADCAST_WORKERS)
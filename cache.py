@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+In-process caches for the FileStore Bot
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Size-bounded LRU cache whose entries also expire after a TTL"""
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (expires_at, value)
+
+        # Metrics
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return a cached value, refreshing its LRU position"""
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING:
+            self.misses += 1
+            return default
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Store a value, evicting the least recently used entry if full"""
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove a key and return its value if still cached"""
+        entry = self._data.pop(key, _MISSING)
+        if entry is _MISSING:
+            return default
+        return entry[1]
+
+    def clear(self):
+        """Drop every entry"""
+        self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._data.get(key, _MISSING)
+        return entry is not _MISSING and entry[0] > time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict:
+        """Get cache statistics"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': (self.hits / lookups * 100) if lookups else 0.0
+        }
+
+
+class LoadingCache(TTLCache):
+    """TTLCache that loads missing keys itself
+
+    Concurrent misses are coalesced: while a key is being loaded, other
+    callers wait for that load instead of starting their own.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 300):
+        super().__init__(maxsize, ttl)
+        self._pending: Dict[Hashable, asyncio.Future] = {}
+        self.coalesced: int = 0
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached value for a key, loading it on a miss"""
+        async def load_one(keys):
+            return [await loader()]
+        return (await self.load_many([key], load_one))[0]
+
+    async def load_many(self, keys: List[Hashable],
+                        loader: Callable[[List[Hashable]], Awaitable[List[Any]]]) -> List[Any]:
+        """Return values for keys, loading every missing one with a single loader call
+
+        The loader receives the missing keys and returns their values in the
+        same order. None values are returned but not cached.
+        """
+        results: Dict[Hashable, Any] = {}
+        waiting: Dict[Hashable, asyncio.Future] = {}
+        missing: Dict[Hashable, asyncio.Future] = {}
+
+        for key in keys:
+            if key in results or key in waiting or key in missing:
+                continue
+            value = self.get(key, _MISSING)
+            if value is not _MISSING:
+                results[key] = value
+            elif key in self._pending:
+                waiting[key] = self._pending[key]
+                self.coalesced += 1
+            else:
+                missing[key] = asyncio.get_running_loop().create_future()
+
+        if missing:
+            self._pending.update(missing)
+            try:
+                values = await loader(list(missing))
+            except BaseException as e:
+                for key, future in missing.items():
+                    self._pending.pop(key, None)
+                    if isinstance(e, asyncio.CancelledError):
+                        future.cancel()
+                    else:
+                        future.set_exception(e)
+                        future.exception()  # mark retrieved when nobody else waits
+                raise
+
+            for i, (key, future) in enumerate(missing.items()):
+                value = values[i] if i < len(values) else None
+                self._pending.pop(key, None)
+                if value is not None:
+                    self.set(key, value)
+                future.set_result(value)
+                results[key] = value
+
+        for key, future in waiting.items():
+            # Shielded so a cancelled waiter does not cancel the shared load
+            results[key] = await asyncio.shield(future)
+
+        return [results[key] for key in keys]
+
+    def stats(self) -> Dict:
+        """Get cache statistics, including coalesced misses"""
+        stats = super().stats()
+        stats['coalesced'] = self.coalesced
+        stats['loading'] = len(self._pending)
+        return stats
+
+
+class MembershipCache(TTLCache):
+    """Cache of yes/no membership answers with separate TTLs for each
+
+    Positive answers change rarely and can live long; negative ones are
+    kept short so a user who joins is not turned away for long. Events
+    that change membership invalidate entries, which also wakes callers
+    waiting for that change.
+    """
+
+    def __init__(self, maxsize: int = 50000, positive_ttl: float = 600, negative_ttl: float = 30):
+        super().__init__(maxsize, positive_ttl)
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        # key -> [event, number of callers waiting on it]
+        self._waiters: Dict[Hashable, list] = {}
+
+        # Metrics
+        self.positive_hits: int = 0
+        self.negative_hits: int = 0
+        self.invalidations: int = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        value = super().get(key, _MISSING)
+        if value is _MISSING:
+            return default
+        if value:
+            self.positive_hits += 1
+        else:
+            self.negative_hits += 1
+        return value
+
+    def set(self, key: Hashable, value: bool, ttl: Optional[float] = None):
+        if ttl is None:
+            ttl = self.positive_ttl if value else self.negative_ttl
+        super().set(key, value, ttl)
+
+    def invalidate(self, key: Hashable, value: Optional[bool] = None):
+        """Drop an entry (or replace it with a known answer) and wake its waiters"""
+        self.invalidations += 1
+        if value is None:
+            self.pop(key)
+        else:
+            self.set(key, value)
+
+        waiter = self._waiters.pop(key, None)
+        if waiter:
+            waiter[0].set()
+
+    async def wait_invalidated(self, key: Hashable, timeout: float) -> bool:
+        """Wait up to timeout seconds for the key to be invalidated"""
+        waiter = self._waiters.setdefault(key, [asyncio.Event(), 0])
+        waiter[1] += 1
+        try:
+            await asyncio.wait_for(waiter[0].wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            waiter[1] -= 1
+            # The last caller to give up removes an event that was never set
+            if not waiter[1] and self._waiters.get(key) is waiter:
+                del self._waiters[key]
+
+    def stats(self) -> Dict:
+        stats = super().stats()
+        stats.update({
+            'positive_hits': self.positive_hits,
+            'negative_hits': self.negative_hits,
+            'invalidations': self.invalidations
+        })
+        return stats
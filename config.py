@@ -32,9 +32,25 @@ class Config:
         "Hello {mention}\n\n"
         "I can store private files in a specified Channel and other users can access them from a special link.\n\n"
         "Send me any file to get started!")
+    FORCE_SUB_MESSAGE = os.getenv("FORCE_SUB_MESSAGE",
+        "Hello {mention}\n\n"
+        "You need to join the channels below to use me. Join them and tap Try Again.")
+    COMMANDS_MESSAGE = os.getenv("COMMANDS_MESSAGE",
+        "<b>Commands</b>\n\n"
+        "/start - start the bot or open a link\n"
+        "/commands - show this message")
+    BAN_SUPPORT = os.getenv("BAN_SUPPORT", f"tg://user?id={OWNER_ID}")  # contact button shown to banned users
+    
+    # Legacy channel-post links; CUSTOM_CAPTION takes {previouscaption} and {filename}
+    CUSTOM_CAPTION = os.getenv("CUSTOM_CAPTION", "")
+    DISABLE_CHANNEL_BUTTON = os.getenv("DISABLE_CHANNEL_BUTTON", "False").lower() == "true"
     
     PROTECT_CONTENT = os.getenv("PROTECT_CONTENT", "False").lower() == "true"
     
+    # Caption every batch file with its position, name and size. This copies the
+    # files one by one; when off, batches are forwarded in bulk with the author hidden
+    BATCH_FILE_CAPTIONS = os.getenv("BATCH_FILE_CAPTIONS", "False").lower() == "true"
+    
     # Force subscription configuration
     FORCE_SUB_CHANNELS = []
     force_sub = os.getenv("FORCE_SUB_CHANNELS", "")
@@ -44,6 +60,55 @@ class Config:
     # Auto delete configuration (in seconds)
     AUTO_DELETE_TIME = int(os.getenv("AUTO_DELETE_TIME", "600"))  # 10 minutes default
     
+    # Storage backend configuration ("memory", "journal", "sqlite" or "mongo")
+    DATABASE_BACKEND = os.getenv("DATABASE_BACKEND", "memory").lower()
+    SHARD_ID = int(os.getenv("SHARD_ID", "0"))  # 0-1023, unique per bot process sharing a store
+    DATA_DIR = os.getenv("DATA_DIR", "data")
+    SQLITE_PATH = os.getenv("SQLITE_PATH", os.path.join(DATA_DIR, "filestore.db"))
+    SQLITE_FLUSH_INTERVAL = float(os.getenv("SQLITE_FLUSH_INTERVAL", "0.05"))  # seconds between group commits
+    JOURNAL_DIR = os.getenv("JOURNAL_DIR", os.path.join(DATA_DIR, "journal"))
+    SNAPSHOT_INTERVAL = int(os.getenv("SNAPSHOT_INTERVAL", "3600"))  # seconds between journal snapshots
+    SNAPSHOT_OPS = int(os.getenv("SNAPSHOT_OPS", "500000"))  # or after this many logged operations
+    MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+    MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "filestore")
+    AUTO_DELETE_PATH = os.getenv("AUTO_DELETE_PATH", os.path.join(DATA_DIR, "auto_delete.json"))  # pending deletions
+    INVITE_LINKS_PATH = os.getenv("INVITE_LINKS_PATH", os.path.join(DATA_DIR, "invite_links.json"))  # pooled force-sub links
+    BROADCAST_JOBS_PATH = os.getenv("BROADCAST_JOBS_PATH", os.path.join(DATA_DIR, "broadcasts.json"))  # unfinished broadcasts
+    
+    # Read cache in front of the MongoDB backend
+    CACHE_SIZE = int(os.getenv("CACHE_SIZE", "10000"))
+    CACHE_TTL = int(os.getenv("CACHE_TTL", "300"))  # seconds
+    
+    # Bulk API work (deletions, broadcasts) shares one rate limiter
+    API_RATE_LIMIT = float(os.getenv("API_RATE_LIMIT", "25"))  # calls per second
+    API_BURST = float(os.getenv("API_BURST", "25"))
+    DELETE_WORKERS = int(os.getenv("DELETE_WORKERS", "8"))
+    BROADCAST_WORKERS = int(os.getenv("BROADCAST_WORKERS", "20"))  # most sends in flight
+    BROADCAST_AUTO_RESUME = os.getenv("BROADCAST_AUTO_RESUME", "True").lower() == "true"  # continue unfinished broadcasts on start
+    PROGRESS_INTERVAL = float(os.getenv("PROGRESS_INTERVAL", "5"))  # seconds between status message edits
+    DEAD_PEER_THRESHOLD = int(os.getenv("DEAD_PEER_THRESHOLD", "1"))  # consecutive blocked/deleted results before a user is skipped
+    
+    # Force-sub membership checks (positive answers live longer than negative ones)
+    MEMBERSHIP_CACHE_SIZE = int(os.getenv("MEMBERSHIP_CACHE_SIZE", "50000"))
+    MEMBERSHIP_TTL = int(os.getenv("MEMBERSHIP_TTL", "600"))  # seconds
+    MEMBERSHIP_NEGATIVE_TTL = int(os.getenv("MEMBERSHIP_NEGATIVE_TTL", "30"))  # seconds
+    FSUB_CHECK_TIMEOUT = float(os.getenv("FSUB_CHECK_TIMEOUT", "5"))  # deadline for all channels of one /start
+    FSUB_CHECK_CONCURRENCY = int(os.getenv("FSUB_CHECK_CONCURRENCY", "20"))  # lookups in flight across users
+    FSUB_LINK_EXPIRY = int(os.getenv("FSUB_LINK_EXPIRY", "0"))  # seconds an invite link stays valid, 0 = forever
+    INVITE_POOL_SIZE = int(os.getenv("INVITE_POOL_SIZE", "3"))  # pooled invite links per channel and mode
+    
+    # Force-sub channel metadata (title, username) for prompts and /listchnl
+    CHAT_CACHE_SIZE = int(os.getenv("CHAT_CACHE_SIZE", "1000"))
+    CHAT_CACHE_TTL = int(os.getenv("CHAT_CACHE_TTL", "3600"))  # seconds
+    
+    # Storage-channel messages, shared by every handler that resolves a post
+    MESSAGE_CACHE_SIZE = int(os.getenv("MESSAGE_CACHE_SIZE", "5000"))
+    MESSAGE_CACHE_TTL = int(os.getenv("MESSAGE_CACHE_TTL", "600"))  # seconds
+    
+    # Resolved media of range batches, shared across users
+    RANGE_CACHE_SIZE = int(os.getenv("RANGE_CACHE_SIZE", "256"))  # ranges
+    MAX_BATCH_RANGE = int(os.getenv("MAX_BATCH_RANGE", "1000"))  # messages in one /batch link
+    
     # Bot settings
     MAX_FILE_SIZE = 2000 * 1024 * 1024  # 2GB
     
@@ -5,31 +5,63 @@ In-memory database for the FileStore Bot
 """
 
 import asyncio
+import heapq
 import time
-from typing import Dict, List, Set, Optional
+from typing import Awaitable, Callable, Dict, Iterable, List, Set, Optional, Tuple
 from pyrogram import Client
 from pyrogram.types import Message
+from database.records import FileRecord, BatchRecord
+from database.ids import SnowflakeGenerator
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Expired records removed per event-loop slice during cleanup
+REAP_SLICE = 500
+
+# User segments understood by get_segment
+SEGMENTS = ("all", "reachable", "active", "inactive", "banned", "dead")
+
+def current_day(now: Optional[float] = None) -> int:
+    """Days since the epoch, the unit user activity is tracked in"""
+    return int((now or time.time()) // 86400)
+
 class Database:
     def __init__(self):
         # User data
         self.users: Set[int] = set()
         self.banned_users: Set[int] = set()
         self.admins: Set[int] = set()
+        # Users broadcasts can no longer reach: user_id -> (consecutive failures, last failure, reason)
+        self.dead_peers: Dict[int, Tuple[int, float, str]] = {}
+        self.dead_peer_threshold: int = 1
+        
+        # User activity: user_id -> last active day, and day -> users last active on it.
+        # Every user sits in exactly one bucket, so "active in the last N days" is a
+        # union of N sets rather than a scan over all users.
+        self.last_active: Dict[int, int] = {}
+        self.active_days: Dict[int, Set[int]] = {}
         
         # File storage
-        self.files: Dict[str, Dict] = {}  # file_id -> file_data
-        self.user_files: Dict[int, List[str]] = {}  # user_id -> [file_ids]
+        self.files: Dict[str, FileRecord] = {}  # file_id -> file_data
+        self.user_files: Dict[int, Dict[str, None]] = {}  # user_id -> {file_id: None}, insertion ordered
+        self.file_hashes: Dict[str, str] = {}  # file_unique_id -> file_id
+        self.file_locations: Dict[Tuple, str] = {}  # (channel_id, message_id) -> file_id
         
         # Batch storage
-        self.batches: Dict[str, Dict] = {}  # batch_id -> batch_data
+        self.batches: Dict[str, BatchRecord] = {}  # batch_id -> batch_data
+        self.batch_ranges: Dict[Tuple, str] = {}  # (channel_id, first_message_id, last_message_id) -> batch_id
+        
+        # Expiry indexes: min-heaps of (created_at, record_id). The TTL is global,
+        # so ordering by created_at stays valid when the auto delete time changes.
+        self._file_expiry: List[Tuple[float, str]] = []
+        self._batch_expiry: List[Tuple[float, str]] = []
         
         # Force subscription channels
         self.force_sub_channels: Set[int] = set()
         self.force_sub_enabled: bool = True
+        self.channel_modes: Dict[int, str] = {}  # channel_id -> "on" for join-request channels
+        self.join_requests: Dict[int, Set[int]] = {}  # channel_id -> users with a pending request
         
         # Auto delete settings
         self.auto_delete_time: int = 600  # 10 minutes default
@@ -39,6 +71,11 @@ class Database:
         self.start_time: float = time.time()
         self.total_files: int = 0
         self.total_batches: int = 0
+        self.dedup_hits: int = 0
+        self.dedup_misses: int = 0
+        
+        # Record ID generator (shard is set from config on initialize)
+        self.id_generator = SnowflakeGenerator()
         
         # Bot instance
         self.bot: Optional[Client] = None
@@ -52,21 +89,28 @@ class Database:
         self.admins.update(Config.ADMINS)
         self.force_sub_channels.update(Config.FORCE_SUB_CHANNELS)
         self.auto_delete_time = Config.AUTO_DELETE_TIME
+        self.dead_peer_threshold = Config.DEAD_PEER_THRESHOLD
+        self.id_generator.shard_id = Config.SHARD_ID
         
         logger.info(f"Database initialized with {len(self.admins)} admins")
     
+    async def close(self):
+        """Release backend resources (nothing to do for the in-memory store)"""
+        pass
+    
     # User management
     async def add_user(self, user_id: int):
         """Add user to database"""
         self.users.add(user_id)
         if user_id not in self.user_files:
-            self.user_files[user_id] = []
+            self.user_files[user_id] = {}
     
     async def remove_user(self, user_id: int):
         """Remove user from database"""
         self.users.discard(user_id)
         if user_id in self.user_files:
             del self.user_files[user_id]
+        self._set_last_active(user_id, None)
     
     async def get_all_users(self) -> List[int]:
         """Get all users"""
@@ -80,6 +124,65 @@ class Database:
         """Check if user exists"""
         return user_id in self.users
     
+    # Activity and segments
+    async def touch_user(self, user_id: int, day: Optional[int] = None) -> bool:
+        """Mark a user active today; returns False if they already were"""
+        day = day if day is not None else current_day()
+        if self.last_active.get(user_id) == day:
+            return False
+        self._set_last_active(user_id, day)
+        return True
+    
+    def _set_last_active(self, user_id: int, day: Optional[int]):
+        previous = self.last_active.pop(user_id, None)
+        if previous is not None:
+            bucket = self.active_days[previous]
+            bucket.discard(user_id)
+            if not bucket:
+                del self.active_days[previous]
+        if day is not None:
+            self.last_active[user_id] = day
+            self.active_days.setdefault(day, set()).add(user_id)
+    
+    async def get_active_users(self, days: int) -> Set[int]:
+        """Users active within the last `days` days (today counts as one)"""
+        today = current_day()
+        return set().union(*(
+            self.active_days[day] for day in range(today - days + 1, today + 1)
+            if day in self.active_days
+        ))
+    
+    def _unreachable(self):
+        if self.dead_peer_threshold <= 1:
+            return self.dead_peers  # iterates the keys; no copy
+        return [
+            user_id for user_id, (count, _, _) in self.dead_peers.items()
+            if count >= self.dead_peer_threshold
+        ]
+    
+    async def get_segment(self, segment: str = "reachable", days: int = 30) -> Set[int]:
+        """Get the users of a segment as a new set
+        
+        reachable: not banned and not a dead peer
+        active / inactive: reachable users seen / not seen in the last `days` days
+        """
+        if segment == "all":
+            return set(self.users)
+        if segment == "banned":
+            return self.users.intersection(self.banned_users)
+        if segment == "dead":
+            return self.users.intersection(self._unreachable())
+        if segment == "reachable":
+            return self.users.difference(self.banned_users, self._unreachable())
+        if segment == "active":
+            active = await self.get_active_users(days)
+            active.intersection_update(self.users)
+            return active.difference(self.banned_users, self._unreachable())
+        if segment == "inactive":
+            active = await self.get_active_users(days)
+            return self.users.difference(active, self.banned_users, self._unreachable())
+        raise ValueError(f"Unknown segment: {segment}")
+    
     # Ban management
     async def ban_user(self, user_id: int):
         """Ban a user"""
@@ -97,6 +200,43 @@ class Database:
         """Get all banned users"""
         return list(self.banned_users)
     
+    # Dead peers
+    async def record_dead_peers(self, failures: Dict[int, str], at: Optional[float] = None):
+        """Count a terminal delivery failure (blocked, deleted account...) per user"""
+        self._mark_dead_peers(failures, at or time.time())
+    
+    def _mark_dead_peers(self, failures: Dict[int, str], at: float):
+        for user_id, reason in failures.items():
+            count = self.dead_peers[user_id][0] if user_id in self.dead_peers else 0
+            self.dead_peers[user_id] = (count + 1, at, reason)
+    
+    async def clear_dead_peers(self, user_ids: Iterable[int]) -> List[int]:
+        """Forget the failures of users that were reached again"""
+        cleared = [user_id for user_id in user_ids if user_id in self.dead_peers]
+        for user_id in cleared:
+            del self.dead_peers[user_id]
+        return cleared
+    
+    async def get_dead_peers(self, min_failures: int = 1) -> Set[int]:
+        """Get users with at least min_failures consecutive terminal failures"""
+        return {
+            user_id for user_id, (count, _, _) in self.dead_peers.items()
+            if count >= min_failures
+        }
+    
+    async def get_dead_peer_stats(self) -> Dict:
+        """Break the dead-peer index down by reason and age"""
+        reasons: Dict[str, int] = {}
+        oldest = None
+        for count, last_failed, reason in self.dead_peers.values():
+            reasons[reason] = reasons.get(reason, 0) + 1
+            oldest = last_failed if oldest is None else min(oldest, last_failed)
+        return {
+            'total': len(self.dead_peers),
+            'reasons': reasons,
+            'oldest_failure': oldest
+        }
+    
     # Admin management
     async def add_admin(self, user_id: int):
         """Add admin"""
@@ -116,47 +256,121 @@ class Database:
     
     # File management
     async def save_file(self, file_id: str, file_data: Dict) -> str:
-        """Save file and return unique ID"""
-        unique_id = f"file_{int(time.time())}_{len(self.files)}"
+        """Save file and return unique ID
         
-        self.files[unique_id] = {
-            **file_data,
-            'created_at': time.time(),
-            'access_count': 0
-        }
+        Saving a channel post that is already stored returns the existing ID
+        instead of creating a second record.
+        """
+        existing = self.file_locations.get((file_data.get('channel_id'), file_data.get('message_id')))
+        if existing is not None:
+            return existing
         
-        # Add to user files
-        user_id = file_data.get('user_id')
-        if user_id:
-            if user_id not in self.user_files:
-                self.user_files[user_id] = []
-            self.user_files[user_id].append(unique_id)
+        unique_id = f"file_{self.id_generator.next_id()}"
+        
+        record = FileRecord.from_dict(file_data)
+        record.created_at = time.time()
+        record.access_count = 0
+        self._store_file(unique_id, record)
         
         self.total_files += 1
         return unique_id
     
-    async def get_file(self, file_id: str) -> Optional[Dict]:
+    async def save_files_many(self, files: List[Dict]) -> List[str]:
+        """Save several files and return their unique IDs in the same order
+        
+        Backends override this when they can write a whole batch in one round
+        trip; the write-behind backends already group these saves themselves.
+        """
+        return [await self.save_file("", file_data) for file_data in files]
+    
+    def _store_file(self, unique_id: str, file_data: FileRecord):
+        """Insert a file record and update the per-user and expiry indexes"""
+        self.files[unique_id] = file_data
+        self._push_expiry(self._file_expiry, self.files, file_data.created_at, unique_id)
+        
+        # Add to user files
+        user_id = file_data.user_id
+        if user_id:
+            if user_id not in self.user_files:
+                self.user_files[user_id] = {}
+            self.user_files[user_id][unique_id] = None
+        
+        # Content index for deduplication
+        if file_data.file_hash:
+            self.file_hashes.setdefault(file_data.file_hash, unique_id)
+        
+        # Post index for idempotent link generation
+        if file_data.message_id is not None:
+            self.file_locations.setdefault((file_data.channel_id, file_data.message_id), unique_id)
+    
+    async def find_file_by_hash(self, file_hash: Optional[str]) -> Optional[Tuple[str, FileRecord]]:
+        """Find a stored file with the same Telegram file_unique_id"""
+        if not file_hash:
+            return None
+        
+        file_id = self.file_hashes.get(file_hash)
+        if file_id is None or file_id not in self.files:
+            self.dedup_misses += 1
+            return None
+        
+        self.dedup_hits += 1
+        return file_id, self.files[file_id]
+    
+    async def find_file_by_location(self, channel_id, message_id: int) -> Optional[Tuple[str, FileRecord]]:
+        """Find the stored file for a channel post"""
+        file_id = self.file_locations.get((channel_id, message_id))
+        if file_id is None or file_id not in self.files:
+            return None
+        return file_id, self.files[file_id]
+    
+    async def find_files_by_locations(self, channel_id,
+                                      message_ids: Iterable[int]) -> Dict[int, Tuple[str, FileRecord]]:
+        """Find the stored files for several posts of one channel, keyed by message ID"""
+        found = {}
+        for message_id in message_ids:
+            file_id = self.file_locations.get((channel_id, message_id))
+            if file_id is not None and file_id in self.files:
+                found[message_id] = (file_id, self.files[file_id])
+        return found
+    
+    async def get_file(self, file_id: str) -> Optional[FileRecord]:
         """Get file by ID"""
         file_data = self.files.get(file_id)
         if file_data:
             # Increment access count
-            file_data['access_count'] += 1
+            file_data.access_count += 1
         return file_data
     
+    async def update_file_media(self, file_id: str, media_file_id: str):
+        """Replace the stored Telegram file_id of a file"""
+        file_data = self.files.get(file_id)
+        if file_data:
+            file_data.media_file_id = media_file_id
+    
     async def delete_file(self, file_id: str):
         """Delete file"""
+        self._drop_file(file_id)
+    
+    def _drop_file(self, file_id: str):
+        """Remove a file record and its per-user index entry"""
         if file_id in self.files:
             file_data = self.files[file_id]
-            user_id = file_data.get('user_id')
+            user_id = file_data.user_id
             
             # Remove from user files
             if user_id and user_id in self.user_files:
-                if file_id in self.user_files[user_id]:
-                    self.user_files[user_id].remove(file_id)
+                self.user_files[user_id].pop(file_id, None)
+            
+            if self.file_hashes.get(file_data.file_hash) == file_id:
+                del self.file_hashes[file_data.file_hash]
+            
+            location = (file_data.channel_id, file_data.message_id)
+            if self.file_locations.get(location) == file_id:
+                del self.file_locations[location]
             
             del self.files[file_id]
     
-    async def get_user_files(self, user_id: int) -> List[Dict]:
+    async def get_user_files(self, user_id: int) -> List[FileRecord]:
         """Get all files for a user"""
         if user_id not in self.user_files:
             return []
@@ -164,32 +378,77 @@ class Database:
         user_file_ids = self.user_files[user_id]
         return [self.files[fid] for fid in user_file_ids if fid in self.files]
     
+    async def iter_user_files(self, user_id: int, after: Optional[Tuple[float, str]] = None,
+                              limit: int = 10) -> Tuple[List[Tuple[str, FileRecord]], Optional[Tuple[float, str]]]:
+        """Get one page of a user's files, newest first
+        
+        `after` is the cursor returned by the previous page, a (created_at, file_id)
+        pair. Returns the page and the cursor for the next one.
+        """
+        candidates = (
+            (self.files[fid].created_at, fid)
+            for fid in self.user_files.get(user_id, ())
+            if fid in self.files and (after is None or (self.files[fid].created_at, fid) < after)
+        )
+        # Bounded heap selection: the user's history is never materialized
+        page = heapq.nlargest(limit + 1, candidates)
+        
+        next_cursor = page[limit - 1] if len(page) > limit else None
+        return [(fid, self.files[fid]) for _, fid in page[:limit]], next_cursor
+    
     # Batch management
     async def save_batch(self, batch_id: str, batch_data: Dict) -> str:
         """Save batch"""
-        unique_id = f"batch_{int(time.time())}_{len(self.batches)}"
+        unique_id = f"batch_{self.id_generator.next_id()}"
         
-        self.batches[unique_id] = {
-            **batch_data,
-            'created_at': time.time(),
-            'access_count': 0
-        }
+        record = BatchRecord.from_dict(batch_data)
+        record.created_at = time.time()
+        record.access_count = 0
+        self._store_batch(unique_id, record)
         
         self.total_batches += 1
         return unique_id
     
-    async def get_batch(self, batch_id: str) -> Optional[Dict]:
+    def _store_batch(self, unique_id: str, batch_data: BatchRecord):
+        """Insert a batch record and update the expiry index"""
+        self.batches[unique_id] = batch_data
+        self._push_expiry(self._batch_expiry, self.batches, batch_data.created_at, unique_id)
+        
+        # Range index for idempotent /batch links
+        if batch_data.batch_type == 'range':
+            self.batch_ranges.setdefault(self._range_key(batch_data), unique_id)
+    
+    @staticmethod
+    def _range_key(batch_data: BatchRecord) -> Tuple:
+        return (batch_data.channel_id, batch_data.first_message_id, batch_data.last_message_id)
+    
+    async def find_range_batch(self, channel_id, first_message_id: int,
+                               last_message_id: int) -> Optional[Tuple[str, BatchRecord]]:
+        """Find the stored range batch for a message ID range"""
+        batch_id = self.batch_ranges.get((channel_id, first_message_id, last_message_id))
+        if batch_id is None or batch_id not in self.batches:
+            return None
+        return batch_id, self.batches[batch_id]
+    
+    async def get_batch(self, batch_id: str) -> Optional[BatchRecord]:
         """Get batch by ID"""
         batch_data = self.batches.get(batch_id)
         if batch_data:
             # Increment access count
-            batch_data['access_count'] += 1
+            batch_data.access_count += 1
         return batch_data
     
     async def delete_batch(self, batch_id: str):
         """Delete batch"""
-        if batch_id in self.batches:
-            del self.batches[batch_id]
+        self._drop_batch(batch_id)
+    
+    def _drop_batch(self, batch_id: str):
+        """Remove a batch record and its range index entry"""
+        batch_data = self.batches.pop(batch_id, None)
+        if batch_data is not None and batch_data.batch_type == 'range':
+            key = self._range_key(batch_data)
+            if self.batch_ranges.get(key) == batch_id:
+                del self.batch_ranges[key]
     
     # Force subscription management
     async def add_force_sub_channel(self, channel_id: int):
@@ -212,6 +471,41 @@ class Database:
         """Check if force subscription is enabled"""
         return self.force_sub_enabled
     
+    async def set_channel_mode(self, channel_id: int, mode: str):
+        """Set a channel's join mode; "on" means a join request counts as joined"""
+        self._set_channel_mode(channel_id, mode)
+    
+    def _set_channel_mode(self, channel_id: int, mode: str):
+        """Store the mode; pending requests only matter while it is on"""
+        if mode == "on":
+            self.channel_modes[channel_id] = mode
+        else:
+            self.channel_modes.pop(channel_id, None)
+            self.join_requests.pop(channel_id, None)
+    
+    async def get_channel_mode(self, channel_id: int) -> str:
+        """Get a channel's join mode, "off" unless it was switched on"""
+        return self.channel_modes.get(channel_id, "off")
+    
+    async def req_user(self, channel_id: int, user_id: int):
+        """Record a pending join request"""
+        self.join_requests.setdefault(channel_id, set()).add(user_id)
+    
+    async def del_req_user(self, channel_id: int, user_id: int):
+        """Forget a join request once it was approved, declined or withdrawn"""
+        self._drop_join_request(channel_id, user_id)
+    
+    def _drop_join_request(self, channel_id: int, user_id: int):
+        requests = self.join_requests.get(channel_id)
+        if requests is not None:
+            requests.discard(user_id)
+            if not requests:
+                del self.join_requests[channel_id]
+    
+    async def req_user_exist(self, channel_id: int, user_id: int) -> bool:
+        """Check if the user has a pending join request"""
+        return user_id in self.join_requests.get(channel_id, ())
+    
     # Auto delete management
     async def set_auto_delete_time(self, seconds: int):
         """Set auto delete time"""
@@ -237,6 +531,7 @@ class Database:
         return {
             'total_users': len(self.users),
             'total_banned': len(self.banned_users),
+            'total_dead_peers': len(self.dead_peers),
             'total_admins': len(self.admins),
             'total_files': self.total_files,
             'total_batches': self.total_batches,
@@ -246,45 +541,57 @@ class Database:
             'force_sub_channels': len(self.force_sub_channels),
             'force_sub_enabled': self.force_sub_enabled,
             'auto_delete_time': self.auto_delete_time,
-            'auto_delete_enabled': self.auto_delete_enabled
+            'auto_delete_enabled': self.auto_delete_enabled,
+            'dedup_hits': self.dedup_hits,
+            'dedup_misses': self.dedup_misses
         }
     
     # Cleanup tasks
+    @staticmethod
+    def _push_expiry(heap: List[Tuple[float, str]], records: Dict, created_at: float, record_id: str):
+        """Add a record to an expiry heap, rebuilding it once stale entries dominate"""
+        heapq.heappush(heap, (created_at, record_id))
+        
+        # Deleted records leave stale entries behind until they come due
+        if len(heap) > 2 * len(records) + 1024:
+            heap[:] = [(data.created_at, rid) for rid, data in records.items()]
+            heapq.heapify(heap)
+    
+    async def _reap_expired(self, heap: List[Tuple[float, str]], records: Dict,
+                            delete: Callable[[str], Awaitable]) -> int:
+        """Pop due entries off an expiry heap, yielding to the loop between slices"""
+        cutoff = time.time() - self.auto_delete_time
+        deleted = 0
+        
+        while heap and heap[0][0] < cutoff:
+            for _ in range(REAP_SLICE):
+                if not heap or heap[0][0] >= cutoff:
+                    break
+                
+                created_at, record_id = heapq.heappop(heap)
+                record = records.get(record_id)
+                if record is not None and record.created_at == created_at:
+                    await delete(record_id)
+                    deleted += 1
+                    logger.debug(f"Auto-deleted expired record: {record_id}")
+            
+            await asyncio.sleep(0)
+        
+        return deleted
+    
     async def cleanup_expired_files(self):
         """Remove expired files based on auto delete time"""
         if not self.auto_delete_enabled:
             return
         
-        current_time = time.time()
-        expired_files = []
-        
-        for file_id, file_data in self.files.items():
-            if current_time - file_data['created_at'] > self.auto_delete_time:
-                expired_files.append(file_id)
-        
-        for file_id in expired_files:
-            await self.delete_file(file_id)
-            logger.info(f"Auto-deleted expired file: {file_id}")
-        
-        return len(expired_files)
+        return await self._reap_expired(self._file_expiry, self.files, self.delete_file)
     
     async def cleanup_expired_batches(self):
         """Remove expired batches based on auto delete time"""
         if not self.auto_delete_enabled:
             return
         
-        current_time = time.time()
-        expired_batches = []
-        
-        for batch_id, batch_data in self.batches.items():
-            if current_time - batch_data['created_at'] > self.auto_delete_time:
-                expired_batches.append(batch_id)
-        
-        for batch_id in expired_batches:
-            await self.delete_batch(batch_id)
-            logger.info(f"Auto-deleted expired batch: {batch_id}")
-        
-        return len(expired_batches)
+        return await self._reap_expired(self._batch_expiry, self.batches, self.delete_batch)
     
     async def start_cleanup_task(self):
         """Start periodic cleanup task"""
@@ -298,3 +605,28 @@ class Database:
                     logger.info(f"Cleanup completed: {deleted_files} files, {deleted_batches} batches deleted")
             except Exception as e:
                 logger.error(f"Error in cleanup task: {e}")
+
+
+def create_database() -> Database:
+    """Create the database backend selected by Config.DATABASE_BACKEND"""
+    from config import Config
+    
+    if Config.DATABASE_BACKEND == "sqlite":
+        from database.sqlite_database import SQLiteDatabase
+        return SQLiteDatabase(Config.SQLITE_PATH)
+    
+    if Config.DATABASE_BACKEND == "journal":
+        from database.journal import JournaledDatabase
+        return JournaledDatabase(
+            Config.JOURNAL_DIR,
+            snapshot_interval=Config.SNAPSHOT_INTERVAL,
+            snapshot_ops=Config.SNAPSHOT_OPS
+        )
+    
+    if Config.DATABASE_BACKEND == "mongo":
+        from database.mongo_database import MongoDatabase
+        return MongoDatabase(Config.MONGO_URI, Config.MONGO_DB_NAME, Config.CACHE_SIZE, Config.CACHE_TTL)
+    
+    if Config.DATABASE_BACKEND != "memory":
+        logger.warning(f"Unknown DATABASE_BACKEND '{Config.DATABASE_BACKEND}', using in-memory database")
+    return Database()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Snowflake-style ID generator for file and batch records
+
+Layout of the 63-bit positive ID (fits a signed 64-bit integer):
+    41 bits  milliseconds since EPOCH_MS
+    10 bits  shard ID (one per bot process sharing a store)
+    12 bits  per-millisecond sequence
+"""
+
+import time
+
+EPOCH_MS = 1704067200000  # 2024-01-01T00:00:00Z
+
+SHARD_BITS = 10
+SEQUENCE_BITS = 12
+MAX_SHARD = (1 << SHARD_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+
+class SnowflakeGenerator:
+    def __init__(self, shard_id: int = 0):
+        self.shard_id = shard_id
+        self._last_ms: int = 0
+        self._sequence: int = 0
+
+    @property
+    def shard_id(self) -> int:
+        return self._shard_id
+
+    @shard_id.setter
+    def shard_id(self, value: int):
+        if not 0 <= value <= MAX_SHARD:
+            raise ValueError(f"Shard ID must be between 0 and {MAX_SHARD}")
+        self._shard_id = value
+
+    def next_id(self) -> int:
+        """Return a new ID, strictly greater than every ID issued before"""
+        now_ms = int(time.time() * 1000) - EPOCH_MS
+
+        # Never move backwards if the wall clock does
+        if now_ms <= self._last_ms:
+            now_ms = self._last_ms
+            self._sequence += 1
+            if self._sequence > MAX_SEQUENCE:
+                # Sequence exhausted: borrow the next millisecond instead of sleeping
+                now_ms += 1
+                self._sequence = 0
+        else:
+            self._sequence = 0
+
+        self._last_ms = now_ms
+        return (now_ms << (SHARD_BITS + SEQUENCE_BITS)) | (self._shard_id << SEQUENCE_BITS) | self._sequence
@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Journaled in-memory database for the FileStore Bot
+
+Every mutation is appended to a compact binary operation log through a
+buffered writer. A background compaction step periodically writes a full
+snapshot and starts a fresh log, so startup only loads the snapshot and
+replays the log tail written after it.
+"""
+
+import asyncio
+import glob
+import os
+import pickle
+import struct
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+from pyrogram import Client
+from database.database import Database
+
+logger = logging.getLogger(__name__)
+
+# Frame header: payload length
+HEADER = struct.Struct("<I")
+
+# Operation codes written to the log (never renumber existing entries)
+OPS = {
+    'add_user': 1,
+    'remove_user': 2,
+    'ban_user': 3,
+    'unban_user': 4,
+    'add_admin': 5,
+    'remove_admin': 6,
+    'save_file': 7,
+    'delete_file': 8,
+    'save_batch': 9,
+    'delete_batch': 10,
+    'add_force_sub_channel': 11,
+    'remove_force_sub_channel': 12,
+    'set_force_sub_enabled': 13,
+    'set_auto_delete_time': 14,
+    'set_auto_delete_enabled': 15,
+    'update_file_media': 16,
+    'record_dead_peers': 17,
+    'clear_dead_peers': 18,
+    'touch_user': 19,
+    'set_channel_mode': 20,
+    'req_user': 21,
+    'del_req_user': 22,
+}
+OP_NAMES = {code: name for name, code in OPS.items()}
+
+
+class JournaledDatabase(Database):
+    def __init__(self, directory: str, flush_interval: float = 0.2,
+                 snapshot_interval: float = 3600, snapshot_ops: int = 500000):
+        super().__init__()
+
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_ops = snapshot_ops
+
+        # Disk I/O runs on one thread so appends stay ordered
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="journal")
+        self._buffer = bytearray()
+        self._log_file = None
+        self._log_seq: int = 0
+        self._ops_since_snapshot: int = 0
+        self._last_snapshot: float = time.time()
+
+        self._writer_task: Optional[asyncio.Task] = None
+        self._closed: bool = False
+
+    async def initialize(self, bot: Client):
+        """Load the latest snapshot, replay the log tail and start the writer"""
+        await super().initialize(bot)
+
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._log_seq = await loop.run_in_executor(self._executor, self._load_snapshot)
+
+        replayed = 0
+        for seq in self._log_sequences():
+            if seq < self._log_seq:
+                continue
+            replayed += await loop.run_in_executor(self._executor, self._replay_log, seq)
+            self._log_seq = seq
+
+        # Continue in a fresh log so a torn tail from a crash is never appended to
+        self._log_seq += 1
+        await loop.run_in_executor(self._executor, self._open_log, self._log_seq)
+        self._ops_since_snapshot = replayed
+
+        self._writer_task = asyncio.create_task(self._writer())
+
+        logger.info(
+            f"Journal loaded in {time.perf_counter() - started:.2f}s: {len(self.users)} users, "
+            f"{len(self.files)} files, {len(self.batches)} batches ({replayed} ops replayed)"
+        )
+
+    async def close(self):
+        """Flush the buffer, write a final snapshot and close the log"""
+        if self._closed:
+            return
+        self._closed = True
+
+        if self._writer_task:
+            self._writer_task.cancel()
+            try:
+                await self._writer_task
+            except asyncio.CancelledError:
+                pass
+            self._writer_task = None
+
+        await self.compact()
+        # Ops appended while the snapshot was being written
+        await self._flush()
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._close_log)
+        self._executor.shutdown(wait=True)
+
+    # Paths
+    def _log_path(self, seq: int) -> str:
+        return os.path.join(self.directory, f"oplog.{seq:08d}.bin")
+
+    def _snapshot_path(self) -> str:
+        return os.path.join(self.directory, "snapshot.pickle")
+
+    def _log_sequences(self):
+        paths = glob.glob(os.path.join(self.directory, "oplog.*.bin"))
+        return sorted(int(os.path.basename(path).split(".")[1]) for path in paths)
+
+    # Blocking helpers (executed on the journal thread only)
+    def _open_log(self, seq: int):
+        self._close_log()
+        self._log_file = open(self._log_path(seq), "ab")
+
+    def _close_log(self):
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+
+    def _write(self, data: bytes):
+        self._log_file.write(data)
+        self._log_file.flush()
+        os.fsync(self._log_file.fileno())
+
+    def _load_snapshot(self) -> int:
+        """Restore the snapshot, returning the first log sequence it does not cover"""
+        try:
+            with open(self._snapshot_path(), "rb") as f:
+                snapshot = pickle.load(f)
+        except FileNotFoundError:
+            return 0
+
+        self._restore(snapshot)
+        return snapshot['log_seq']
+
+    def _write_snapshot(self, snapshot: Dict, obsolete_before: int):
+        path = self._snapshot_path()
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+        for seq in self._log_sequences():
+            if seq < obsolete_before:
+                os.remove(self._log_path(seq))
+
+    def _replay_log(self, seq: int) -> int:
+        """Apply every complete frame of one log file, stopping at a torn tail"""
+        count = 0
+        with open(self._log_path(seq), "rb") as f:
+            while True:
+                header = f.read(HEADER.size)
+                if len(header) < HEADER.size:
+                    break
+                size = HEADER.unpack(header)[0]
+                payload = f.read(size)
+                try:
+                    if len(payload) < size:
+                        raise EOFError
+                    code, args = pickle.loads(payload)
+                except Exception:
+                    logger.warning(f"Truncated entry at the end of {self._log_path(seq)}, ignoring tail")
+                    break
+                self._apply(OP_NAMES[code], args)
+                count += 1
+        return count
+
+    # State
+    def _restore(self, snapshot: Dict):
+        self.users.update(snapshot['users'])
+        self.banned_users.update(snapshot['banned_users'])
+        self.admins.update(snapshot['admins'])
+        self.force_sub_channels.update(snapshot['force_sub_channels'])
+        self.channel_modes.update(snapshot.get('channel_modes', {}))
+        for channel_id, user_ids in snapshot.get('join_requests', {}).items():
+            self.join_requests[channel_id] = set(user_ids)
+        self.dead_peers.update(snapshot.get('dead_peers', {}))
+        for user_id, day in snapshot.get('last_active', {}).items():
+            self._set_last_active(user_id, day)
+        for unique_id, file_data in snapshot['files'].items():
+            self._store_file(unique_id, file_data)
+        for unique_id, batch_data in snapshot['batches'].items():
+            self._store_batch(unique_id, batch_data)
+        for user_id in self.users:
+            self.user_files.setdefault(user_id, {})
+        for key, value in snapshot['settings'].items():
+            setattr(self, key, value)
+
+    def _capture(self) -> Dict:
+        """Shallow-copy the state; the journal thread pickles the copy"""
+        return {
+            'log_seq': self._log_seq,
+            'users': set(self.users),
+            'banned_users': set(self.banned_users),
+            'admins': set(self.admins),
+            'force_sub_channels': set(self.force_sub_channels),
+            'channel_modes': dict(self.channel_modes),
+            'join_requests': {channel_id: set(user_ids) for channel_id, user_ids in self.join_requests.items()},
+            'dead_peers': dict(self.dead_peers),
+            'last_active': dict(self.last_active),
+            'files': dict(self.files),
+            'batches': dict(self.batches),
+            'settings': {
+                'force_sub_enabled': self.force_sub_enabled,
+                'auto_delete_time': self.auto_delete_time,
+                'auto_delete_enabled': self.auto_delete_enabled,
+                'total_files': self.total_files,
+                'total_batches': self.total_batches,
+            },
+        }
+
+    def _apply(self, op: str, args: tuple):
+        """Apply a logged operation directly to the in-memory state"""
+        if op == 'save_file':
+            self._store_file(*args)
+            self.total_files += 1
+        elif op == 'save_batch':
+            self._store_batch(*args)
+            self.total_batches += 1
+        elif op == 'add_user':
+            self.users.add(args[0])
+            self.user_files.setdefault(args[0], {})
+        elif op == 'remove_user':
+            self.users.discard(args[0])
+            self.user_files.pop(args[0], None)
+            self._set_last_active(args[0], None)
+        elif op == 'touch_user':
+            self._set_last_active(*args)
+        elif op == 'ban_user':
+            self.banned_users.add(args[0])
+        elif op == 'unban_user':
+            self.banned_users.discard(args[0])
+        elif op == 'add_admin':
+            self.admins.add(args[0])
+        elif op == 'remove_admin':
+            self.admins.discard(args[0])
+        elif op == 'delete_file':
+            self._drop_file(args[0])
+        elif op == 'update_file_media':
+            if args[0] in self.files:
+                self.files[args[0]].media_file_id = args[1]
+        elif op == 'record_dead_peers':
+            self._mark_dead_peers(*args)
+        elif op == 'clear_dead_peers':
+            for user_id in args[0]:
+                self.dead_peers.pop(user_id, None)
+        elif op == 'delete_batch':
+            self._drop_batch(args[0])
+        elif op == 'add_force_sub_channel':
+            self.force_sub_channels.add(args[0])
+        elif op == 'remove_force_sub_channel':
+            self.force_sub_channels.discard(args[0])
+        elif op == 'set_force_sub_enabled':
+            self.force_sub_enabled = args[0]
+        elif op == 'set_channel_mode':
+            self._set_channel_mode(*args)
+        elif op == 'req_user':
+            self.join_requests.setdefault(args[0], set()).add(args[1])
+        elif op == 'del_req_user':
+            self._drop_join_request(*args)
+        elif op == 'set_auto_delete_time':
+            self.auto_delete_time = args[0]
+        elif op == 'set_auto_delete_enabled':
+            self.auto_delete_enabled = args[0]
+
+    # Buffered writer
+    def _append(self, op: str, *args):
+        payload = pickle.dumps((OPS[op], args), protocol=pickle.HIGHEST_PROTOCOL)
+        self._buffer += HEADER.pack(len(payload))
+        self._buffer += payload
+        self._ops_since_snapshot += 1
+
+    async def _flush(self):
+        if not self._buffer:
+            return
+
+        data, self._buffer = bytes(self._buffer), bytearray()
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self._executor, self._write, data)
+        except Exception as e:
+            logger.error(f"Error writing {len(data)} bytes to the operation log: {e}")
+
+    async def _writer(self):
+        """Flush the buffer every flush_interval and compact when due"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self._flush()
+
+            if self._ops_since_snapshot >= self.snapshot_ops or (
+                self._ops_since_snapshot and time.time() - self._last_snapshot >= self.snapshot_interval
+            ):
+                await self.compact()
+
+    async def compact(self):
+        """Write a snapshot of the current state and drop the logs it covers"""
+        # Take the buffered ops and the state in one synchronous step: the
+        # buffer goes to the old log, and ops appended while the writes below
+        # are awaited land in the new log, which the snapshot does not cover
+        data, self._buffer = bytes(self._buffer), bytearray()
+        self._log_seq += 1
+        snapshot = self._capture()
+        self._ops_since_snapshot = 0
+        self._last_snapshot = time.time()
+
+        loop = asyncio.get_running_loop()
+        if data:
+            try:
+                await loop.run_in_executor(self._executor, self._write, data)
+            except Exception as e:
+                logger.error(f"Error writing {len(data)} bytes to the operation log: {e}")
+        await loop.run_in_executor(self._executor, self._open_log, self._log_seq)
+
+        try:
+            await loop.run_in_executor(self._executor, self._write_snapshot, snapshot, self._log_seq)
+            logger.info(f"Journal snapshot written ({len(snapshot['users'])} users, {len(snapshot['files'])} files)")
+        except Exception as e:
+            logger.error(f"Error writing journal snapshot: {e}")
+
+    # User management
+    async def add_user(self, user_id: int):
+        if user_id not in self.users:
+            self._append('add_user', user_id)
+        await super().add_user(user_id)
+
+    async def remove_user(self, user_id: int):
+        await super().remove_user(user_id)
+        self._append('remove_user', user_id)
+
+    async def touch_user(self, user_id: int, day: Optional[int] = None) -> bool:
+        touched = await super().touch_user(user_id, day)
+        if touched:
+            self._append('touch_user', user_id, self.last_active[user_id])
+        return touched
+
+    # Ban management
+    async def ban_user(self, user_id: int):
+        await super().ban_user(user_id)
+        self._append('ban_user', user_id)
+
+    async def unban_user(self, user_id: int):
+        await super().unban_user(user_id)
+        self._append('unban_user', user_id)
+
+    # Dead peers
+    async def record_dead_peers(self, failures: Dict[int, str], at: Optional[float] = None):
+        at = at or time.time()
+        await super().record_dead_peers(failures, at)
+        self._append('record_dead_peers', failures, at)
+
+    async def clear_dead_peers(self, user_ids: Iterable[int]) -> List[int]:
+        cleared = await super().clear_dead_peers(user_ids)
+        if cleared:
+            self._append('clear_dead_peers', cleared)
+        return cleared
+
+    # Admin management
+    async def add_admin(self, user_id: int):
+        await super().add_admin(user_id)
+        self._append('add_admin', user_id)
+
+    async def remove_admin(self, user_id: int):
+        await super().remove_admin(user_id)
+        self._append('remove_admin', user_id)
+
+    # File management
+    async def save_file(self, file_id: str, file_data: Dict) -> str:
+        existing = self.file_locations.get((file_data.get('channel_id'), file_data.get('message_id')))
+        if existing is not None:
+            return existing
+
+        unique_id = await super().save_file(file_id, file_data)
+        self._append('save_file', unique_id, self.files[unique_id])
+        return unique_id
+
+    async def update_file_media(self, file_id: str, media_file_id: str):
+        await super().update_file_media(file_id, media_file_id)
+        self._append('update_file_media', file_id, media_file_id)
+
+    async def delete_file(self, file_id: str):
+        await super().delete_file(file_id)
+        self._append('delete_file', file_id)
+
+    # Batch management
+    async def save_batch(self, batch_id: str, batch_data: Dict) -> str:
+        unique_id = await super().save_batch(batch_id, batch_data)
+        self._append('save_batch', unique_id, self.batches[unique_id])
+        return unique_id
+
+    async def delete_batch(self, batch_id: str):
+        await super().delete_batch(batch_id)
+        self._append('delete_batch', batch_id)
+
+    # Force subscription management
+    async def add_force_sub_channel(self, channel_id: int):
+        await super().add_force_sub_channel(channel_id)
+        self._append('add_force_sub_channel', channel_id)
+
+    async def remove_force_sub_channel(self, channel_id: int):
+        await super().remove_force_sub_channel(channel_id)
+        self._append('remove_force_sub_channel', channel_id)
+
+    async def set_force_sub_enabled(self, enabled: bool):
+        await super().set_force_sub_enabled(enabled)
+        self._append('set_force_sub_enabled', enabled)
+
+    async def set_channel_mode(self, channel_id: int, mode: str):
+        await super().set_channel_mode(channel_id, mode)
+        self._append('set_channel_mode', channel_id, mode)
+
+    async def req_user(self, channel_id: int, user_id: int):
+        await super().req_user(channel_id, user_id)
+        self._append('req_user', channel_id, user_id)
+
+    async def del_req_user(self, channel_id: int, user_id: int):
+        await super().del_req_user(channel_id, user_id)
+        self._append('del_req_user', channel_id, user_id)
+
+    # Auto delete management
+    async def set_auto_delete_time(self, seconds: int):
+        await super().set_auto_delete_time(seconds)
+        self._append('set_auto_delete_time', seconds)
+
+    async def set_auto_delete_enabled(self, enabled: bool):
+        await super().set_auto_delete_enabled(enabled)
+        self._append('set_auto_delete_enabled', enabled)
@@ -0,0 +1,514 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MongoDB (motor) backend for the FileStore Bot
+
+Users, bans, admins, channels and settings are small, so they are loaded
+into the inherited in-memory sets and written through to MongoDB. Files
+and batches live in MongoDB only and are read through a TTL+LRU cache,
+so repeated lookups of a popular link never leave the process.
+"""
+
+import asyncio
+import time
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from pyrogram import Client
+from cache import TTLCache
+from database.database import Database
+from database.records import FileRecord, BatchRecord
+
+logger = logging.getLogger(__name__)
+
+# One record per channel post. Only posts are indexed: files saved without a
+# message_id store it as null, which $exists would still match
+LOCATION_INDEX = 'channel_id_1_message_id_1'
+LOCATION_FILTER = {'message_id': {'$type': 'number'}}
+
+# Settings persisted in the settings document
+SETTINGS = (
+    'force_sub_enabled',
+    'auto_delete_time',
+    'auto_delete_enabled',
+    'total_files',
+    'total_batches',
+)
+
+
+class MongoDatabase(Database):
+    def __init__(self, uri: str, db_name: str, cache_size: int = 10000,
+                 cache_ttl: float = 300, flush_interval: float = 5):
+        super().__init__()
+
+        self.client = AsyncIOMotorClient(uri)
+        self.mongo = self.client[db_name]
+
+        self.files_col = self.mongo['files']
+        self.batches_col = self.mongo['batches']
+        self.users_col = self.mongo['users']
+        self.banned_col = self.mongo['banned_users']
+        self.admins_col = self.mongo['admins']
+        self.dead_peers_col = self.mongo['dead_peers']
+        self.channels_col = self.mongo['force_sub_channels']
+        self.channel_modes_col = self.mongo['channel_modes']
+        self.join_requests_col = self.mongo['join_requests']
+        self.settings_col = self.mongo['settings']
+
+        # Read-through caches for the hot lookup path
+        self.file_cache = TTLCache(cache_size, cache_ttl)
+        self.batch_cache = TTLCache(cache_size, cache_ttl)
+
+        # access_count increments are buffered and flushed in bulk
+        self.flush_interval = flush_interval
+        self._file_hits: Dict[str, int] = {}
+        self._batch_hits: Dict[str, int] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def initialize(self, bot: Client):
+        """Create indexes, load the small collections and start the flusher"""
+        await super().initialize(bot)
+
+        await self.files_col.create_index([('user_id', ASCENDING), ('created_at', DESCENDING)])
+        await self.files_col.create_index([('created_at', ASCENDING)])
+        await self.files_col.create_index([('file_hash', ASCENDING)], sparse=True)
+        await self._create_location_index()
+        await self.batches_col.create_index([('created_at', ASCENDING)])
+        await self.batches_col.create_index(
+            [('channel_id', ASCENDING), ('first_message_id', ASCENDING), ('last_message_id', ASCENDING)],
+            partialFilterExpression={'batch_type': 'range'}
+        )
+
+        async for doc in self.users_col.find({}, {'_id': 1, 'last_active': 1}):
+            self.users.add(doc['_id'])
+            if 'last_active' in doc:
+                self._set_last_active(doc['_id'], doc['last_active'])
+        self.banned_users.update([doc['_id'] async for doc in self.banned_col.find({}, {'_id': 1})])
+        self.admins.update([doc['_id'] async for doc in self.admins_col.find({}, {'_id': 1})])
+        self.force_sub_channels.update([doc['_id'] async for doc in self.channels_col.find({}, {'_id': 1})])
+        async for doc in self.channel_modes_col.find({}):
+            self._set_channel_mode(doc['_id'], doc['mode'])
+        async for doc in self.join_requests_col.find({}):
+            if doc.get('user_ids'):
+                self.join_requests[doc['_id']] = set(doc['user_ids'])
+        self.dead_peers.update({
+            doc['_id']: (doc['failures'], doc['last_failed'], doc['reason'])
+            async for doc in self.dead_peers_col.find({})
+        })
+
+        settings = await self.settings_col.find_one({'_id': 'settings'}) or {}
+        for key in SETTINGS:
+            if key in settings:
+                setattr(self, key, settings[key])
+
+        self._flush_task = asyncio.create_task(self._flush_loop())
+
+        logger.info(f"MongoDB database initialized with {len(self.users)} users")
+
+    async def close(self):
+        """Flush buffered counters and close the client"""
+        if self._flush_task:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+
+        await self._flush_hits()
+        self.client.close()
+
+    async def _create_location_index(self):
+        indexes = await self.files_col.index_information()
+        if LOCATION_INDEX in indexes and not indexes[LOCATION_INDEX].get('unique'):
+            # Created non-unique by earlier versions
+            await self.files_col.drop_index(LOCATION_INDEX)
+        try:
+            await self.files_col.create_index(
+                [('channel_id', ASCENDING), ('message_id', ASCENDING)],
+                name=LOCATION_INDEX, unique=True, partialFilterExpression=LOCATION_FILTER
+            )
+        except DuplicateKeyError as e:
+            logger.error(f"Duplicate channel posts in the files collection, saves are not deduplicated: {e}")
+
+    # Write helpers
+    async def _save_settings(self, *keys: str):
+        await self.settings_col.update_one(
+            {'_id': 'settings'},
+            {'$set': {key: getattr(self, key) for key in keys}},
+            upsert=True
+        )
+
+    async def _flush_hits(self):
+        for collection, hits in ((self.files_col, self._file_hits), (self.batches_col, self._batch_hits)):
+            if not hits:
+                continue
+            ops = [UpdateOne({'_id': _id}, {'$inc': {'access_count': count}}) for _id, count in hits.items()]
+            hits.clear()
+            try:
+                await collection.bulk_write(ops, ordered=False)
+            except Exception as e:
+                logger.error(f"Error flushing access counts: {e}")
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self._flush_hits()
+
+    # User management
+    async def add_user(self, user_id: int):
+        if user_id not in self.users:
+            await self.users_col.update_one({'_id': user_id}, {'$setOnInsert': {'_id': user_id}}, upsert=True)
+        await super().add_user(user_id)
+
+    async def remove_user(self, user_id: int):
+        await super().remove_user(user_id)
+        await self.users_col.delete_one({'_id': user_id})
+
+    async def touch_user(self, user_id: int, day: Optional[int] = None) -> bool:
+        touched = await super().touch_user(user_id, day)
+        if touched:
+            await self.users_col.update_one({'_id': user_id}, {'$set': {'last_active': self.last_active[user_id]}})
+        return touched
+
+    # Ban management
+    async def ban_user(self, user_id: int):
+        await super().ban_user(user_id)
+        await self.banned_col.update_one({'_id': user_id}, {'$setOnInsert': {'_id': user_id}}, upsert=True)
+
+    async def unban_user(self, user_id: int):
+        await super().unban_user(user_id)
+        await self.banned_col.delete_one({'_id': user_id})
+
+    # Dead peers
+    async def record_dead_peers(self, failures: Dict[int, str], at: Optional[float] = None):
+        await super().record_dead_peers(failures, at)
+        if not failures:
+            return
+        requests = []
+        for user_id in failures:
+            count, last_failed, reason = self.dead_peers[user_id]
+            requests.append(UpdateOne(
+                {'_id': user_id},
+                {'$set': {'failures': count, 'last_failed': last_failed, 'reason': reason}},
+                upsert=True
+            ))
+        await self.dead_peers_col.bulk_write(requests, ordered=False)
+
+    async def clear_dead_peers(self, user_ids: Iterable[int]) -> List[int]:
+        cleared = await super().clear_dead_peers(user_ids)
+        if cleared:
+            await self.dead_peers_col.delete_many({'_id': {'$in': cleared}})
+        return cleared
+
+    # Admin management
+    async def add_admin(self, user_id: int):
+        await super().add_admin(user_id)
+        await self.admins_col.update_one({'_id': user_id}, {'$setOnInsert': {'_id': user_id}}, upsert=True)
+
+    async def remove_admin(self, user_id: int):
+        await super().remove_admin(user_id)
+        await self.admins_col.delete_one({'_id': user_id})
+
+    # File management
+    async def save_file(self, file_id: str, file_data: Dict) -> str:
+        """Save file and return unique ID, reusing the record of an already stored post"""
+        unique_id = f"file_{self.id_generator.next_id()}"
+
+        record = FileRecord.from_dict(file_data)
+        record.created_at = time.time()
+        record.access_count = 0
+
+        doc = {'_id': unique_id, **record.to_dict()}
+        if record.message_id is None:
+            # Not a channel post, nothing to deduplicate against
+            await self.files_col.insert_one(doc)
+        else:
+            location = {'channel_id': record.channel_id, 'message_id': record.message_id}
+            try:
+                stored = await self.files_col.find_one_and_update(
+                    location,
+                    {'$setOnInsert': doc},
+                    projection={'_id': 1},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                )
+            except DuplicateKeyError:
+                # A concurrent save of the same post inserted it first
+                stored = await self.files_col.find_one(location, {'_id': 1})
+            if stored['_id'] != unique_id:
+                return stored['_id']
+
+        self.total_files += 1
+        await self._save_settings('total_files')
+
+        self.file_cache.set(unique_id, record)
+        return unique_id
+
+    async def save_files_many(self, files: List[Dict]) -> List[str]:
+        """Save several files with one lookup and one insert_many"""
+        if not files:
+            return []
+
+        locations = [
+            {'channel_id': f.get('channel_id'), 'message_id': f.get('message_id')}
+            for f in files if f.get('message_id') is not None
+        ]
+        stored = await self._find_locations(locations)
+
+        now = time.time()
+        unique_ids = []
+        docs = []
+        for file_data in files:
+            location = (file_data.get('channel_id'), file_data.get('message_id'))
+            if location not in stored:
+                unique_id = f"file_{self.id_generator.next_id()}"
+                record = FileRecord.from_dict(file_data)
+                record.created_at = now
+                record.access_count = 0
+                docs.append({'_id': unique_id, **record.to_dict()})
+                if record.message_id is not None:
+                    stored[location] = unique_id
+            else:
+                unique_id = stored[location]
+            unique_ids.append(unique_id)
+
+        if docs:
+            inserted = {doc['_id'] for doc in docs}
+            try:
+                await self.files_col.insert_many(docs, ordered=False)
+            except BulkWriteError as e:
+                # Posts a concurrent save inserted first: use their records
+                lost = [docs[error['index']] for error in e.details['writeErrors'] if error['code'] == 11000]
+                if len(lost) < len(e.details['writeErrors']):
+                    raise
+                winners = await self._find_locations(
+                    [{'channel_id': doc['channel_id'], 'message_id': doc['message_id']} for doc in lost]
+                )
+                replaced = {doc['_id']: winners[(doc['channel_id'], doc['message_id'])] for doc in lost}
+                unique_ids = [replaced.get(unique_id, unique_id) for unique_id in unique_ids]
+                inserted -= replaced.keys()
+
+            for doc in docs:
+                if doc['_id'] in inserted:
+                    self.file_cache.set(doc['_id'], FileRecord.from_dict(doc))
+            self.total_files += len(inserted)
+            await self._save_settings('total_files')
+
+        return unique_ids
+
+    async def _find_locations(self, locations: List[Dict]) -> Dict[Tuple, str]:
+        """Map (channel_id, message_id) of already stored posts to their file IDs"""
+        if not locations:
+            return {}
+        return {
+            (doc['channel_id'], doc['message_id']): doc['_id']
+            async for doc in self.files_col.find({'$or': locations}, {'channel_id': 1, 'message_id': 1})
+        }
+
+    async def get_file(self, file_id: str) -> Optional[FileRecord]:
+        """Get file by ID, served from cache when possible"""
+        file_data = self.file_cache.get(file_id)
+        if file_data is None:
+            doc = await self.files_col.find_one({'_id': file_id}, {'_id': 0})
+            if doc is None:
+                return None
+            file_data = FileRecord.from_dict(doc)
+            self.file_cache.set(file_id, file_data)
+
+        file_data.access_count += 1
+        self._file_hits[file_id] = self._file_hits.get(file_id, 0) + 1
+        return file_data
+
+    async def update_file_media(self, file_id: str, media_file_id: str):
+        """Replace the stored Telegram file_id of a file"""
+        self.file_cache.pop(file_id)
+        await self.files_col.update_one({'_id': file_id}, {'$set': {'media_file_id': media_file_id}})
+
+    async def delete_file(self, file_id: str):
+        """Delete file"""
+        self.file_cache.pop(file_id)
+        self._file_hits.pop(file_id, None)
+        await self.files_col.delete_one({'_id': file_id})
+
+    async def find_file_by_hash(self, file_hash: Optional[str]) -> Optional[Tuple[str, FileRecord]]:
+        """Find a stored file with the same Telegram file_unique_id"""
+        if not file_hash:
+            return None
+
+        doc = await self.files_col.find_one({'file_hash': file_hash})
+        if doc is None:
+            self.dedup_misses += 1
+            return None
+
+        self.dedup_hits += 1
+        return doc.pop('_id'), FileRecord.from_dict(doc)
+
+    async def find_file_by_location(self, channel_id, message_id: int) -> Optional[Tuple[str, FileRecord]]:
+        """Find the stored file for a channel post"""
+        doc = await self.files_col.find_one({'channel_id': channel_id, 'message_id': message_id})
+        if doc is None:
+            return None
+        return doc.pop('_id'), FileRecord.from_dict(doc)
+
+    async def find_files_by_locations(self, channel_id,
+                                      message_ids: Iterable[int]) -> Dict[int, Tuple[str, FileRecord]]:
+        """Find the stored files for several posts of one channel in one query"""
+        found = {}
+        async for doc in self.files_col.find({'channel_id': channel_id, 'message_id': {'$in': list(message_ids)}}):
+            found[doc['message_id']] = (doc.pop('_id'), FileRecord.from_dict(doc))
+        return found
+
+    async def get_user_files(self, user_id: int) -> List[FileRecord]:
+        """Get all files for a user"""
+        return [FileRecord.from_dict(doc) async for doc in self.files_col.find({'user_id': user_id}, {'_id': 0})]
+
+    async def iter_user_files(self, user_id: int, after: Optional[Tuple[float, str]] = None,
+                              limit: int = 10) -> Tuple[List[Tuple[str, FileRecord]], Optional[Tuple[float, str]]]:
+        """Get one page of a user's files, newest first"""
+        query = {'user_id': user_id}
+        if after is not None:
+            created_at, file_id = after
+            query['$or'] = [
+                {'created_at': {'$lt': created_at}},
+                {'created_at': created_at, '_id': {'$lt': file_id}},
+            ]
+
+        cursor = self.files_col.find(query).sort([('created_at', DESCENDING), ('_id', DESCENDING)]).limit(limit + 1)
+        docs = [doc async for doc in cursor]
+
+        page = [(doc.pop('_id'), FileRecord.from_dict(doc)) for doc in docs[:limit]]
+        next_cursor = (page[-1][1].created_at, page[-1][0]) if len(docs) > limit else None
+        return page, next_cursor
+
+    # Batch management
+    async def save_batch(self, batch_id: str, batch_data: Dict) -> str:
+        """Save batch"""
+        self.total_batches += 1
+        unique_id = f"batch_{self.id_generator.next_id()}"
+
+        record = BatchRecord.from_dict(batch_data)
+        record.created_at = time.time()
+        record.access_count = 0
+
+        await self.batches_col.insert_one({'_id': unique_id, **record.to_dict()})
+        await self._save_settings('total_batches')
+
+        self.batch_cache.set(unique_id, record)
+        return unique_id
+
+    async def get_batch(self, batch_id: str) -> Optional[BatchRecord]:
+        """Get batch by ID, served from cache when possible"""
+        batch_data = self.batch_cache.get(batch_id)
+        if batch_data is None:
+            doc = await self.batches_col.find_one({'_id': batch_id}, {'_id': 0})
+            if doc is None:
+                return None
+            batch_data = BatchRecord.from_dict(doc)
+            self.batch_cache.set(batch_id, batch_data)
+
+        batch_data.access_count += 1
+        self._batch_hits[batch_id] = self._batch_hits.get(batch_id, 0) + 1
+        return batch_data
+
+    async def find_range_batch(self, channel_id, first_message_id: int,
+                               last_message_id: int) -> Optional[Tuple[str, BatchRecord]]:
+        """Find the stored range batch for a message ID range"""
+        doc = await self.batches_col.find_one({
+            'batch_type': 'range',
+            'channel_id': channel_id,
+            'first_message_id': first_message_id,
+            'last_message_id': last_message_id
+        })
+        if doc is None:
+            return None
+        return doc.pop('_id'), BatchRecord.from_dict(doc)
+
+    async def delete_batch(self, batch_id: str):
+        """Delete batch"""
+        self.batch_cache.pop(batch_id)
+        self._batch_hits.pop(batch_id, None)
+        await self.batches_col.delete_one({'_id': batch_id})
+
+    # Force subscription management
+    async def add_force_sub_channel(self, channel_id: int):
+        await super().add_force_sub_channel(channel_id)
+        await self.channels_col.update_one({'_id': channel_id}, {'$setOnInsert': {'_id': channel_id}}, upsert=True)
+
+    async def remove_force_sub_channel(self, channel_id: int):
+        await super().remove_force_sub_channel(channel_id)
+        await self.channels_col.delete_one({'_id': channel_id})
+
+    async def set_force_sub_enabled(self, enabled: bool):
+        await super().set_force_sub_enabled(enabled)
+        await self._save_settings('force_sub_enabled')
+
+    async def set_channel_mode(self, channel_id: int, mode: str):
+        await super().set_channel_mode(channel_id, mode)
+        if mode == "on":
+            await self.channel_modes_col.update_one({'_id': channel_id}, {'$set': {'mode': mode}}, upsert=True)
+        else:
+            await self.channel_modes_col.delete_one({'_id': channel_id})
+            await self.join_requests_col.delete_one({'_id': channel_id})
+
+    async def req_user(self, channel_id: int, user_id: int):
+        await super().req_user(channel_id, user_id)
+        await self.join_requests_col.update_one({'_id': channel_id}, {'$addToSet': {'user_ids': user_id}}, upsert=True)
+
+    async def del_req_user(self, channel_id: int, user_id: int):
+        await super().del_req_user(channel_id, user_id)
+        await self.join_requests_col.update_one({'_id': channel_id}, {'$pull': {'user_ids': user_id}})
+
+    # Auto delete management
+    async def set_auto_delete_time(self, seconds: int):
+        await super().set_auto_delete_time(seconds)
+        await self._save_settings('auto_delete_time')
+
+    async def set_auto_delete_enabled(self, enabled: bool):
+        await super().set_auto_delete_enabled(enabled)
+        await self._save_settings('auto_delete_enabled')
+
+    # Statistics
+    async def get_stats(self) -> Dict:
+        """Get bot statistics"""
+        stats = await super().get_stats()
+        stats['current_files'] = await self.files_col.estimated_document_count()
+        stats['current_batches'] = await self.batches_col.estimated_document_count()
+        stats['file_cache'] = self.file_cache.stats()
+        stats['batch_cache'] = self.batch_cache.stats()
+        return stats
+
+    # Cleanup tasks
+    async def _cleanup_expired(self, collection, cache: TTLCache, hits: Dict[str, int]) -> int:
+        cutoff = time.time() - self.auto_delete_time
+        expired_ids = [doc['_id'] async for doc in collection.find({'created_at': {'$lt': cutoff}}, {'_id': 1})]
+        if not expired_ids:
+            return 0
+
+        await collection.delete_many({'_id': {'$in': expired_ids}})
+        for _id in expired_ids:
+            cache.pop(_id)
+            hits.pop(_id, None)
+        return len(expired_ids)
+
+    async def cleanup_expired_files(self):
+        """Remove expired files based on auto delete time"""
+        if not self.auto_delete_enabled:
+            return
+
+        deleted = await self._cleanup_expired(self.files_col, self.file_cache, self._file_hits)
+        if deleted:
+            logger.info(f"Auto-deleted {deleted} expired files")
+        return deleted
+
+    async def cleanup_expired_batches(self):
+        """Remove expired batches based on auto delete time"""
+        if not self.auto_delete_enabled:
+            return
+
+        deleted = await self._cleanup_expired(self.batches_col, self.batch_cache, self._batch_hits)
+        if deleted:
+            logger.info(f"Auto-deleted {deleted} expired batches")
+        return deleted
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compact file and batch records for the FileStore Bot
+
+Records use __slots__ instead of per-record dicts. Derived strings such as
+the human readable size and the formatted upload date are computed on
+access rather than stored. Plugins still read them with the dict-style
+accessor (record['file_name'], record.get('upload_date')).
+"""
+
+import sys
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def format_size(size: int) -> str:
+    """Format a byte count as a human readable string"""
+    if not size:
+        return "0 B"
+
+    size = float(size)
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.2f} {unit}"
+        size /= 1024
+    return f"{size:.2f} TB"
+
+
+def to_timestamp(value: Any) -> int:
+    """Normalize a datetime, epoch number or formatted date string to epoch seconds"""
+    if not value:
+        return 0
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+    if isinstance(value, (int, float)):
+        return int(value)
+    try:
+        return int(datetime.strptime(value, DATE_FORMAT).timestamp())
+    except (TypeError, ValueError):
+        return 0
+
+
+def format_timestamp(timestamp: int) -> str:
+    """Format epoch seconds the way upload dates have always been shown"""
+    if not timestamp:
+        return "Unknown"
+    return datetime.fromtimestamp(timestamp).strftime(DATE_FORMAT)
+
+
+class Record:
+    """Dict-like accessor shared by the slotted record classes"""
+
+    __slots__ = ('extra',)
+
+    # Stored fields, in constructor order
+    FIELDS: Tuple[str, ...] = ()
+    # Keys computed on access
+    COMPUTED: Tuple[str, ...] = ()
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self.FIELDS or key in self.COMPUTED:
+            return getattr(self, key)
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value: Any):
+        if key in self.FIELDS:
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.FIELDS or key in self.COMPUTED or bool(self.extra and key in self.extra)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self) -> Iterator[str]:
+        yield from self.FIELDS
+        yield from self.COMPUTED
+        if self.extra:
+            yield from self.extra
+
+    def to_dict(self) -> Dict:
+        """Storage form: stored fields plus extras, no computed keys"""
+        data = {field: getattr(self, field) for field in self.FIELDS}
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Record":
+        values = [data.get(field) for field in cls.FIELDS]
+        extra = {k: v for k, v in data.items() if k not in cls.FIELDS and k not in cls.COMPUTED}
+        record = cls(*values)
+        record.extra = extra or None
+        return record
+
+    def __reduce__(self):
+        return (self._restore, (tuple(getattr(self, field) for field in self.FIELDS), self.extra))
+
+    @classmethod
+    def _restore(cls, values: tuple, extra: Optional[Dict]) -> "Record":
+        record = cls(*values)
+        record.extra = extra
+        return record
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class FileRecord(Record):
+    # New fields go at the end so older snapshots still unpickle
+    __slots__ = (
+        'user_id', 'channel_id', 'message_id', 'file_name', 'file_size',
+        'file_type', 'file_hash', 'upload_ts', 'created_at', 'access_count',
+        'media_file_id',
+    )
+
+    FIELDS = __slots__
+    COMPUTED = ('file_size_human', 'upload_date')
+
+    def __init__(self, user_id=0, channel_id=None, message_id=None, file_name=None,
+                 file_size=0, file_type=None, file_hash=None, upload_ts=0,
+                 created_at=0.0, access_count=0, media_file_id=None):
+        self.user_id = user_id
+        self.channel_id = channel_id
+        self.message_id = message_id
+        self.file_name = file_name
+        self.file_size = file_size or 0
+        # A handful of distinct values shared by every record
+        self.file_type = sys.intern(file_type) if file_type else file_type
+        self.file_hash = file_hash
+        self.upload_ts = upload_ts
+        self.created_at = created_at
+        self.access_count = access_count
+        # Telegram file_id for send_cached_media; refreshed when its reference expires
+        self.media_file_id = media_file_id
+        self.extra = None
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "FileRecord":
+        if 'upload_ts' not in data and 'upload_date' in data:
+            data = {**data, 'upload_ts': to_timestamp(data['upload_date'])}
+        return super().from_dict(data)
+
+    @property
+    def file_size_human(self) -> str:
+        return format_size(self.file_size)
+
+    @property
+    def upload_date(self) -> str:
+        return format_timestamp(self.upload_ts)
+
+
+class BatchRecord(Record):
+    """A list of stored files, or for batch_type 'range' a message ID range
+    whose media is resolved when the batch is opened"""
+
+    # New fields go at the end so older snapshots still unpickle
+    __slots__ = (
+        'user_id', 'channel_id', 'file_ids', 'total_files', 'batch_type',
+        'created_at', 'access_count', 'first_message_id', 'last_message_id',
+    )
+
+    FIELDS = __slots__
+
+    def __init__(self, user_id=0, channel_id=None, file_ids=(), total_files=0,
+                 batch_type=None, created_at=0.0, access_count=0,
+                 first_message_id=None, last_message_id=None):
+        self.user_id = user_id
+        self.channel_id = channel_id
+        self.file_ids = tuple(file_ids or ())
+        self.total_files = total_files
+        self.batch_type = sys.intern(batch_type) if batch_type else batch_type
+        self.created_at = created_at
+        self.access_count = access_count
+        self.first_message_id = first_message_id
+        self.last_message_id = last_message_id
+        self.extra = None
+
+    def to_dict(self) -> Dict:
+        data = super().to_dict()
+        data['file_ids'] = list(self.file_ids)
+        return data
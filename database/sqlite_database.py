@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SQLite (WAL) backend for the FileStore Bot
+
+Reads are served from the in-memory structures inherited from Database,
+so the /start path never touches the disk. Every mutation is queued and
+written behind by a single dedicated thread, coalesced into group commits.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from pyrogram import Client
+from database.database import Database
+from database.records import FileRecord, BatchRecord
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (user_id INTEGER PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS user_activity (user_id INTEGER PRIMARY KEY, day INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS banned_users (user_id INTEGER PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS admins (user_id INTEGER PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS dead_peers (user_id INTEGER PRIMARY KEY, failures INTEGER NOT NULL, last_failed REAL NOT NULL, reason TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS force_sub_channels (channel_id INTEGER PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS channel_modes (channel_id INTEGER PRIMARY KEY, mode TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS join_requests (channel_id INTEGER NOT NULL, user_id INTEGER NOT NULL, PRIMARY KEY (channel_id, user_id));
+CREATE TABLE IF NOT EXISTS files (id TEXT PRIMARY KEY, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS batches (id TEXT PRIMARY KEY, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+# Persists a record's access_count without rewriting the rest of it
+ACCESS_COUNT_SQL = "UPDATE {table} SET data = json_set(data, '$.access_count', ?) WHERE id = ?"
+
+# Settings persisted in the key/value table
+SETTINGS = (
+    'force_sub_enabled',
+    'auto_delete_time',
+    'auto_delete_enabled',
+    'total_files',
+    'total_batches',
+)
+
+
+class SQLiteDatabase(Database):
+    def __init__(self, path: str, flush_interval: Optional[float] = None):
+        super().__init__()
+
+        if flush_interval is None:
+            from config import Config
+            flush_interval = Config.SQLITE_FLUSH_INTERVAL
+
+        self.path = path
+        self.flush_interval = flush_interval
+
+        # All SQLite calls run on this thread, so one connection is enough
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        self._conn: Optional[sqlite3.Connection] = None
+
+        # Pending writes, drained by the writer task
+        self._ops: List[Tuple[str, tuple]] = []
+        self._dirty_files: Set[str] = set()
+        self._dirty_batches: Set[str] = set()
+        self._settings_dirty: bool = False
+        # Records read since the last commit; only their access_count changed
+        self._counted_files: Set[str] = set()
+        self._counted_batches: Set[str] = set()
+
+        self._wakeup = asyncio.Event()
+        self._writer_task: Optional[asyncio.Task] = None
+        self._closed: bool = False
+
+    async def initialize(self, bot: Client):
+        """Open the database file, load its contents and start the writer"""
+        await super().initialize(bot)
+
+        loop = asyncio.get_running_loop()
+        state = await loop.run_in_executor(self._executor, self._load)
+
+        self.users.update(state['users'])
+        self.banned_users.update(state['banned_users'])
+        self.admins.update(state['admins'])
+        self.force_sub_channels.update(state['force_sub_channels'])
+        for channel_id, mode in state['channel_modes']:
+            self._set_channel_mode(channel_id, mode)
+        for channel_id, user_id in state['join_requests']:
+            self.join_requests.setdefault(channel_id, set()).add(user_id)
+        self.dead_peers.update(state['dead_peers'])
+        for user_id, day in state['user_activity']:
+            self._set_last_active(user_id, day)
+
+        for unique_id, file_data in state['files']:
+            self._store_file(unique_id, file_data)
+        for unique_id, batch_data in state['batches']:
+            self._store_batch(unique_id, batch_data)
+        for user_id in self.users:
+            self.user_files.setdefault(user_id, {})
+
+        for key, value in state['settings'].items():
+            setattr(self, key, value)
+
+        self._writer_task = asyncio.create_task(self._writer())
+
+        logger.info(
+            f"SQLite database loaded from {self.path}: {len(self.users)} users, "
+            f"{len(self.files)} files, {len(self.batches)} batches"
+        )
+
+    async def close(self):
+        """Flush pending writes and close the connection"""
+        if self._closed:
+            return
+        self._closed = True
+
+        if self._writer_task:
+            self._writer_task.cancel()
+            try:
+                await self._writer_task
+            except asyncio.CancelledError:
+                pass
+            self._writer_task = None
+
+        await self._flush()
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._close)
+        self._executor.shutdown(wait=True)
+
+    # Blocking helpers (executed on the SQLite thread only)
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            self._conn = sqlite3.connect(self.path)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def _load(self) -> Dict:
+        conn = self._connect()
+
+        def column(query):
+            return [row[0] for row in conn.execute(query)]
+
+        return {
+            'users': column("SELECT user_id FROM users"),
+            'banned_users': column("SELECT user_id FROM banned_users"),
+            'user_activity': conn.execute("SELECT user_id, day FROM user_activity").fetchall(),
+            'admins': column("SELECT user_id FROM admins"),
+            'force_sub_channels': column("SELECT channel_id FROM force_sub_channels"),
+            'channel_modes': conn.execute("SELECT channel_id, mode FROM channel_modes").fetchall(),
+            'join_requests': conn.execute("SELECT channel_id, user_id FROM join_requests").fetchall(),
+            'dead_peers': {
+                row[0]: (row[1], row[2], row[3])
+                for row in conn.execute("SELECT user_id, failures, last_failed, reason FROM dead_peers")
+            },
+            'files': [
+                (row[0], FileRecord.from_dict(json.loads(row[1])))
+                for row in conn.execute("SELECT id, data FROM files")
+            ],
+            'batches': [
+                (row[0], BatchRecord.from_dict(json.loads(row[1])))
+                for row in conn.execute("SELECT id, data FROM batches")
+            ],
+            'settings': {
+                row[0]: json.loads(row[1])
+                for row in conn.execute("SELECT key, value FROM settings")
+                if row[0] in SETTINGS
+            },
+        }
+
+    def _commit(self, ops: List[Tuple[str, tuple]]):
+        conn = self._connect()
+        with conn:  # single transaction = one group commit
+            for sql, params in ops:
+                conn.execute(sql, params)
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    # Write-behind queue
+    def _queue(self, sql: str, params: tuple = ()):
+        self._ops.append((sql, params))
+        self._wakeup.set()
+
+    def _touch_file(self, file_id: str):
+        self._dirty_files.add(file_id)
+        self._wakeup.set()
+
+    def _touch_batch(self, batch_id: str):
+        self._dirty_batches.add(batch_id)
+        self._wakeup.set()
+
+    def _count_file(self, file_id: str):
+        self._counted_files.add(file_id)
+        self._wakeup.set()
+
+    def _count_batch(self, batch_id: str):
+        self._counted_batches.add(batch_id)
+        self._wakeup.set()
+
+    def _touch_settings(self):
+        self._settings_dirty = True
+        self._wakeup.set()
+
+    def _drain(self) -> List[Tuple[str, tuple]]:
+        """Collect all pending writes; serialization happens on the event loop"""
+        ops, self._ops = self._ops, []
+
+        # Reads only change access_count, so update that field in place
+        # instead of re-serializing the whole record
+        for file_id in self._counted_files - self._dirty_files:
+            file_data = self.files.get(file_id)
+            if file_data is not None:
+                ops.append((ACCESS_COUNT_SQL.format(table="files"), (file_data.access_count, file_id)))
+        self._counted_files.clear()
+
+        for batch_id in self._counted_batches - self._dirty_batches:
+            batch_data = self.batches.get(batch_id)
+            if batch_data is not None:
+                ops.append((ACCESS_COUNT_SQL.format(table="batches"), (batch_data.access_count, batch_id)))
+        self._counted_batches.clear()
+
+        for file_id in self._dirty_files:
+            file_data = self.files.get(file_id)
+            if file_data is None:
+                ops.append(("DELETE FROM files WHERE id = ?", (file_id,)))
+            else:
+                ops.append(("INSERT OR REPLACE INTO files (id, data) VALUES (?, ?)", (file_id, json.dumps(file_data.to_dict()))))
+        self._dirty_files.clear()
+
+        for batch_id in self._dirty_batches:
+            batch_data = self.batches.get(batch_id)
+            if batch_data is None:
+                ops.append(("DELETE FROM batches WHERE id = ?", (batch_id,)))
+            else:
+                ops.append(("INSERT OR REPLACE INTO batches (id, data) VALUES (?, ?)", (batch_id, json.dumps(batch_data.to_dict()))))
+        self._dirty_batches.clear()
+
+        if self._settings_dirty:
+            for key in SETTINGS:
+                ops.append(("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, json.dumps(getattr(self, key)))))
+            self._settings_dirty = False
+
+        return ops
+
+    async def _flush(self):
+        ops = self._drain()
+        if not ops:
+            return
+
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self._executor, self._commit, ops)
+        except Exception as e:
+            logger.error(f"Error committing {len(ops)} writes to SQLite: {e}")
+
+    async def _writer(self):
+        """Coalesce writes arriving within flush_interval into one commit"""
+        while True:
+            await self._wakeup.wait()
+            await asyncio.sleep(self.flush_interval)
+            self._wakeup.clear()
+            await self._flush()
+
+    # User management
+    async def add_user(self, user_id: int):
+        if user_id not in self.users:
+            self._queue("INSERT OR IGNORE INTO users (user_id) VALUES (?)", (user_id,))
+        await super().add_user(user_id)
+
+    async def remove_user(self, user_id: int):
+        await super().remove_user(user_id)
+        self._queue("DELETE FROM users WHERE user_id = ?", (user_id,))
+        self._queue("DELETE FROM user_activity WHERE user_id = ?", (user_id,))
+
+    async def touch_user(self, user_id: int, day: Optional[int] = None) -> bool:
+        touched = await super().touch_user(user_id, day)
+        if touched:
+            self._queue(
+                "INSERT OR REPLACE INTO user_activity (user_id, day) VALUES (?, ?)",
+                (user_id, self.last_active[user_id])
+            )
+        return touched
+
+    # Ban management
+    async def ban_user(self, user_id: int):
+        await super().ban_user(user_id)
+        self._queue("INSERT OR IGNORE INTO banned_users (user_id) VALUES (?)", (user_id,))
+
+    async def unban_user(self, user_id: int):
+        await super().unban_user(user_id)
+        self._queue("DELETE FROM banned_users WHERE user_id = ?", (user_id,))
+
+    # Dead peers
+    async def record_dead_peers(self, failures: Dict[int, str], at: Optional[float] = None):
+        await super().record_dead_peers(failures, at)
+        for user_id in failures:
+            count, last_failed, reason = self.dead_peers[user_id]
+            self._queue(
+                "INSERT OR REPLACE INTO dead_peers (user_id, failures, last_failed, reason) VALUES (?, ?, ?, ?)",
+                (user_id, count, last_failed, reason)
+            )
+
+    async def clear_dead_peers(self, user_ids: Iterable[int]) -> List[int]:
+        cleared = await super().clear_dead_peers(user_ids)
+        for user_id in cleared:
+            self._queue("DELETE FROM dead_peers WHERE user_id = ?", (user_id,))
+        return cleared
+
+    # Admin management
+    async def add_admin(self, user_id: int):
+        await super().add_admin(user_id)
+        self._queue("INSERT OR IGNORE INTO admins (user_id) VALUES (?)", (user_id,))
+
+    async def remove_admin(self, user_id: int):
+        await super().remove_admin(user_id)
+        self._queue("DELETE FROM admins WHERE user_id = ?", (user_id,))
+
+    # File management
+    async def save_file(self, file_id: str, file_data: Dict) -> str:
+        existing = self.file_locations.get((file_data.get('channel_id'), file_data.get('message_id')))
+        if existing is not None:
+            return existing
+
+        unique_id = await super().save_file(file_id, file_data)
+        self._touch_file(unique_id)
+        self._touch_settings()
+        return unique_id
+
+    async def get_file(self, file_id: str) -> Optional[FileRecord]:
+        file_data = await super().get_file(file_id)
+        if file_data:
+            self._count_file(file_id)
+        return file_data
+
+    async def update_file_media(self, file_id: str, media_file_id: str):
+        await super().update_file_media(file_id, media_file_id)
+        self._touch_file(file_id)
+
+    async def delete_file(self, file_id: str):
+        await super().delete_file(file_id)
+        self._touch_file(file_id)
+
+    # Batch management
+    async def save_batch(self, batch_id: str, batch_data: Dict) -> str:
+        unique_id = await super().save_batch(batch_id, batch_data)
+        self._touch_batch(unique_id)
+        self._touch_settings()
+        return unique_id
+
+    async def get_batch(self, batch_id: str) -> Optional[BatchRecord]:
+        batch_data = await super().get_batch(batch_id)
+        if batch_data:
+            self._count_batch(batch_id)
+        return batch_data
+
+    async def delete_batch(self, batch_id: str):
+        await super().delete_batch(batch_id)
+        self._touch_batch(batch_id)
+
+    # Force subscription management
+    async def add_force_sub_channel(self, channel_id: int):
+        await super().add_force_sub_channel(channel_id)
+        self._queue("INSERT OR IGNORE INTO force_sub_channels (channel_id) VALUES (?)", (channel_id,))
+
+    async def remove_force_sub_channel(self, channel_id: int):
+        await super().remove_force_sub_channel(channel_id)
+        self._queue("DELETE FROM force_sub_channels WHERE channel_id = ?", (channel_id,))
+
+    async def set_force_sub_enabled(self, enabled: bool):
+        await super().set_force_sub_enabled(enabled)
+        self._touch_settings()
+
+    async def set_channel_mode(self, channel_id: int, mode: str):
+        await super().set_channel_mode(channel_id, mode)
+        if mode == "on":
+            self._queue("INSERT OR REPLACE INTO channel_modes (channel_id, mode) VALUES (?, ?)", (channel_id, mode))
+        else:
+            self._queue("DELETE FROM channel_modes WHERE channel_id = ?", (channel_id,))
+            self._queue("DELETE FROM join_requests WHERE channel_id = ?", (channel_id,))
+
+    async def req_user(self, channel_id: int, user_id: int):
+        await super().req_user(channel_id, user_id)
+        self._queue("INSERT OR IGNORE INTO join_requests (channel_id, user_id) VALUES (?, ?)", (channel_id, user_id))
+
+    async def del_req_user(self, channel_id: int, user_id: int):
+        await super().del_req_user(channel_id, user_id)
+        self._queue("DELETE FROM join_requests WHERE channel_id = ? AND user_id = ?", (channel_id, user_id))
+
+    # Auto delete management
+    async def set_auto_delete_time(self, seconds: int):
+        await super().set_auto_delete_time(seconds)
+        self._touch_settings()
+
+    async def set_auto_delete_enabled(self, enabled: bool):
+        await super().set_auto_delete_enabled(enabled)
+        self._touch_settings()
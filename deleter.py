@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Batched message deletion for the FileStore Bot
+
+Pending deletions are grouped by chat and removed with delete_messages
+calls of up to 100 IDs. A few workers run the calls concurrently under
+the global API rate limiter and back off together on FloodWait.
+"""
+
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Tuple
+from pyrogram import Client
+from pyrogram.errors import FloodWait
+from config import Config
+from ratelimit import TokenBucket, api_limiter
+
+logger = logging.getLogger(__name__)
+
+# Most message IDs a single delete_messages call accepts
+DELETE_CHUNK = 100
+
+# Attempts per chunk when Telegram keeps answering with FloodWait
+MAX_ATTEMPTS = 3
+
+
+class MessageDeleter:
+    def __init__(self, limiter: TokenBucket, workers: int = 8):
+        self.limiter = limiter
+        self.workers = workers
+
+        # Metrics
+        self.deleted: int = 0
+        self.failed: int = 0
+        self.calls: int = 0
+
+    async def delete(self, client: Client, pending: Iterable[Tuple[int, Iterable[int]]]
+                     ) -> Tuple[int, List[Tuple[int, List[int]]]]:
+        """Delete (chat_id, message_ids) pairs
+
+        Returns the number of deleted messages and the (chat_id, message_ids)
+        chunks that could not be deleted.
+        """
+        by_chat: Dict[int, List[int]] = {}
+        for chat_id, message_ids in pending:
+            by_chat.setdefault(chat_id, []).extend(message_ids)
+
+        jobs = asyncio.Queue()
+        for chat_id, message_ids in by_chat.items():
+            for start in range(0, len(message_ids), DELETE_CHUNK):
+                jobs.put_nowait((chat_id, message_ids[start:start + DELETE_CHUNK]))
+
+        deleted = 0
+        failed: List[Tuple[int, List[int]]] = []
+
+        async def worker():
+            nonlocal deleted
+            while not jobs.empty():
+                chat_id, chunk = jobs.get_nowait()
+                if await self._delete_chunk(client, chat_id, chunk):
+                    deleted += len(chunk)
+                else:
+                    failed.append((chat_id, chunk))
+
+        await asyncio.gather(*(worker() for _ in range(min(self.workers, jobs.qsize()))))
+
+        self.deleted += deleted
+        self.failed += sum(len(chunk) for _, chunk in failed)
+        return deleted, failed
+
+    async def _delete_chunk(self, client: Client, chat_id: int, message_ids: List[int]) -> bool:
+        for _ in range(MAX_ATTEMPTS):
+            await self.limiter.acquire()
+            self.calls += 1
+            try:
+                await client.delete_messages(chat_id, message_ids)
+                return True
+            except FloodWait as e:
+                self.limiter.pause(e.value)
+            except Exception as e:
+                logger.error(f"Error deleting {len(message_ids)} messages in {chat_id}: {e}")
+                return False
+
+        logger.error(f"Giving up deleting {len(message_ids)} messages in {chat_id} after repeated FloodWait")
+        return False
+
+    def stats(self) -> Dict:
+        """Get deletion statistics"""
+        return {
+            'deleted': self.deleted,
+            'failed': self.failed,
+            'calls': self.calls
+        }
+
+
+# Global deleter instance
+deleter = MessageDeleter(api_limiter, Config.DELETE_WORKERS)
@@ -11,6 +11,9 @@ from config import *
 from pyrogram.errors.exceptions.bad_request_400 import UserNotParticipant
 from pyrogram.errors import FloodWait
 from database.database import *
+from database.records import format_size
+from cache import LoadingCache, MembershipCache, TTLCache
+from ratelimit import api_limiter
 
 
 
@@ -18,57 +21,104 @@ from database.database import *
 async def check_admin(filter, client, update):
     try:
         user_id = update.from_user.id       
-        return any([user_id == OWNER_ID, await db.admin_exist(user_id)])
+        return any([user_id == Config.OWNER_ID, await client.db.is_admin(user_id)])
     except Exception as e:
         print(f"! Exception in check_admin: {e}")
         return False
 
-async def is_subscribed(client, user_id):
-    channel_ids = await db.show_channels()
+# Force-sub membership answers keyed by (channel_id, user_id); chat_member and
+# chat_join_request updates invalidate them (see plugins/force_sub.py)
+membership_cache = MembershipCache(
+    Config.MEMBERSHIP_CACHE_SIZE, Config.MEMBERSHIP_TTL, Config.MEMBERSHIP_NEGATIVE_TTL
+)
+
+# How long to wait for a join request that may still be on its way
+JOIN_REQUEST_GRACE = 2
+
+# Membership lookups in flight across all requests
+membership_slots = asyncio.Semaphore(Config.FSUB_CHECK_CONCURRENCY)
+
+async def check_subscriptions(client, user_id):
+    """Map every force-sub channel to whether the user is in it
 
-    if not channel_ids:
-        return True
+    Channels are checked concurrently under one deadline. A channel that
+    has not answered when it passes counts as not joined.
+    """
+    # /fsub_mode switches the check off without dropping the channels
+    if not await client.db.is_force_sub_enabled():
+        return {}
+    channel_ids = await client.db.get_force_sub_channels()
 
-    if user_id == OWNER_ID:
-        return True
+    if not channel_ids or user_id == Config.OWNER_ID:
+        return {cid: True for cid in channel_ids or ()}
 
-    for cid in channel_ids:
-        if not await is_sub(client, user_id, cid):
-            # Retry once if join request might be processing
-            mode = await db.get_channel_mode(cid)
-            if mode == "on":
-                await asyncio.sleep(2)  # give time for @on_chat_join_request to process
-                if await is_sub(client, user_id, cid):
-                    continue
-            return False
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + Config.FSUB_CHECK_TIMEOUT
 
-    return True
+    async def check(cid):
+        async with membership_slots:
+            if await is_sub(client, user_id, cid):
+                return True
+
+        # Retry once if join request might be processing
+        mode = await client.db.get_channel_mode(cid)
+        if mode == "on":
+            # @on_chat_join_request invalidates the entry, which ends the wait early
+            grace = min(JOIN_REQUEST_GRACE, deadline - loop.time())
+            if grace > 0 and await membership_cache.wait_invalidated((cid, user_id), grace):
+                async with membership_slots:
+                    return await is_sub(client, user_id, cid)
+        return False
+
+    tasks = {cid: asyncio.create_task(check(cid)) for cid in channel_ids}
+    done, pending = await asyncio.wait(tasks.values(), timeout=max(0, deadline - loop.time()))
+    for task in pending:
+        task.cancel()
+    if pending:
+        print(f"[!] Force-sub check for {user_id} hit the deadline on {len(pending)} channels")
+
+    return {
+        cid: task in done and not task.exception() and task.result()
+        for cid, task in tasks.items()
+    }
+
+async def is_subscribed(client, user_id):
+    return all((await check_subscriptions(client, user_id)).values())
 
 
 async def is_sub(client, user_id, channel_id):
+    key = (channel_id, user_id)
+    subscribed = membership_cache.get(key)
+    if subscribed is not None:
+        return subscribed
+
     try:
         member = await client.get_chat_member(channel_id, user_id)
         status = member.status
         #print(f"[SUB] User {user_id} in {channel_id} with status {status}")
-        return status in {
+        subscribed = status in {
             ChatMemberStatus.OWNER,
             ChatMemberStatus.ADMINISTRATOR,
             ChatMemberStatus.MEMBER
         }
 
     except UserNotParticipant:
-        mode = await db.get_channel_mode(channel_id)
+        mode = await client.db.get_channel_mode(channel_id)
         if mode == "on":
-            exists = await db.req_user_exist(channel_id, user_id)
-            #print(f"[REQ] User {user_id} join request for {channel_id}: {exists}")
-            return exists
-        #print(f"[NOT SUB] User {user_id} not in {channel_id} and mode != on")
-        return False
+            subscribed = await client.db.req_user_exist(channel_id, user_id)
+            #print(f"[REQ] User {user_id} join request for {channel_id}: {subscribed}")
+        else:
+            #print(f"[NOT SUB] User {user_id} not in {channel_id} and mode != on")
+            subscribed = False
 
     except Exception as e:
+        # Not cached: the next check asks Telegram again
         print(f"[!] Error in is_sub(): {e}")
         return False
 
+    membership_cache.set(key, bool(subscribed))
+    return bool(subscribed)
+
 
 async def encode(string):
     string_bytes = string.encode("ascii")
@@ -83,27 +133,126 @@ async def decode(base64_string):
     string = string_bytes.decode("ascii")
     return string
 
-async def get_messages(client, message_ids):
-    messages = []
-    total_messages = 0
-    while total_messages != len(message_ids):
-        temb_ids = message_ids[total_messages:total_messages+200]
+BASE62_ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+BASE62_INDEX = {char: index for index, char in enumerate(BASE62_ALPHABET)}
+
+# One-character link prefixes for record kinds. Legacy base64 payloads start
+# with "Zm" (file_), "Ym" (batch_) or "Z2" (get-), so they never collide.
+LINK_PREFIXES = {"file": "f", "batch": "b"}
+LINK_KINDS = {prefix: kind for kind, prefix in LINK_PREFIXES.items()}
+LINK_ID_BYTES = 8
+
+def base62_encode(data: bytes) -> str:
+    number = int.from_bytes(data, "big")
+    if number == 0:
+        return BASE62_ALPHABET[0]
+    chars = []
+    while number:
+        number, remainder = divmod(number, 62)
+        chars.append(BASE62_ALPHABET[remainder])
+    return "".join(reversed(chars))
+
+def base62_decode(string: str, length: int) -> bytes:
+    number = 0
+    for char in string:
+        number = number * 62 + BASE62_INDEX[char]
+    return number.to_bytes(length, "big")
+
+def encode_link(record_id: str) -> str:
+    """Encode a record ID as a compact ?start= payload"""
+    kind, _, number = record_id.partition("_")
+    if kind in LINK_PREFIXES and number.isdigit():
+        return LINK_PREFIXES[kind] + base62_encode(int(number).to_bytes(LINK_ID_BYTES, "big"))
+
+    # IDs from before the snowflake generator keep the base64 format
+    return base64.urlsafe_b64encode(record_id.encode("ascii")).decode("ascii").strip("=")
+
+def decode_link(payload: str) -> str:
+    """Decode a ?start= payload, accepting compact and legacy base64 links"""
+    kind = LINK_KINDS.get(payload[:1])
+    body = payload[1:]
+    if kind and 0 < len(body) <= 11 and all(char in BASE62_INDEX for char in body):
         try:
-            msgs = await client.get_messages(
-                chat_id=client.db_channel.id,
-                message_ids=temb_ids
-            )
-        except FloodWait as e:
-            await asyncio.sleep(e.x)
-            msgs = await client.get_messages(
-                chat_id=client.db_channel.id,
-                message_ids=temb_ids
-            )
-        except:
+            return f"{kind}_{int.from_bytes(base62_decode(body, LINK_ID_BYTES), 'big')}"
+        except OverflowError:
             pass
-        total_messages += len(temb_ids)
-        messages.extend(msgs)
-    return messages
+
+    payload = payload.strip("=")
+    return base64.urlsafe_b64decode((payload + "=" * (-len(payload) % 4)).encode("ascii")).decode("ascii")
+
+# Chat metadata by chat ID; /addchnl and /delchnl replace or drop entries
+chat_cache = LoadingCache(Config.CHAT_CACHE_SIZE, Config.CHAT_CACHE_TTL)
+
+async def get_chat_info(client, chat_id):
+    """Fetch a chat through the chat cache; concurrent misses share one get_chat"""
+    async def load():
+        try:
+            return await client.get_chat(chat_id)
+        except FloodWait as e:
+            await asyncio.sleep(e.value)
+            return await client.get_chat(chat_id)
+
+    return await chat_cache.get_or_load(chat_id, load)
+
+async def get_chats_info(client, chat_ids):
+    """Fetch several chats at once; a failed lookup is returned as its exception"""
+    return await asyncio.gather(*(get_chat_info(client, chat_id) for chat_id in chat_ids), return_exceptions=True)
+
+# Most message IDs a single get_messages call accepts
+MESSAGES_PER_CALL = 200
+
+# Channel messages by (chat_id, message_id); concurrent misses share one fetch
+message_cache = LoadingCache(Config.MESSAGE_CACHE_SIZE, Config.MESSAGE_CACHE_TTL)
+
+async def get_channel_messages(client, chat_id, message_ids):
+    """Fetch messages from a chat through the message cache, in as few calls as possible"""
+    async def load(keys):
+        missing_ids = [message_id for _, message_id in keys]
+        messages = []
+        for start in range(0, len(missing_ids), MESSAGES_PER_CALL):
+            chunk = missing_ids[start:start + MESSAGES_PER_CALL]
+            try:
+                msgs = await client.get_messages(chat_id=chat_id, message_ids=chunk)
+            except FloodWait as e:
+                await asyncio.sleep(e.value)
+                msgs = await client.get_messages(chat_id=chat_id, message_ids=chunk)
+            messages.extend(msgs)
+        return messages
+
+    return await message_cache.load_many([(chat_id, message_id) for message_id in message_ids], load)
+
+async def get_channel_message(client, chat_id, message_id):
+    """Fetch one message through the message cache"""
+    return (await get_channel_messages(client, chat_id, [message_id]))[0]
+
+async def get_messages(client, message_ids):
+    return await get_channel_messages(client, client.db_channel.id, message_ids)
+
+# Media of range batches as (message_id, name, size), shared by every user opening the same link
+range_cache = TTLCache(Config.RANGE_CACHE_SIZE, Config.CACHE_TTL)
+
+async def get_range_files(client, channel_id, first_id, last_id):
+    """Resolve the media posts in a message ID range, through the shared range cache
+
+    The range is fetched one get_messages page at a time through the shared
+    API rate limiter; only the fields a delivery needs are kept.
+    """
+    key = (channel_id, first_id, last_id)
+    files = range_cache.get(key)
+    if files is not None:
+        return files
+
+    files = []
+    for start in range(first_id, last_id + 1, MESSAGES_PER_CALL):
+        await api_limiter.acquire()
+        msgs = await get_channel_messages(client, channel_id, range(start, min(start + MESSAGES_PER_CALL, last_id + 1)))
+        files.extend(
+            (msg.id, get_name(msg), get_media_file_size(msg))
+            for msg in msgs if msg and not msg.empty and get_media(msg)[0]
+        )
+
+    range_cache.set(key, files)
+    return files
 
 async def get_message_id(client, message):
     if message.forward_from_chat:
@@ -130,6 +279,40 @@ async def get_message_id(client, message):
         return 0
 
 
+MEDIA_TYPES = ("document", "video", "audio", "photo", "animation", "voice", "video_note", "sticker")
+
+def get_media(message):
+    """Return (media_type, media) for the first media attribute set on a message"""
+    for media_type in MEDIA_TYPES:
+        media = getattr(message, media_type, None)
+        if media:
+            return media_type, media
+    return None, None
+
+def get_file_type(message):
+    return get_media(message)[0] or "unknown"
+
+def get_name(message):
+    media_type, media = get_media(message)
+    file_name = getattr(media, "file_name", None)
+    if file_name:
+        return file_name
+    return f"{media_type or 'file'}_{message.id}"
+
+def get_media_file_size(message):
+    return getattr(get_media(message)[1], "file_size", 0) or 0
+
+def get_hash(message):
+    return getattr(get_media(message)[1], "file_unique_id", None)
+
+def get_media_file_id(message):
+    """Telegram file_id of the media, reusable with send_cached_media"""
+    return getattr(get_media(message)[1], "file_id", None)
+
+def get_size(size):
+    return format_size(size)
+
+
 def get_readable_time(seconds: int) -> str:
     count = 0
     up_time = ""
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Invite-link pool for force-sub channels
+
+The join prompt takes links from a small pool per channel and mode
+instead of creating one per unsubscribed user. A background task tops
+the pools up and replaces links well before FSUB_LINK_EXPIRY, through
+the shared API rate limiter. Pools are saved to disk, so they are warm
+again right after a restart.
+"""
+
+import asyncio
+import json
+import os
+import time
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from pyrogram import Client
+from pyrogram.errors import FloodWait
+from config import Config
+from helper_func import get_chats_info
+from ratelimit import TokenBucket, api_limiter
+
+logger = logging.getLogger(__name__)
+
+# (chat_id, creates_join_request)
+PoolKey = Tuple[int, bool]
+# (expires_at or 0 for links that never expire, invite link)
+PooledLink = Tuple[float, str]
+
+
+class InviteLinkPool:
+    def __init__(self, path: str, expiry: int, limiter: TokenBucket, pool_size: int = 3,
+                 refresh_interval: float = 60):
+        self.path = path
+        self.expiry = expiry
+        self.limiter = limiter
+        self.pool_size = pool_size
+
+        # Links are replaced once less than refresh_before seconds remain and
+        # handed out only while more than half of that is left
+        if expiry:
+            self.refresh_before = min(max(expiry * 0.25, 2 * refresh_interval), expiry / 2)
+            self.refresh_interval = min(refresh_interval, self.refresh_before / 2)
+        else:
+            self.refresh_before = 0
+            self.refresh_interval = refresh_interval
+
+        self._pools: Dict[PoolKey, List[PooledLink]] = {}
+        self._next: Dict[PoolKey, int] = {}
+        self._wakeup = asyncio.Event()
+
+        self.client: Optional[Client] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.hits: int = 0
+        self.misses: int = 0
+        self.created: int = 0
+
+    async def start(self, client: Client):
+        """Load saved links, warm the force-sub channels and start refreshing"""
+        self.client = client
+        if self._task:
+            return
+
+        channel_ids = await client.db.get_force_sub_channels()
+        entries = await asyncio.to_thread(self._load)
+        now = time.time()
+        for chat_id, join_request, links in entries:
+            # Channels removed while the bot was down must not be refreshed again
+            if chat_id in channel_ids:
+                self._pools[(chat_id, join_request)] = [
+                    (expires_at, link) for expires_at, link in links if self._servable(expires_at, now)
+                ]
+        if len(self._pools) < len(entries):
+            await self._save()
+
+        # Public channels are linked by username and need no pool
+        for chat_id, chat in zip(channel_ids, await get_chats_info(client, channel_ids)):
+            if isinstance(chat, Exception):
+                logger.error(f"Error looking up force-sub channel {chat_id}: {chat}")
+            elif not chat.username:
+                self.warm(chat_id, await client.db.get_channel_mode(chat_id) == "on")
+
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Invite link pool started for {len(self._pools)} channels")
+
+    async def stop(self):
+        """Stop refreshing and save the pools"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._save()
+
+    def warm(self, chat_id: int, join_request: bool = False):
+        """Have the refresher fill a pool before anyone asks for it"""
+        if self._pools.setdefault((chat_id, join_request), []) == []:
+            self._wakeup.set()
+
+    async def forget(self, chat_id: int):
+        """Drop the pools of a channel that is no longer a force-sub channel"""
+        keys = [key for key in self._pools if key[0] == chat_id]
+        for key in keys:
+            del self._pools[key]
+            self._next.pop(key, None)
+        if keys:
+            await self._save()
+
+    async def get(self, client: Client, chat_id: int, join_request: bool = False) -> str:
+        """An invite link for the channel, taken from the pool in rotation"""
+        key = (chat_id, join_request)
+        now = time.time()
+        links = [entry for entry in self._pools.get(key, ()) if self._servable(entry[0], now)]
+
+        if links:
+            self.hits += 1
+            index = self._next.get(key, 0) % len(links)
+            self._next[key] = index + 1
+            return links[index][1]
+
+        # Empty pool: create one now and let the refresher fill the rest
+        self.misses += 1
+        entry = await self._create(client, chat_id, join_request)
+        self._pools.setdefault(key, []).append(entry)
+        self._wakeup.set()
+        return entry[1]
+
+    def stats(self) -> Dict:
+        """Get pool statistics"""
+        lookups = self.hits + self.misses
+        return {
+            'channels': len(self._pools),
+            'links': sum(len(links) for links in self._pools.values()),
+            'hits': self.hits,
+            'misses': self.misses,
+            'created': self.created,
+            'miss_rate': (self.misses / lookups * 100) if lookups else 0.0
+        }
+
+    def _servable(self, expires_at: float, now: float) -> bool:
+        return not expires_at or expires_at - now > self.refresh_before / 2
+
+    async def _create(self, client: Client, chat_id: int, join_request: bool) -> PooledLink:
+        invite = await client.create_chat_invite_link(
+            chat_id=chat_id,
+            creates_join_request=join_request,
+            expire_date=datetime.now(timezone.utc) + timedelta(seconds=self.expiry) if self.expiry else None
+        )
+        self.created += 1
+        return (time.time() + self.expiry if self.expiry else 0, invite.invite_link)
+
+    # Refresher
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Error refreshing invite links: {e}")
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.refresh_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def refresh(self):
+        """Drop links close to expiry and top every pool up to pool_size"""
+        changed = False
+        for key in list(self._pools):
+            now = time.time()
+            links = [
+                entry for entry in self._pools.get(key, ())
+                if not entry[0] or entry[0] - now > self.refresh_before
+            ]
+            while len(links) < self.pool_size:
+                await self.limiter.acquire()
+                try:
+                    links.append(await self._create(self.client, *key))
+                except FloodWait as e:
+                    self.limiter.pause(e.value)
+                    break
+                except Exception as e:
+                    logger.error(f"Error creating invite link for {key[0]}: {e}")
+                    break
+
+            if key in self._pools:
+                # Links still servable but due for replacement stay until the new ones exist
+                if len(links) < self.pool_size:
+                    links += [entry for entry in self._pools[key] if entry not in links][:self.pool_size - len(links)]
+                changed = changed or links != self._pools[key]
+                self._pools[key] = links
+
+        if changed:
+            await self._save()
+
+    # Persistence
+    def _load(self) -> list:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError) as e:
+            logger.error(f"Error loading invite links from {self.path}: {e}")
+            return []
+
+    def _write(self, entries: list):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(entries, f, separators=(",", ":"))
+        os.replace(self.path + ".tmp", self.path)
+
+    async def _save(self):
+        entries = [(chat_id, join_request, links) for (chat_id, join_request), links in self._pools.items()]
+        try:
+            await asyncio.to_thread(self._write, entries)
+        except Exception as e:
+            logger.error(f"Error saving invite links: {e}")
+
+
+# Global invite link pool
+invite_links = InviteLinkPool(
+    Config.INVITE_LINKS_PATH, Config.FSUB_LINK_EXPIRY, api_limiter, Config.INVITE_POOL_SIZE
+)
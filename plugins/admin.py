@@ -9,7 +9,8 @@ import time
 from pyrogram import Client, filters
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 from config import Config
-from helper_func import get_readable_time, get_size
+from helper_func import get_readable_time, get_size, encode_link, decode_link, message_cache, membership_cache, chat_cache
+from invite_links import invite_links
 
 logger = logging.getLogger(__name__)
 
@@ -32,6 +33,7 @@ async def stats_command(client: Client, message: Message):
 
 👥 **Users:** `{stats['total_users']}`
 🚫 **Banned:** `{stats['total_banned']}`
+🪦 **Unreachable:** `{stats['total_dead_peers']}`
 👮‍♂️ **Admins:** `{stats['total_admins']}`
 
 📁 **Files:** `{stats['current_files']}`
@@ -44,6 +46,46 @@ async def stats_command(client: Client, message: Message):
 ⏱️ **Delete Time:** `{get_readable_time(stats['auto_delete_time'])}`
 """
         
+        dedup_lookups = stats['dedup_hits'] + stats['dedup_misses']
+        stats_text += (
+            f"♻️ **Duplicate Uploads Reused:** `{stats['dedup_hits']}/{dedup_lookups}` "
+            f"(`{(stats['dedup_hits'] / dedup_lookups * 100) if dedup_lookups else 0:.1f}%`)\n"
+        )
+        
+        if 'file_cache' in stats:
+            stats_text += (
+                f"💾 **File Cache:** `{stats['file_cache']['size']}` entries, "
+                f"`{stats['file_cache']['hit_rate']:.1f}%` hits\n"
+                f"💾 **Batch Cache:** `{stats['batch_cache']['size']}` entries, "
+                f"`{stats['batch_cache']['hit_rate']:.1f}%` hits\n"
+            )
+        
+        message_stats = message_cache.stats()
+        stats_text += (
+            f"📨 **Message Cache:** `{message_stats['size']}` entries, "
+            f"`{message_stats['hit_rate']:.1f}%` hits, `{message_stats['coalesced']}` coalesced\n"
+        )
+        
+        chat_stats = chat_cache.stats()
+        stats_text += (
+            f"📢 **Chat Cache:** `{chat_stats['size']}` entries, "
+            f"`{chat_stats['hit_rate']:.1f}%` hits, `{chat_stats['coalesced']}` coalesced\n"
+        )
+        
+        member_stats = membership_cache.stats()
+        stats_text += (
+            f"🔐 **Membership Cache:** `{member_stats['size']}` entries, "
+            f"`{member_stats['hit_rate']:.1f}%` hits "
+            f"(`{member_stats['positive_hits']}` joined / `{member_stats['negative_hits']}` not), "
+            f"`{member_stats['invalidations']}` invalidated\n"
+        )
+        
+        link_stats = invite_links.stats()
+        stats_text += (
+            f"🔗 **Invite Links:** `{link_stats['links']}` pooled for `{link_stats['channels']}` channels, "
+            f"`{link_stats['misses']}` misses (`{link_stats['miss_rate']:.1f}%`), `{link_stats['created']}` created\n"
+        )
+        
         keyboard = InlineKeyboardMarkup([
             [InlineKeyboardButton("🔄 Refresh", callback_data="refresh_stats")]
         ])
@@ -58,19 +100,22 @@ async def stats_command(client: Client, message: Message):
 async def users_command(client: Client, message: Message):
     """Get users information"""
     try:
-        all_users = await client.db.get_all_users()
-        banned_users = await client.db.get_banned_users()
-        
-        total_users = len(all_users)
-        total_banned = len(banned_users)
-        active_users = total_users - total_banned
+        total_users = await client.db.get_users_count()
+        reachable = len(await client.db.get_segment("reachable"))
+        active_1d = len(await client.db.get_segment("active", 1))
+        active_7d = len(await client.db.get_segment("active", 7))
+        active_30d = len(await client.db.get_segment("active", 30))
+        total_banned = len(await client.db.get_segment("banned"))
+        total_dead = len(await client.db.get_segment("dead"))
         
         text = f"""
 👥 **Users Information**
 
 📊 **Total Users:** `{total_users}`
-✅ **Active Users:** `{active_users}`
+✅ **Reachable Users:** `{reachable}`
+🟢 **Active Today / 7d / 30d:** `{active_1d}` / `{active_7d}` / `{active_30d}`
 🚫 **Banned Users:** `{total_banned}`
+🪦 **Unreachable Users:** `{total_dead}`
 
 📈 **User Growth:** +{total_users} users
 📅 **Last Updated:** `{time.strftime('%Y-%m-%d %H:%M:%S')}`
@@ -159,6 +204,43 @@ async def banlist_command(client: Client, message: Message):
         logger.error(f"Error getting banlist: {e}")
         await message.reply_text("❌ Error getting banned users list!")
 
+@Client.on_message(filters.command("myfiles") & admin_only)
+async def myfiles_command(client: Client, message: Message):
+    """List files uploaded by a user, one page at a time"""
+    try:
+        user_id = int(message.command[1]) if len(message.command) > 1 else message.from_user.id
+    except ValueError:
+        await message.reply_text("❌ Usage: `/myfiles [user_id]`")
+        return
+    
+    try:
+        text, keyboard = await render_user_files_page(client, user_id)
+        await message.reply_text(text, reply_markup=keyboard, disable_web_page_preview=True)
+    except Exception as e:
+        logger.error(f"Error listing files for {user_id}: {e}")
+        await message.reply_text("❌ Error getting files list!")
+
+async def render_user_files_page(client: Client, user_id: int, after: tuple = None, page_size: int = 10):
+    """Render one page of a user's files with a cursor button for the next page"""
+    page, next_cursor = await client.db.iter_user_files(user_id, after=after, limit=page_size)
+    
+    if not page:
+        return f"📁 No {'more ' if after else ''}files found for `{user_id}`", None
+    
+    text = f"📁 **Files of** `{user_id}`\n\n"
+    for file_id, file_data in page:
+        link = f"https://t.me/{client.username}?start={encode_link(file_id)}"
+        text += f"• [{file_data['file_name']}]({link}) — `{get_size(file_data['file_size'])}`\n"
+    
+    keyboard = None
+    if next_cursor is not None:
+        created_at, file_id = next_cursor
+        keyboard = InlineKeyboardMarkup([
+            [InlineKeyboardButton("Next ▶️", callback_data=f"myfiles_{user_id}_{created_at!r}_{encode_link(file_id)}")]
+        ])
+    
+    return text, keyboard
+
 @Client.on_message(filters.command(["add_admin", "deladmin"]) & filters.user(Config.OWNER_ID))
 async def manage_admins(client: Client, message: Message):
     """Add or remove admins (owner only)"""
@@ -294,6 +376,20 @@ async def refresh_stats_callback(client: Client, callback_query):
     await stats_command(client, callback_query.message)
     await callback_query.answer("✅ Stats refreshed!")
 
+@Client.on_callback_query(filters.regex(r"myfiles_(-?\d+)_([\d.]+)_(.+)"))
+async def myfiles_page_callback(client: Client, callback_query):
+    """Show the next page of /myfiles"""
+    if callback_query.from_user.id not in Config.ADMINS:
+        await callback_query.answer("❌ Only admins can use this!", show_alert=True)
+        return
+    
+    _, user_id, created_at, file_link = callback_query.data.split("_", 3)
+    cursor = (float(created_at), decode_link(file_link))
+    text, keyboard = await render_user_files_page(client, int(user_id), after=cursor)
+    
+    await callback_query.message.edit_text(text, reply_markup=keyboard, disable_web_page_preview=True)
+    await callback_query.answer()
+
 @Client.on_callback_query(filters.regex(r"toggle_auto_delete_(.+)"))
 async def toggle_auto_delete_callback(client: Client, callback_query):
     """Toggle auto delete callback"""
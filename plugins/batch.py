@@ -8,10 +8,13 @@ import logging
 from pyrogram import Client, filters
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 from config import Config
-from helper_func import encode, get_name, get_media_file_size, get_file_type, get_hash, get_size
+from helper_func import (
+    encode_link, get_media, get_name, get_media_file_size, get_file_type, get_hash, get_media_file_id,
+    get_channel_messages, MESSAGES_PER_CALL
+)
 from shortener import shortener
+from progress import ProgressReporter
 import re
-import asyncio
 
 logger = logging.getLogger(__name__)
 
@@ -54,8 +57,8 @@ async def batch_command(client: Client, message: Message):
         await message.reply_text("❌ First message ID must be smaller than last message ID!")
         return
     
-    if last_msg_id - first_msg_id > 200:
-        await message.reply_text("❌ Maximum 200 messages allowed in a batch!")
+    if last_msg_id - first_msg_id + 1 > Config.MAX_BATCH_RANGE:
+        await message.reply_text(f"❌ Maximum {Config.MAX_BATCH_RANGE} messages allowed in a batch!")
         return
     
     try:
@@ -65,100 +68,34 @@ async def batch_command(client: Client, message: Message):
             await message.reply_text("❌ Invalid channel link format!")
             return
         
-        # Send processing message
-        process_msg = await message.reply_text("🔄 Processing batch... Please wait!")
-        
-        # Process messages
-        file_ids = []
-        processed = 0
-        skipped = 0
-        errors = 0
-        
-        for msg_id in range(first_msg_id, last_msg_id + 1):
-            try:
-                # Get message from channel
-                channel_msg = await client.get_messages(channel_id, msg_id)
-                
-                if not channel_msg:
-                    skipped += 1
-                    continue
-                
-                # Check if message has media
-                if not (channel_msg.document or channel_msg.video or channel_msg.audio or 
-                        channel_msg.photo or channel_msg.animation or channel_msg.voice or 
-                        channel_msg.video_note or channel_msg.sticker):
-                    skipped += 1
-                    continue
-                
-                # Prepare file data
-                file_data = {
-                    'user_id': user_id,
-                    'channel_id': channel_id,
-                    'message_id': msg_id,
-                    'file_name': get_name(channel_msg),
-                    'file_size': get_media_file_size(channel_msg),
-                    'file_type': get_file_type(channel_msg),
-                    'file_hash': get_hash(channel_msg),
-                    'upload_date': channel_msg.date.strftime("%Y-%m-%d %H:%M:%S") if channel_msg.date else "Unknown"
-                }
-                
-                # Add human readable file size
-                file_data['file_size_human'] = get_size(file_data['file_size'])
-                
-                # Save file to database
-                file_id = await client.db.save_file("", file_data)
-                file_ids.append(file_id)
-                
-                processed += 1
-                
-                # Update progress every 10 files
-                if processed % 10 == 0:
-                    await process_msg.edit_text(
-                        f"🔄 Processing batch...\n"
-                        f"✅ Processed: {processed}\n"
-                        f"⏭️ Skipped: {skipped}\n"
-                        f"❌ Errors: {errors}"
-                    )
-                
-                # Small delay to avoid flood
-                await asyncio.sleep(0.1)
-                
-            except Exception as e:
-                logger.error(f"Error processing message {msg_id}: {e}")
-                errors += 1
-                continue
-        
-        if not file_ids:
-            await process_msg.edit_text("❌ No valid media files found in the specified range!")
-            return
-        
-        # Create batch data
+        # Only the range is stored; its media is resolved when the batch is opened
+        total_messages = last_msg_id - first_msg_id + 1
         batch_data = {
             'user_id': user_id,
             'channel_id': channel_id,
-            'file_ids': file_ids,
+            'batch_type': 'range',
             'first_message_id': first_msg_id,
             'last_message_id': last_msg_id,
-            'total_files': len(file_ids),
+            'total_files': total_messages,
             'channel_link': channel_link
         }
         
-        # Save batch to database
-        batch_id = await client.db.save_batch("", batch_data)
+        # A range that already has a link keeps it
+        existing = await client.db.find_range_batch(channel_id, first_msg_id, last_msg_id)
+        if existing:
+            batch_id = existing[0]
+        else:
+            batch_id = await client.db.save_batch("", batch_data)
         
         # Generate shareable link
-        encoded_data = encode(batch_id)
+        encoded_data = encode_link(batch_id)
         share_link = f"https://t.me/{client.username}?start={encoded_data}"
         
         # Create response
         response_text = f"""
 ✅ **Batch Created Successfully!**
 
-📦 **Total Files:** `{len(file_ids)}`
-✅ **Processed:** `{processed}`
-⏭️ **Skipped:** `{skipped}`
-❌ **Errors:** `{errors}`
-
+📦 **Messages:** `{total_messages}`
 📊 **Range:** `{first_msg_id}` to `{last_msg_id}`
 📁 **Channel:** `{channel_id}`
 
@@ -179,9 +116,9 @@ async def batch_command(client: Client, message: Message):
             [InlineKeyboardButton("🗑️ Delete Batch", callback_data=f"delete_batch_{batch_id}")]
         ])
         
-        await process_msg.edit_text(response_text, reply_markup=keyboard, disable_web_page_preview=True)
+        await message.reply_text(response_text, reply_markup=keyboard, disable_web_page_preview=True)
         
-        logger.info(f"Created batch {batch_id} with {len(file_ids)} files by user {user_id}")
+        logger.info(f"Created range batch {batch_id} ({first_msg_id}-{last_msg_id}) by user {user_id}")
         
     except Exception as e:
         logger.error(f"Error creating batch: {e}")
@@ -241,68 +178,63 @@ async def custom_batch_command(client: Client, message: Message):
         # Send processing message
         process_msg = await message.reply_text(f"🔄 Processing custom batch with {len(message_ids)} messages... Please wait!")
         
-        # Process messages
-        file_ids = []
-        processed = 0
+        # Posts stored by an earlier run are not fetched again
+        existing = await client.db.find_files_by_locations(channel_id, message_ids)
+        stored = {msg_id: file_id for msg_id, (file_id, _) in existing.items()}
+        unseen_ids = [msg_id for msg_id in message_ids if msg_id not in stored]
+        
+        # Fetch the rest in bulk and keep the media posts
+        new_files = []
         skipped = 0
         errors = 0
+        reporter = ProgressReporter(
+            process_msg, len(unseen_ids),
+            lambda: (
+                f"🔄 **Processing custom batch...**\n\n"
+                f"✅ Media: {len(stored) + len(new_files)}\n"
+                f"⏭️ Skipped: {skipped}\n"
+                f"❌ Errors: {errors}"
+            )
+        )
         
-        for i, msg_id in enumerate(message_ids):
+        for start in range(0, len(unseen_ids), MESSAGES_PER_CALL):
+            chunk = unseen_ids[start:start + MESSAGES_PER_CALL]
             try:
-                # Get message from channel
-                channel_msg = await client.get_messages(channel_id, msg_id)
-                
-                if not channel_msg:
-                    skipped += 1
-                    continue
-                
-                # Check if message has media
-                if not (channel_msg.document or channel_msg.video or channel_msg.audio or 
-                        channel_msg.photo or channel_msg.animation or channel_msg.voice or 
-                        channel_msg.video_note or channel_msg.sticker):
+                channel_msgs = await get_channel_messages(client, channel_id, chunk)
+            except Exception as e:
+                logger.error(f"Error fetching messages {chunk[0]}-{chunk[-1]}: {e}")
+                errors += len(chunk)
+                await reporter.update(advance=len(chunk))
+                continue
+            
+            for channel_msg in channel_msgs:
+                if not channel_msg or channel_msg.empty or not get_media(channel_msg)[0]:
                     skipped += 1
                     continue
                 
-                # Prepare file data
-                file_data = {
+                new_files.append({
                     'user_id': user_id,
                     'channel_id': channel_id,
-                    'message_id': msg_id,
+                    'message_id': channel_msg.id,
                     'file_name': get_name(channel_msg),
                     'file_size': get_media_file_size(channel_msg),
                     'file_type': get_file_type(channel_msg),
                     'file_hash': get_hash(channel_msg),
-                    'upload_date': channel_msg.date.strftime("%Y-%m-%d %H:%M:%S") if channel_msg.date else "Unknown"
-                }
-                
-                # Add human readable file size
-                file_data['file_size_human'] = get_size(file_data['file_size'])
-                
-                # Save file to database
-                file_id = await client.db.save_file("", file_data)
-                file_ids.append(file_id)
-                
-                processed += 1
-                
-                # Update progress every 10 files
-                if processed % 10 == 0:
-                    await process_msg.edit_text(
-                        f"🔄 Processing custom batch... ({i+1}/{len(message_ids)})\n"
-                        f"✅ Processed: {processed}\n"
-                        f"⏭️ Skipped: {skipped}\n"
-                        f"❌ Errors: {errors}"
-                    )
-                
-                # Small delay to avoid flood
-                await asyncio.sleep(0.1)
-                
-            except Exception as e:
-                logger.error(f"Error processing message {msg_id}: {e}")
-                errors += 1
-                continue
+                    'media_file_id': get_media_file_id(channel_msg),
+                    'upload_date': channel_msg.date
+                })
+            
+            await reporter.update(advance=len(chunk))
+        
+        # Save every new file in one call
+        saved_ids = await client.db.save_files_many(new_files)
+        stored.update(zip((f['message_id'] for f in new_files), saved_ids))
+        
+        file_ids = [stored[msg_id] for msg_id in message_ids if msg_id in stored]
+        processed = len(file_ids)
         
         if not file_ids:
-            await process_msg.edit_text("❌ No valid media files found in the specified messages!")
+            await reporter.finish("❌ No valid media files found in the specified messages!")
             return
         
         # Create batch data
@@ -320,7 +252,7 @@ async def custom_batch_command(client: Client, message: Message):
         batch_id = await client.db.save_batch("", batch_data)
         
         # Generate shareable link
-        encoded_data = encode(batch_id)
+        encoded_data = encode_link(batch_id)
         share_link = f"https://t.me/{client.username}?start={encoded_data}"
         
         # Create response
@@ -352,7 +284,7 @@ async def custom_batch_command(client: Client, message: Message):
             [InlineKeyboardButton("🗑️ Delete Batch", callback_data=f"delete_batch_{batch_id}")]
         ])
         
-        await process_msg.edit_text(response_text, reply_markup=keyboard, disable_web_page_preview=True)
+        await reporter.finish(response_text, reply_markup=keyboard, disable_web_page_preview=True)
         
         logger.info(f"Created custom batch {batch_id} with {len(file_ids)} files by user {user_id}")
         
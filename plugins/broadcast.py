@@ -6,11 +6,17 @@ Broadcast plugin for sending messages to all users
 
 import logging
 import asyncio
+import time
 from pyrogram import Client, filters
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
-from pyrogram.errors import FloodWait, UserIsBlocked, InputUserDeactivated, PeerIdInvalid
+from pyrogram.errors import FloodWait
 from config import Config
-from helper_func import send_msg, get_readable_time
+from helper_func import get_readable_time
+from auto_delete import auto_delete
+from broadcaster import broadcaster
+from broadcast_jobs import BroadcastJob, broadcast_jobs
+from ratelimit import api_limiter
+from progress import ProgressReporter
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +26,41 @@ def admin_filter(_, __, message):
 
 admin_only = filters.create(admin_filter)
 
+# Segments a broadcast can target (see Database.get_segment)
+BROADCAST_SEGMENTS = ("reachable", "active", "inactive", "all", "dead")
+DEFAULT_SEGMENT_DAYS = 30
+
+def parse_segment(args: list) -> tuple:
+    """Read the optional `[segment] [days]` arguments of a broadcast command"""
+    segment = args[0].lower() if args else "reachable"
+    if segment not in BROADCAST_SEGMENTS:
+        raise ValueError(f"Unknown segment: {segment}")
+    days = int(args[1]) if len(args) > 1 else DEFAULT_SEGMENT_DAYS
+    if days < 1:
+        raise ValueError("Days must be positive")
+    return segment, days
+
+def parse_confirm_data(data: str) -> tuple:
+    """Split confirm_<type>_<message_id>[_<segment>_<days>] callback data"""
+    parts = data.split("_")
+    segment, days = parse_segment(parts[3:5])
+    return int(parts[2]), segment, days
+
+def segment_label(segment: str, days: int) -> str:
+    if segment in ("active", "inactive"):
+        return f"{segment} ({days}d)"
+    return segment
+
+async def select_targets(client: Client, segment: str, days: int) -> set:
+    """Users a broadcast to the segment reaches; banned users never are"""
+    targets = await client.db.get_segment(segment, days)
+    targets.difference_update(await client.db.get_banned_users())
+    return targets
+
+SEGMENT_USAGE = (
+    "🎯 **Segments:** `reachable` (default), `active [days]`, `inactive [days]`, `all`, `dead`"
+)
+
 @Client.on_message(filters.command("broadcast") & admin_only)
 async def broadcast_command(client: Client, message: Message):
     """Broadcast message to all users"""
@@ -27,24 +68,32 @@ async def broadcast_command(client: Client, message: Message):
     
     if not message.reply_to_message:
         await message.reply_text(
-            "❌ **Usage:** Reply to a message with `/broadcast`\n\n"
+            "❌ **Usage:** Reply to a message with `/broadcast [segment] [days]`\n\n"
             "📝 **Note:** The replied message will be sent to all bot users.\n"
-            "⚠️ **Warning:** This action cannot be undone!"
+            "⚠️ **Warning:** This action cannot be undone!\n\n"
+            f"{SEGMENT_USAGE}"
         )
         return
     
+    try:
+        segment, days = parse_segment(message.command[1:])
+    except ValueError:
+        await message.reply_text(f"❌ **Invalid segment.**\n\n{SEGMENT_USAGE}")
+        return
+    
     # Get confirmation
     keyboard = InlineKeyboardMarkup([
         [
-            InlineKeyboardButton("✅ Confirm", callback_data=f"confirm_broadcast_{message.reply_to_message.id}"),
+            InlineKeyboardButton("✅ Confirm", callback_data=f"confirm_broadcast_{message.reply_to_message.id}_{segment}_{days}"),
             InlineKeyboardButton("❌ Cancel", callback_data="cancel_broadcast")
         ]
     ])
     
-    users_count = await client.db.get_users_count()
+    users_count = len(await select_targets(client, segment, days))
     
     await message.reply_text(
         f"📢 **Broadcast Confirmation**\n\n"
+        f"🎯 **Segment:** `{segment_label(segment, days)}`\n"
         f"👥 **Target Users:** `{users_count}`\n"
         f"📝 **Message Preview:** [Click to view](https://t.me/c/{str(message.chat.id)[4:]}/{message.reply_to_message.id})\n\n"
         f"⚠️ Are you sure you want to broadcast this message?",
@@ -58,12 +107,19 @@ async def delayed_broadcast_command(client: Client, message: Message):
     
     if not message.reply_to_message:
         await message.reply_text(
-            "❌ **Usage:** Reply to a message with `/dbroadcast`\n\n"
+            "❌ **Usage:** Reply to a message with `/dbroadcast [segment] [days]`\n\n"
             "📝 **Note:** The message will be sent to all users and auto-deleted after the configured time.\n"
-            "⚠️ **Warning:** This action cannot be undone!"
+            "⚠️ **Warning:** This action cannot be undone!\n\n"
+            f"{SEGMENT_USAGE}"
         )
         return
     
+    try:
+        segment, days = parse_segment(message.command[1:])
+    except ValueError:
+        await message.reply_text(f"❌ **Invalid segment.**\n\n{SEGMENT_USAGE}")
+        return
+    
     # Get auto-delete time
     delete_time = await client.db.get_auto_delete_time()
     readable_time = get_readable_time(delete_time)
@@ -71,15 +127,16 @@ async def delayed_broadcast_command(client: Client, message: Message):
     # Get confirmation
     keyboard = InlineKeyboardMarkup([
         [
-            InlineKeyboardButton("✅ Confirm", callback_data=f"confirm_dbroadcast_{message.reply_to_message.id}"),
+            InlineKeyboardButton("✅ Confirm", callback_data=f"confirm_dbroadcast_{message.reply_to_message.id}_{segment}_{days}"),
             InlineKeyboardButton("❌ Cancel", callback_data="cancel_broadcast")
         ]
     ])
     
-    users_count = await client.db.get_users_count()
+    users_count = len(await select_targets(client, segment, days))
     
     await message.reply_text(
         f"📢 **Auto-Delete Broadcast Confirmation**\n\n"
+        f"🎯 **Segment:** `{segment_label(segment, days)}`\n"
         f"👥 **Target Users:** `{users_count}`\n"
         f"🗑️ **Auto-Delete Time:** `{readable_time}`\n"
         f"📝 **Message Preview:** [Click to view](https://t.me/c/{str(message.chat.id)[4:]}/{message.reply_to_message.id})\n\n"
@@ -94,24 +151,32 @@ async def pin_broadcast_command(client: Client, message: Message):
     
     if not message.reply_to_message:
         await message.reply_text(
-            "❌ **Usage:** Reply to a message with `/pbroadcast`\n\n"
+            "❌ **Usage:** Reply to a message with `/pbroadcast [segment] [days]`\n\n"
             "📝 **Note:** The message will be sent and pinned to all users' private chats.\n"
-            "⚠️ **Warning:** This action cannot be undone!"
+            "⚠️ **Warning:** This action cannot be undone!\n\n"
+            f"{SEGMENT_USAGE}"
         )
         return
     
+    try:
+        segment, days = parse_segment(message.command[1:])
+    except ValueError:
+        await message.reply_text(f"❌ **Invalid segment.**\n\n{SEGMENT_USAGE}")
+        return
+    
     # Get confirmation
     keyboard = InlineKeyboardMarkup([
         [
-            InlineKeyboardButton("✅ Confirm", callback_data=f"confirm_pbroadcast_{message.reply_to_message.id}"),
+            InlineKeyboardButton("✅ Confirm", callback_data=f"confirm_pbroadcast_{message.reply_to_message.id}_{segment}_{days}"),
             InlineKeyboardButton("❌ Cancel", callback_data="cancel_broadcast")
         ]
     ])
     
-    users_count = await client.db.get_users_count()
+    users_count = len(await select_targets(client, segment, days))
     
     await message.reply_text(
         f"📌 **Pin Broadcast Confirmation**\n\n"
+        f"🎯 **Segment:** `{segment_label(segment, days)}`\n"
         f"👥 **Target Users:** `{users_count}`\n"
         f"📝 **Message Preview:** [Click to view](https://t.me/c/{str(message.chat.id)[4:]}/{message.reply_to_message.id})\n\n"
         f"⚠️ Are you sure you want to pin broadcast this message?",
@@ -126,7 +191,7 @@ async def confirm_broadcast_callback(client: Client, callback_query):
         await callback_query.answer("❌ Only admins can use this!", show_alert=True)
         return
     
-    message_id = int(callback_query.data.split("_")[2])
+    message_id, segment, days = parse_confirm_data(callback_query.data)
     
     try:
         # Get the message to broadcast
@@ -137,7 +202,7 @@ async def confirm_broadcast_callback(client: Client, callback_query):
         
         # Start broadcasting
         await callback_query.answer("✅ Broadcasting started!")
-        await start_broadcast(client, callback_query.message, broadcast_msg, "normal")
+        await start_broadcast(client, callback_query.message, broadcast_msg, "normal", segment=segment, days=days)
         
     except Exception as e:
         logger.error(f"Error in broadcast confirmation: {e}")
@@ -150,7 +215,7 @@ async def confirm_dbroadcast_callback(client: Client, callback_query):
         await callback_query.answer("❌ Only admins can use this!", show_alert=True)
         return
     
-    message_id = int(callback_query.data.split("_")[2])
+    message_id, segment, days = parse_confirm_data(callback_query.data)
     
     try:
         # Get the message to broadcast
@@ -161,7 +226,7 @@ async def confirm_dbroadcast_callback(client: Client, callback_query):
         
         # Start broadcasting
         await callback_query.answer("✅ Auto-delete broadcasting started!")
-        await start_broadcast(client, callback_query.message, broadcast_msg, "auto_delete")
+        await start_broadcast(client, callback_query.message, broadcast_msg, "auto_delete", segment=segment, days=days)
         
     except Exception as e:
         logger.error(f"Error in dbroadcast confirmation: {e}")
@@ -174,7 +239,7 @@ async def confirm_pbroadcast_callback(client: Client, callback_query):
         await callback_query.answer("❌ Only admins can use this!", show_alert=True)
         return
     
-    message_id = int(callback_query.data.split("_")[2])
+    message_id, segment, days = parse_confirm_data(callback_query.data)
     
     try:
         # Get the message to broadcast
@@ -185,7 +250,7 @@ async def confirm_pbroadcast_callback(client: Client, callback_query):
         
         # Start broadcasting
         await callback_query.answer("✅ Pin broadcasting started!")
-        await start_broadcast(client, callback_query.message, broadcast_msg, "pin")
+        await start_broadcast(client, callback_query.message, broadcast_msg, "pin", segment=segment, days=days)
         
     except Exception as e:
         logger.error(f"Error in pbroadcast confirmation: {e}")
@@ -201,107 +266,117 @@ async def cancel_broadcast_callback(client: Client, callback_query):
         reply_markup=None
     )
 
-async def start_broadcast(client: Client, status_message: Message, broadcast_msg: Message, broadcast_type: str):
-    """Start the broadcasting process"""
+BROADCAST_TYPE_NAMES = {
+    "normal": "Broadcast",
+    "auto_delete": "Auto-Delete Broadcast",
+    "pin": "Pin Broadcast"
+}
+
+# Jobs currently being sent by this process
+running_jobs = set()
+
+# Broadcast outcomes that mean the user cannot be reached any more
+DEAD_OUTCOMES = ("blocked", "deleted")
+
+# Dead-peer updates written to the database at a time
+DEAD_PEER_FLUSH = 500
+
+async def start_broadcast(client: Client, status_message: Message, broadcast_msg: Message, broadcast_type: str,
+                          job: BroadcastJob = None, segment: str = "reachable", days: int = DEFAULT_SEGMENT_DAYS):
+    """Start the broadcasting process, or continue an unfinished job"""
+    if job is None:
+        job = await broadcast_jobs.create(
+            broadcast_msg.chat.id, broadcast_msg.id, broadcast_type, status_message.chat.id, segment, days
+        )
     
-    # Get all users
-    all_users = await client.db.get_all_users()
-    banned_users = await client.db.get_banned_users()
+    running_jobs.add(job.job_id)
+    try:
+        await run_broadcast(client, status_message, broadcast_msg, job)
+    finally:
+        running_jobs.discard(job.job_id)
+
+async def run_broadcast(client: Client, status_message: Message, broadcast_msg: Message, job: BroadcastJob):
+    broadcast_type = job.mode
     
-    # Filter out banned users
-    target_users = [user for user in all_users if user not in banned_users]
+    # Segment users (set algebra, no per-user filtering) minus anyone this job already handled
+    target_users = job.remaining(await select_targets(client, job.segment, job.days))
+    job.total = job.processed + len(target_users)
+    total_users = job.total
     
-    total_users = len(target_users)
-    success_count = 0
-    failed_count = 0
-    blocked_count = 0
-    deleted_count = 0
+    def render() -> str:
+        counts = job.counts
+        return (
+            f"📢 **Broadcasting in Progress...**\n\n"
+            f"👥 **Total Users:** `{total_users}`\n"
+            f"✅ **Sent:** `{counts['sent']}`\n"
+            f"❌ **Failed:** `{counts['failed']}`\n"
+            f"🚫 **Blocked:** `{counts['blocked']}`\n"
+            f"👻 **Deleted:** `{counts['deleted']}`"
+        )
+    
+    reporter = ProgressReporter(status_message, total_users, render, done=job.processed)
     
     # Update status message
-    await status_message.edit_text(
-        f"📢 **Broadcasting in Progress...**\n\n"
-        f"👥 **Total Users:** `{total_users}`\n"
-        f"✅ **Sent:** `0`\n"
-        f"❌ **Failed:** `0`\n"
-        f"🚫 **Blocked:** `0`\n"
-        f"👻 **Deleted:** `0`\n\n"
-        f"⏳ **Progress:** `0%`"
-    )
+    await reporter.show()
     
-    # Track messages for auto-delete
-    sent_messages = []
+    async def report(stats: dict):
+        await reporter.update(job.processed)
     
-    # Start broadcasting
-    for i, user_id in enumerate(target_users):
-        try:
-            if broadcast_type == "pin":
-                # Send and pin the message
-                sent_msg = await broadcast_msg.copy(user_id)
-                try:
-                    await client.pin_chat_message(user_id, sent_msg.id, disable_notification=True)
-                except:
-                    pass  # Ignore pin errors
-            else:
-                # Regular send
-                sent_msg = await broadcast_msg.copy(user_id)
-            
-            success_count += 1
-            
-            # Store message for auto-delete
-            if broadcast_type == "auto_delete":
-                sent_messages.append((user_id, sent_msg.id))
-            
-        except FloodWait as e:
-            await asyncio.sleep(e.x)
+    if broadcast_type == "auto_delete":
+        delete_time = await client.db.get_auto_delete_time()
+    
+    async def send(user_id: int) -> Message:
+        sent_msg = await broadcast_msg.copy(user_id)
+        if broadcast_type == "pin":
+            # Pinning is a second API call
+            await api_limiter.acquire()
             try:
-                sent_msg = await broadcast_msg.copy(user_id)
-                success_count += 1
-                
-                if broadcast_type == "auto_delete":
-                    sent_messages.append((user_id, sent_msg.id))
-                    
+                await client.pin_chat_message(user_id, sent_msg.id, disable_notification=True)
+            except FloodWait as e:
+                # The message is delivered; skip the pin but hold every sender back
+                api_limiter.pause(e.value)
             except Exception:
-                failed_count += 1
-                
-        except UserIsBlocked:
-            blocked_count += 1
-            
-        except InputUserDeactivated:
-            deleted_count += 1
-            
-        except PeerIdInvalid:
-            deleted_count += 1
-            
+                pass  # Ignore pin errors
+        elif broadcast_type == "auto_delete":
+            # Scheduled with the persistent auto-delete queue so it survives restarts too
+            await auto_delete.schedule(user_id, [sent_msg.id], delete_time)
+        return sent_msg
+    
+    # Terminal failures feed the dead-peer index; a delivery resets a user's count
+    dead, reached = {}, []
+    
+    async def flush_dead_peers():
+        failures, delivered = dict(dead), list(reached)
+        dead.clear()
+        reached.clear()
+        try:
+            if failures:
+                await client.db.record_dead_peers(failures)
+            if delivered:
+                await client.db.clear_dead_peers(delivered)
         except Exception as e:
-            failed_count += 1
-            logger.error(f"Error broadcasting to {user_id}: {e}")
-        
-        # Update progress every 50 users or at the end
-        if (i + 1) % 50 == 0 or i == total_users - 1:
-            progress = ((i + 1) / total_users) * 100
-            
-            try:
-                await status_message.edit_text(
-                    f"📢 **Broadcasting in Progress...**\n\n"
-                    f"👥 **Total Users:** `{total_users}`\n"
-                    f"✅ **Sent:** `{success_count}`\n"
-                    f"❌ **Failed:** `{failed_count}`\n"
-                    f"🚫 **Blocked:** `{blocked_count}`\n"
-                    f"👻 **Deleted:** `{deleted_count}`\n\n"
-                    f"⏳ **Progress:** `{progress:.1f}%`"
-                )
-            except:
-                pass
-        
-        # Small delay to avoid flooding
-        await asyncio.sleep(0.1)
+            logger.error(f"Error updating dead peers: {e}")
+    
+    async def checkpoint(user_id: int, outcome: str, sent_msg: Message):
+        await broadcast_jobs.checkpoint(job, user_id, outcome)
+        if outcome in DEAD_OUTCOMES:
+            dead[user_id] = outcome
+        elif outcome == "sent":
+            reached.append(user_id)
+        if len(dead) + len(reached) >= DEAD_PEER_FLUSH:
+            await flush_dead_peers()
+    
+    stats = await broadcaster.run(target_users, send, progress=report, on_done=checkpoint)
+    await flush_dead_peers()
+    await broadcast_jobs.finish(job)
+    
+    success_count = job.counts['sent']
+    failed_count = job.counts['failed']
+    blocked_count = job.counts['blocked']
+    deleted_count = job.counts['deleted']
     
     # Final status update
-    broadcast_type_name = {
-        "normal": "Broadcast",
-        "auto_delete": "Auto-Delete Broadcast", 
-        "pin": "Pin Broadcast"
-    }.get(broadcast_type, "Broadcast")
+    broadcast_type_name = BROADCAST_TYPE_NAMES.get(broadcast_type, "Broadcast")
     
     final_text = f"""
 ✅ **{broadcast_type_name} Completed!**
@@ -314,40 +389,94 @@ async def start_broadcast(client: Client, status_message: Message, broadcast_msg
 👻 **Deleted Account:** `{deleted_count}`
 
 📈 **Success Rate:** `{(success_count/total_users*100) if total_users > 0 else 0:.1f}%`
+⏱️ **Time Taken:** `{get_readable_time(int(time.time() - job.started))}`
 """
     
     if broadcast_type == "auto_delete":
-        delete_time = await client.db.get_auto_delete_time()
         readable_time = get_readable_time(delete_time)
         final_text += f"\n🗑️ **Auto-Delete:** Messages will be deleted in `{readable_time}`"
     
-    await status_message.edit_text(final_text)
-    
-    # Schedule auto-delete if needed
-    if broadcast_type == "auto_delete" and sent_messages:
-        asyncio.create_task(schedule_broadcast_delete(client, sent_messages))
+    await reporter.finish(final_text)
     
-    logger.info(f"Broadcast completed: {success_count}/{total_users} sent successfully")
+    logger.info(f"Broadcast completed: {success_count}/{total_users} sent successfully in {stats['elapsed']:.0f}s")
 
-async def schedule_broadcast_delete(client: Client, sent_messages: list):
-    """Schedule deletion of broadcast messages"""
+async def resume_broadcast(client: Client, job: BroadcastJob):
+    """Continue an unfinished broadcast with a fresh status message"""
     try:
-        delete_time = await client.db.get_auto_delete_time()
-        await asyncio.sleep(delete_time)
-        
-        deleted_count = 0
-        
-        for user_id, message_id in sent_messages:
-            try:
-                await client.delete_messages(user_id, message_id)
-                deleted_count += 1
-            except Exception as e:
-                logger.error(f"Error deleting broadcast message for {user_id}: {e}")
-            
-            # Small delay
-            await asyncio.sleep(0.1)
+        broadcast_msg = await client.get_messages(job.source_chat_id, job.source_message_id)
+        if not broadcast_msg or broadcast_msg.empty:
+            logger.error(f"Dropping broadcast {job.job_id}: source message no longer exists")
+            await broadcast_jobs.finish(job)
+            return
         
-        logger.info(f"Auto-deleted {deleted_count}/{len(sent_messages)} broadcast messages")
+        status_message = await client.send_message(
+            job.status_chat_id,
+            f"🔄 **Resuming {BROADCAST_TYPE_NAMES.get(job.mode, 'Broadcast')}...**\n\n"
+            f"✅ **Already Handled:** `{job.processed}`"
+        )
+        await start_broadcast(client, status_message, broadcast_msg, job.mode, job)
         
     except Exception as e:
-        logger.error(f"Error in broadcast auto-delete: {e}")
+        logger.error(f"Error resuming broadcast {job.job_id}: {e}")
+    finally:
+        running_jobs.discard(job.job_id)
+
+async def resume_broadcasts(client: Client) -> list:
+    """Start every unfinished broadcast that is not already running"""
+    jobs = [job for job in broadcast_jobs.pending() if job.job_id not in running_jobs]
+    for job in jobs:
+        running_jobs.add(job.job_id)
+        asyncio.create_task(resume_broadcast(client, job))
+    return jobs
+
+@Client.on_message(filters.command("prune_dead") & admin_only)
+async def prune_dead_command(client: Client, message: Message):
+    """Report how much the dead-peer index shrinks the broadcast target list"""
+    all_users = await client.db.get_users_count()
+    banned_users = await client.db.get_segment("banned")
+    before = await select_targets(client, "all", 0)
+    after = await select_targets(client, "reachable", 0)
+    peer_stats = await client.db.get_dead_peer_stats()
+    
+    pruned = len(before) - len(after)
+    shrink = (pruned / len(before) * 100) if before else 0
+    
+    text = (
+        f"🪦 **Dead Peer Report**\n\n"
+        f"👥 **Users:** `{all_users}`\n"
+        f"🚫 **Banned:** `{len(banned_users)}`\n"
+        f"📇 **Dead Peer Index:** `{peer_stats['total']}`\n"
+    )
+    for reason, count in sorted(peer_stats['reasons'].items()):
+        text += f"  • {reason.capitalize()}: `{count}`\n"
+    text += (
+        f"🔁 **Skip Threshold:** `{Config.DEAD_PEER_THRESHOLD}` consecutive failures\n\n"
+        f"🎯 **Broadcast Targets:** `{len(before)}` → `{len(after)}`\n"
+        f"✂️ **Pruned:** `{pruned}` (`{shrink:.1f}%`)\n"
+        f"⏱️ **Saved Per Broadcast:** `{get_readable_time(int(pruned / Config.API_RATE_LIMIT))}`"
+    )
+    if peer_stats['oldest_failure']:
+        age = int(time.time() - peer_stats['oldest_failure'])
+        text += f"\n📅 **Oldest Failure:** `{get_readable_time(age)}` ago"
+    
+    await message.reply_text(text)
+
+@Client.on_message(filters.command("broadcast_resume") & admin_only)
+async def broadcast_resume_command(client: Client, message: Message):
+    """Resume broadcasts interrupted by a restart"""
+    if not broadcast_jobs.pending():
+        await message.reply_text("✅ **No unfinished broadcasts.**")
+        return
+    
+    jobs = await resume_broadcasts(client)
+    if not jobs:
+        await message.reply_text("⏳ **All unfinished broadcasts are already running.**")
+        return
+    
+    text = "🔄 **Resuming Broadcasts**\n\n"
+    for job in jobs:
+        text += (
+            f"• {BROADCAST_TYPE_NAMES.get(job.mode, 'Broadcast')}: "
+            f"`{job.processed}/{job.total}` handled\n"
+        )
+    await message.reply_text(text)
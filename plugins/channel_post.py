@@ -8,7 +8,7 @@ import logging
 from pyrogram import Client, filters
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 from config import Config
-from helper_func import encode, get_name, get_media_file_size, get_file_type, get_hash, get_size
+from helper_func import encode_link, get_name, get_media_file_size, get_file_type, get_hash, get_media_file_id, get_size
 from shortener import shortener
 
 logger = logging.getLogger(__name__)
@@ -28,6 +28,12 @@ async def handle_channel_post(client: Client, message: Message):
         return
     
     try:
+        # Don't index media the channel already holds
+        existing = await client.db.find_file_by_hash(get_hash(message))
+        if existing:
+            logger.info(f"Channel post {message.id} duplicates stored file {existing[0]}, skipping")
+            return
+        
         # Prepare file data
         file_data = {
             'user_id': 0,  # System generated
@@ -37,18 +43,16 @@ async def handle_channel_post(client: Client, message: Message):
             'file_size': get_media_file_size(message),
             'file_type': get_file_type(message),
             'file_hash': get_hash(message),
+            'media_file_id': get_media_file_id(message),
             'auto_generated': True,
-            'upload_date': message.date.strftime("%Y-%m-%d %H:%M:%S") if message.date else "Unknown"
+            'upload_date': message.date
         }
         
-        # Add human readable file size
-        file_data['file_size_human'] = get_size(file_data['file_size'])
-        
         # Save file to database
         file_id = await client.db.save_file("", file_data)
         
         # Generate shareable link
-        encoded_data = encode(file_id)
+        encoded_data = encode_link(file_id)
         share_link = f"https://t.me/{client.username}?start={encoded_data}"
         
         logger.info(f"Auto-generated link for channel post {message.id}: {file_id}")
@@ -99,19 +103,17 @@ async def handle_genlink_hashtag(client: Client, message: Message):
             'file_size': get_media_file_size(replied_msg),
             'file_type': get_file_type(replied_msg),
             'file_hash': get_hash(replied_msg),
+            'media_file_id': get_media_file_id(replied_msg),
             'auto_generated': True,
             'hashtag_triggered': True,
-            'upload_date': replied_msg.date.strftime("%Y-%m-%d %H:%M:%S") if replied_msg.date else "Unknown"
+            'upload_date': replied_msg.date
         }
         
-        # Add human readable file size
-        file_data['file_size_human'] = get_size(file_data['file_size'])
-        
         # Save file to database
         file_id = await client.db.save_file("", file_data)
         
         # Generate shareable link
-        encoded_data = encode(file_id)
+        encoded_data = encode_link(file_id)
         share_link = f"https://t.me/{client.username}?start={encoded_data}"
         
         # Create response message
@@ -119,7 +121,7 @@ async def handle_genlink_hashtag(client: Client, message: Message):
 🔗 **Link Generated**
 
 📁 **File:** `{file_data['file_name']}`
-📊 **Size:** `{file_data['file_size_human']}`
+📊 **Size:** `{get_size(file_data['file_size'])}`
 🔗 **Link:** `{share_link}`
 """
         
@@ -168,31 +170,34 @@ async def handle_group_genlink_request(client: Client, message: Message):
         return
     
     try:
-        # Forward the media to the storage channel first
-        forwarded_msg = await replied_msg.forward(Config.CHANNEL_ID)
-        
-        # Prepare file data
-        file_data = {
-            'user_id': user_id,
-            'channel_id': Config.CHANNEL_ID,
-            'message_id': forwarded_msg.id,
-            'file_name': get_name(replied_msg),
-            'file_size': get_media_file_size(replied_msg),
-            'file_type': get_file_type(replied_msg),
-            'file_hash': get_hash(replied_msg),
-            'from_group': True,
-            'group_id': message.chat.id,
-            'upload_date': replied_msg.date.strftime("%Y-%m-%d %H:%M:%S") if replied_msg.date else "Unknown"
-        }
-        
-        # Add human readable file size
-        file_data['file_size_human'] = get_size(file_data['file_size'])
-        
-        # Save file to database
-        file_id = await client.db.save_file("", file_data)
+        # Reuse the stored copy if this media was uploaded before
+        existing = await client.db.find_file_by_hash(get_hash(replied_msg))
+        if existing:
+            file_id, file_data = existing
+        else:
+            # Forward the media to the storage channel first
+            forwarded_msg = await replied_msg.forward(Config.CHANNEL_ID)
+            
+            # Prepare file data
+            file_data = {
+                'user_id': user_id,
+                'channel_id': Config.CHANNEL_ID,
+                'message_id': forwarded_msg.id,
+                'file_name': get_name(replied_msg),
+                'file_size': get_media_file_size(replied_msg),
+                'file_type': get_file_type(replied_msg),
+                'file_hash': get_hash(replied_msg),
+                'media_file_id': get_media_file_id(replied_msg),
+                'from_group': True,
+                'group_id': message.chat.id,
+                'upload_date': replied_msg.date
+            }
+            
+            # Save file to database
+            file_id = await client.db.save_file("", file_data)
         
         # Generate shareable link
-        encoded_data = encode(file_id)
+        encoded_data = encode_link(file_id)
         share_link = f"https://t.me/{client.username}?start={encoded_data}"
         
         # Create response message
@@ -200,7 +205,7 @@ async def handle_group_genlink_request(client: Client, message: Message):
 ✅ **Link Generated Successfully!**
 
 📁 **File:** `{file_data['file_name']}`
-📊 **Size:** `{file_data['file_size_human']}`
+📊 **Size:** `{get_size(file_data['file_size'])}`
 🔗 **Link:** `{share_link}`
 
 👆 Click the button below to get the file!
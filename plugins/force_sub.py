@@ -6,9 +6,15 @@ Force subscription management plugin
 
 import logging
 from pyrogram import Client, filters
-from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
+from pyrogram.enums import ChatMemberStatus
+from pyrogram.types import (
+    Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery, ChatMemberUpdated, ChatJoinRequest
+)
 from pyrogram.errors import ChatAdminRequired, ChannelInvalid, PeerIdInvalid
 from config import Config
+from helper_func import membership_cache, chat_cache, get_chat_info, get_chats_info
+from invite_links import invite_links
+from progress import ProgressReporter
 
 logger = logging.getLogger(__name__)
 
@@ -69,6 +75,9 @@ async def add_channel_command(client: Client, message: Message):
         
         # Add channel to force subscription
         await client.db.add_force_sub_channel(channel.id)
+        chat_cache.set(channel.id, channel)  # fresh lookup replaces stale metadata
+        if not channel.username:
+            invite_links.warm(channel.id)
         
         # Create response
         channel_link = f"https://t.me/{channel.username}" if channel.username else f"Channel ID: {channel.id}"
@@ -125,7 +134,7 @@ async def delete_channel_command(client: Client, message: Message):
         else:
             try:
                 channel_id = int(channel_input)
-                channel = await client.get_chat(channel_id)
+                channel = await get_chat_info(client, channel_id)
             except ValueError:
                 await message.reply_text("❌ Invalid channel ID! Please provide a valid number or username.")
                 return
@@ -138,6 +147,8 @@ async def delete_channel_command(client: Client, message: Message):
         
         # Remove channel from force subscription
         await client.db.remove_force_sub_channel(channel_id)
+        await invite_links.forget(channel_id)
+        chat_cache.pop(channel_id)
         
         # Create response
         response_text = f"""
@@ -177,18 +188,20 @@ async def list_channels_command(client: Client, message: Message):
         
         response_text = f"📝 **Force Subscription Channels** ({len(force_sub_channels)})\n\n"
         
-        for i, channel_id in enumerate(force_sub_channels, 1):
-            try:
-                channel = await client.get_chat(channel_id)
-                channel_link = f"https://t.me/{channel.username}" if channel.username else "Private Channel"
-                response_text += f"`{i}.` **{channel.title}**\n"
-                response_text += f"    🆔 `{channel_id}`\n"
-                response_text += f"    🔗 {channel_link}\n"
-                response_text += f"    👥 {channel.members_count if hasattr(channel, 'members_count') else 'Unknown'} members\n\n"
-            except Exception as e:
+        # Look every channel up at once, mostly from the chat cache
+        channels = await get_chats_info(client, force_sub_channels)
+        
+        for i, (channel_id, channel) in enumerate(zip(force_sub_channels, channels), 1):
+            if isinstance(channel, Exception):
                 response_text += f"`{i}.` **Unknown Channel**\n"
                 response_text += f"    🆔 `{channel_id}`\n"
-                response_text += f"    ⚠️ Error: {str(e)}\n\n"
+                response_text += f"    ⚠️ Error: {str(channel)}\n\n"
+                continue
+            channel_link = f"https://t.me/{channel.username}" if channel.username else "Private Channel"
+            response_text += f"`{i}.` **{channel.title}**\n"
+            response_text += f"    🆔 `{channel_id}`\n"
+            response_text += f"    🔗 {channel_link}\n"
+            response_text += f"    👥 {channel.members_count if hasattr(channel, 'members_count') else 'Unknown'} members\n\n"
         
         # Get force sub status
         is_enabled = await client.db.is_force_sub_enabled()
@@ -251,6 +264,40 @@ async def fsub_mode_command(client: Client, message: Message):
         logger.error(f"Error toggling force sub mode: {e}")
         await message.reply_text("❌ Error toggling force subscription mode!")
 
+@Client.on_message(filters.command("reqmode") & admin_only)
+async def request_mode_command(client: Client, message: Message):
+    """Let a join request count as joined for a force sub channel"""
+    if len(message.command) < 3 or message.command[2].lower() not in ("on", "off"):
+        await message.reply_text(
+            "❌ **Usage:** `/reqmode <channel_id> on|off`\n\n"
+            "📝 **Note:** With request mode on, users who sent a join request count as joined."
+        )
+        return
+    
+    try:
+        channel_id = int(message.command[1])
+    except ValueError:
+        await message.reply_text("❌ Invalid channel ID! Please provide a valid number.")
+        return
+    
+    if channel_id not in await client.db.get_force_sub_channels():
+        await message.reply_text("⚠️ This channel is not in the force subscription list!")
+        return
+    
+    mode = message.command[2].lower()
+    await client.db.set_channel_mode(channel_id, mode)
+    # Cached answers and pooled links were made for the old mode
+    membership_cache.clear()
+    await invite_links.forget(channel_id)
+    try:
+        if not (await get_chat_info(client, channel_id)).username:
+            invite_links.warm(channel_id, join_request=mode == "on")
+    except Exception as e:
+        logger.error(f"Error looking up channel {channel_id}: {e}")
+    
+    await message.reply_text(f"✅ Request mode for `{channel_id}` is now **{mode}**.")
+    logger.info(f"Request mode of {channel_id} set to {mode} by user {message.from_user.id}")
+
 @Client.on_message(filters.command("delreq") & admin_only)
 async def delete_requests_command(client: Client, message: Message):
     """Remove users who left channels and are not getting force sub requests"""
@@ -267,6 +314,10 @@ async def delete_requests_command(client: Client, message: Message):
         
         removed_users = []
         checked_count = 0
+        reporter = ProgressReporter(
+            status_msg, len(all_users),
+            lambda: f"🔄 **Checking user subscriptions...**\n\n🗑️ Removed: {len(removed_users)}"
+        )
         
         for user_id in all_users:
             try:
@@ -286,14 +337,7 @@ async def delete_requests_command(client: Client, message: Message):
                         break
                 
                 checked_count += 1
-                
-                # Update progress every 50 users
-                if checked_count % 50 == 0:
-                    await status_msg.edit_text(
-                        f"🔄 Checking user subscriptions...\n\n"
-                        f"✅ Checked: {checked_count}/{len(all_users)}\n"
-                        f"🗑️ Removed: {len(removed_users)}"
-                    )
+                await reporter.update(checked_count)
                 
             except Exception as e:
                 logger.error(f"Error checking user {user_id}: {e}")
@@ -310,7 +354,7 @@ async def delete_requests_command(client: Client, message: Message):
 📝 **Note:** Removed users who left force subscription channels.
 """
         
-        await status_msg.edit_text(response_text)
+        await reporter.finish(response_text)
         
         logger.info(f"Cleanup completed: {len(removed_users)} users removed by {message.from_user.id}")
         
@@ -383,6 +427,8 @@ async def confirm_clear_fsub_callback(client: Client, callback_query: CallbackQu
         # Clear all channels
         for channel_id in force_sub_channels:
             await client.db.remove_force_sub_channel(channel_id)
+            await invite_links.forget(channel_id)
+            chat_cache.pop(channel_id)
         
         await callback_query.message.edit_text(
             f"✅ **All Channels Cleared!**\n\n"
@@ -438,3 +484,36 @@ async def refresh_fsub_settings_callback(client: Client, callback_query: Callbac
     
     await callback_query.answer("🔄 Settings refreshed!")
     await list_channels_command(client, callback_query.message)
+
+# Membership cache invalidation
+MEMBER_STATUSES = {ChatMemberStatus.OWNER, ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.MEMBER}
+
+@Client.on_chat_member_updated()
+async def member_updated_handler(client: Client, update: ChatMemberUpdated):
+    """Keep cached force-sub answers in step with joins and leaves"""
+    member = update.new_chat_member or update.old_chat_member
+    if not member or not member.user:
+        return
+    if update.chat.id not in await client.db.get_force_sub_channels():
+        return
+    
+    # Joined or gone, the request is no longer pending
+    await client.db.del_req_user(update.chat.id, member.user.id)
+    if update.new_chat_member and update.new_chat_member.status in MEMBER_STATUSES:
+        # The update already says they are in; no need to ask Telegram again
+        membership_cache.invalidate((update.chat.id, member.user.id), True)
+    else:
+        membership_cache.invalidate((update.chat.id, member.user.id))
+
+@Client.on_chat_join_request()
+async def join_request_handler(client: Client, request: ChatJoinRequest):
+    """A pending join request counts as joined for request-mode channels"""
+    if request.chat.id not in await client.db.get_force_sub_channels():
+        return
+    key = (request.chat.id, request.from_user.id)
+    if await client.db.get_channel_mode(request.chat.id) == "on":
+        # Stored, so is_sub still finds it once the cached answer expires
+        await client.db.req_user(request.chat.id, request.from_user.id)
+        membership_cache.invalidate(key, True)
+    else:
+        membership_cache.invalidate(key)
@@ -8,7 +8,7 @@ import logging
 from pyrogram import Client, filters
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 from config import Config
-from helper_func import encode, get_name, get_media_file_size, get_file_type, get_hash, get_size
+from helper_func import encode_link, get_name, get_media_file_size, get_file_type, get_hash, get_media_file_id, get_size
 from shortener import shortener
 import re
 
@@ -50,45 +50,48 @@ async def genlink_command(client: Client, message: Message):
             await message.reply_text("❌ Invalid post link format!")
             return
         
-        # Get the message from channel
-        try:
-            channel_msg = await client.get_messages(channel_id, message_id)
-        except Exception as e:
-            await message.reply_text(f"❌ Error accessing the post: {str(e)}\n\nMake sure I'm added as admin in the channel!")
-            return
-        
-        if not channel_msg:
-            await message.reply_text("❌ Post not found!")
-            return
-        
-        # Check if message has media
-        if not (channel_msg.document or channel_msg.video or channel_msg.audio or 
-                channel_msg.photo or channel_msg.animation or channel_msg.voice or 
-                channel_msg.video_note or channel_msg.sticker):
-            await message.reply_text("❌ The post doesn't contain any media file!")
-            return
-        
-        # Prepare file data
-        file_data = {
-            'user_id': user_id,
-            'channel_id': channel_id,
-            'message_id': message_id,
-            'file_name': get_name(channel_msg),
-            'file_size': get_media_file_size(channel_msg),
-            'file_type': get_file_type(channel_msg),
-            'file_hash': get_hash(channel_msg),
-            'post_link': post_link,
-            'upload_date': channel_msg.date.strftime("%Y-%m-%d %H:%M:%S") if channel_msg.date else "Unknown"
-        }
-        
-        # Add human readable file size
-        file_data['file_size_human'] = get_size(file_data['file_size'])
-        
-        # Save file to database
-        file_id = await client.db.save_file("", file_data)
+        # A post that already has a link is answered from the index
+        existing = await client.db.find_file_by_location(channel_id, message_id)
+        if existing:
+            file_id, file_data = existing
+        else:
+            # Get the message from channel
+            try:
+                channel_msg = await client.get_messages(channel_id, message_id)
+            except Exception as e:
+                await message.reply_text(f"❌ Error accessing the post: {str(e)}\n\nMake sure I'm added as admin in the channel!")
+                return
+            
+            if not channel_msg:
+                await message.reply_text("❌ Post not found!")
+                return
+            
+            # Check if message has media
+            if not (channel_msg.document or channel_msg.video or channel_msg.audio or 
+                    channel_msg.photo or channel_msg.animation or channel_msg.voice or 
+                    channel_msg.video_note or channel_msg.sticker):
+                await message.reply_text("❌ The post doesn't contain any media file!")
+                return
+            
+            # Prepare file data
+            file_data = {
+                'user_id': user_id,
+                'channel_id': channel_id,
+                'message_id': message_id,
+                'file_name': get_name(channel_msg),
+                'file_size': get_media_file_size(channel_msg),
+                'file_type': get_file_type(channel_msg),
+                'file_hash': get_hash(channel_msg),
+                'media_file_id': get_media_file_id(channel_msg),
+                'post_link': post_link,
+                'upload_date': channel_msg.date
+            }
+            
+            # Save file to database
+            file_id = await client.db.save_file("", file_data)
         
         # Generate shareable link
-        encoded_data = encode(file_id)
+        encoded_data = encode_link(file_id)
         share_link = f"https://t.me/{client.username}?start={encoded_data}"
         
         # Apply URL shortener if enabled
@@ -99,9 +102,9 @@ async def genlink_command(client: Client, message: Message):
 ✅ **Link Generated Successfully!**
 
 📁 **File Name:** `{file_data['file_name']}`
-📊 **File Size:** `{file_data['file_size_human']}`
+📊 **File Size:** `{get_size(file_data['file_size'])}`
 📂 **File Type:** `{file_data['file_type'].title()}`
-📅 **Date:** `{file_data['upload_date']}`
+📅 **Date:** `{file_data['upload_date'] or 'Unknown'}`
 
 🔗 **Shareable Link:**
 `{share_link}`
@@ -234,17 +237,15 @@ async def link_reply_command(client: Client, message: Message):
             'file_size': get_media_file_size(replied_message),
             'file_type': get_file_type(replied_message),
             'file_hash': get_hash(replied_message),
-            'upload_date': replied_message.date.strftime("%Y-%m-%d %H:%M:%S") if replied_message.date else "Unknown"
+            'media_file_id': get_media_file_id(replied_message),
+            'upload_date': replied_message.date
         }
         
-        # Add human readable file size
-        file_data['file_size_human'] = get_size(file_data['file_size'])
-        
         # Save file to database
         file_id = await client.db.save_file("", file_data)
         
         # Generate shareable link
-        encoded_data = encode(file_id)
+        encoded_data = encode_link(file_id)
         share_link = f"https://t.me/{client.username}?start={encoded_data}"
         
         # Apply URL shortener if enabled
@@ -255,9 +256,9 @@ async def link_reply_command(client: Client, message: Message):
 ✅ **Link Generated Successfully!**
 
 📁 **File Name:** `{file_data['file_name']}`
-📊 **File Size:** `{file_data['file_size_human']}`
+📊 **File Size:** `{get_size(file_data['file_size'])}`
 📂 **File Type:** `{file_data['file_type'].title()}`
-📅 **Date:** `{file_data['upload_date']}`
+📅 **Date:** `{file_data['upload_date'] or 'Unknown'}`
 
 🔗 **Shareable Link:**
 `{share_link}`
@@ -7,26 +7,31 @@ Start command and file handling plugin
 import logging
 import asyncio
 import random
-from datetime import datetime, timedelta
-from pyrogram import Client, filters, __version__
+from itertools import groupby
+from pyrogram import Client, filters, raw, __version__
 from pyrogram.enums import ParseMode, ChatAction
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
-from pyrogram.errors import FloodWait, UserIsBlocked, InputUserDeactivated, UserNotParticipant
+from pyrogram.errors import (
+    FloodWait, UserIsBlocked, InputUserDeactivated, UserNotParticipant,
+    FileReferenceExpired, FileReferenceInvalid
+)
 from config import Config
 from helper_func import (
-    encode, decode, get_name, get_media_file_size, get_hash, 
-    get_file_type, is_subscribed, get_start_message, get_messages,
-    get_exp_time, CUSTOM_CAPTION, DISABLE_CHANNEL_BUTTON, PROTECT_CONTENT,
-    START_PIC, START_MSG, FORCE_PIC, FORCE_MSG, CMD_TXT, FSUB_LINK_EXPIRY,
-    BAN_SUPPORT
+    encode_link, decode_link, get_name, get_media_file_size, get_hash, get_media_file_id, get_size,
+    get_file_type, is_subscribed, check_subscriptions, get_messages, get_range_files,
+    get_channel_message, message_cache, get_chat_info, get_exp_time
 )
 from shortener import shortener
-from database.database import db
+from auto_delete import auto_delete
+from invite_links import invite_links
 
 logger = logging.getLogger(__name__)
 
-# Create a global dictionary to store chat data
-chat_data_cache = {}
+async def get_delete_delay(client: Client) -> int:
+    """Seconds before delivered files are deleted, 0 when auto delete is off"""
+    if not await client.db.is_auto_delete_enabled():
+        return 0
+    return await client.db.get_auto_delete_time()
 
 @Client.on_message(filters.command("start") & filters.private)
 async def start_command(client: Client, message: Message):
@@ -35,27 +40,31 @@ async def start_command(client: Client, message: Message):
     first_name = message.from_user.first_name
     
     # Add user to database if not present
-    if not await db.present_user(user_id):
+    if not await client.db.is_user_exist(user_id):
         try:
-            await db.add_user(user_id)
+            await client.db.add_user(user_id)
         except Exception as e:
             logger.error(f"Error adding user {user_id}: {e}")
     
+    # A user who writes to the bot is active and can be reached by broadcasts again
+    await client.db.touch_user(user_id)
+    await client.db.clear_dead_peers([user_id])
+    
     # Check if user is banned
-    banned_users = await db.get_ban_users()
-    if user_id in banned_users:
+    if await client.db.is_user_banned(user_id):
         await message.reply_text(
             "<b>⛔️ You are Banned from using this bot.</b>\n\n"
             "<i>Contact support if you think this is a mistake.</i>",
             reply_markup=InlineKeyboardMarkup(
-                [[InlineKeyboardButton("Contact Support", url=BAN_SUPPORT)]]
+                [[InlineKeyboardButton("Contact Support", url=Config.BAN_SUPPORT)]]
             )
         )
         return
     
     # Check force subscription
-    if not await is_subscribed(client, user_id):
-        await not_joined(client, message)
+    subscriptions = await check_subscriptions(client, user_id)
+    if not all(subscriptions.values()):
+        await not_joined(client, message, subscriptions)
         return
     
     # Handle file/batch access if parameter provided
@@ -76,8 +85,8 @@ async def start_command(client: Client, message: Message):
     # Send photo with start message
     try:
         await message.reply_photo(
-            photo=START_PIC,
-            caption=START_MSG.format(
+            photo=random.choice(Config.PICS),
+            caption=Config.START_MESSAGE.format(
                 first=message.from_user.first_name,
                 last=message.from_user.last_name,
                 username=None if not message.from_user.username else '@' + message.from_user.username,
@@ -90,7 +99,7 @@ async def start_command(client: Client, message: Message):
     except Exception as e:
         logger.error(f"Error sending start message: {e}")
         await message.reply_text(
-            START_MSG.format(
+            Config.START_MESSAGE.format(
                 first=message.from_user.first_name,
                 last=message.from_user.last_name,
                 username=None if not message.from_user.username else '@' + message.from_user.username,
@@ -106,21 +115,21 @@ async def handle_file_access(client: Client, message: Message, data: str):
     
     try:
         # Decode the data
-        decoded_data = decode(data)
+        decoded_data = decode_link(data)
         
         if decoded_data.startswith("file_"):
             # Single file access
-            file_data = await db.get_file(decoded_data)
+            file_data = await client.db.get_file(decoded_data)
             if not file_data:
                 await message.reply_text("❌ File not found or expired!")
                 return
             
             # Send the file
-            await send_file_to_user(client, message, file_data)
+            await send_file_to_user(client, message, file_data, decoded_data)
             
         elif decoded_data.startswith("batch_"):
             # Batch access
-            batch_data = await db.get_batch(decoded_data)
+            batch_data = await client.db.get_batch(decoded_data)
             if not batch_data:
                 await message.reply_text("❌ Batch not found or expired!")
                 return
@@ -169,17 +178,17 @@ async def handle_legacy_format(client: Client, message: Message, string: str):
 
     codeflix_msgs = []
     for msg in messages:
-        caption = (CUSTOM_CAPTION.format(previouscaption="" if not msg.caption else msg.caption.html, 
-                                         filename=msg.document.file_name) if bool(CUSTOM_CAPTION) and bool(msg.document)
+        caption = (Config.CUSTOM_CAPTION.format(previouscaption="" if not msg.caption else msg.caption.html, 
+                                         filename=msg.document.file_name) if bool(Config.CUSTOM_CAPTION) and bool(msg.document)
                    else ("" if not msg.caption else msg.caption.html))
-        reply_markup = msg.reply_markup if DISABLE_CHANNEL_BUTTON else None
+        reply_markup = msg.reply_markup if Config.DISABLE_CHANNEL_BUTTON else None
         try:
             copied_msg = await msg.copy(
                 chat_id=message.from_user.id,
                 caption=caption,
                 parse_mode=ParseMode.HTML,
                 reply_markup=reply_markup,
-                protect_content=PROTECT_CONTENT
+                protect_content=Config.PROTECT_CONTENT
             )
             await asyncio.sleep(0.1)
             codeflix_msgs.append(copied_msg)
@@ -187,196 +196,253 @@ async def handle_legacy_format(client: Client, message: Message, string: str):
             logger.error(f"Failed to send message: {e}")
 
     # Schedule auto-delete if enabled
-    FILE_AUTO_DELETE = await db.get_del_timer()
+    FILE_AUTO_DELETE = await get_delete_delay(client)
     if FILE_AUTO_DELETE > 0:
         notification_msg = await message.reply(
             f"<b>This file will be deleted in {get_exp_time(FILE_AUTO_DELETE)}. Please save or forward it to your saved messages before it gets deleted.</b>"
         )
-        reload_url = f"https://t.me/{client.username}?start={message.command[1]}"
-        asyncio.create_task(
-            schedule_auto_delete(client, codeflix_msgs, notification_msg, FILE_AUTO_DELETE, reload_url)
+        await auto_delete.schedule(
+            message.chat.id, [msg.id for msg in codeflix_msgs], FILE_AUTO_DELETE,
+            notification_id=notification_msg.id, start_payload=message.command[1]
         )
 
-async def send_file_to_user(client: Client, message: Message, file_data: dict):
+async def send_file_to_user(client: Client, message: Message, file_data: dict, file_id: str = None):
     """Send a single file to user"""
     try:
-        channel_id = file_data['channel_id']
-        message_id = file_data['message_id']
-        
-        # Get the file message from channel
-        file_msg = await client.get_messages(channel_id, message_id)
-        
-        if not file_msg:
-            await message.reply_text("❌ File not found in channel!")
-            return
-        
-        # Copy the file to user
         caption = f"📁 **File Name:** `{file_data.get('file_name', 'Unknown')}`\n"
         caption += f"📊 **Size:** `{file_data.get('file_size_human', 'Unknown')}`\n"
         caption += f"📅 **Uploaded:** `{file_data.get('upload_date', 'Unknown')}`\n\n"
         caption += "**Powered by:** @YourBotUsername"
         
-        await file_msg.copy(
-            chat_id=message.chat.id,
-            caption=caption,
-            protect_content=PROTECT_CONTENT
-        )
+        # Send straight from the stored file_id, without looking the post up first
+        sent_msg = None
+        media_file_id = file_data.get('media_file_id')
+        if media_file_id:
+            try:
+                sent_msg = await client.send_cached_media(
+                    chat_id=message.chat.id,
+                    file_id=media_file_id,
+                    caption=caption,
+                    protect_content=Config.PROTECT_CONTENT
+                )
+            except (FileReferenceExpired, FileReferenceInvalid) as e:
+                logger.info(f"Stored file_id of {file_id} is stale ({e.ID}), refetching the post")
+                # A cached copy of the post would carry the same stale reference
+                message_cache.pop((file_data['channel_id'], file_data['message_id']))
+        
+        if sent_msg is None:
+            # Get the file message from channel
+            file_msg = await get_channel_message(client, file_data['channel_id'], file_data['message_id'])
+            
+            if not file_msg or file_msg.empty:
+                await message.reply_text("❌ File not found in channel!")
+                return
+            
+            # Copy the file to user
+            sent_msg = await file_msg.copy(
+                chat_id=message.chat.id,
+                caption=caption,
+                protect_content=Config.PROTECT_CONTENT
+            )
+            
+            # Refresh the stored reference so the next access takes the fast path again
+            fresh_file_id = get_media_file_id(file_msg)
+            if file_id and fresh_file_id and fresh_file_id != media_file_id:
+                await client.db.update_file_media(file_id, fresh_file_id)
         
         # Schedule auto-delete if enabled
-        FILE_AUTO_DELETE = await db.get_del_timer()
+        FILE_AUTO_DELETE = await get_delete_delay(client)
         if FILE_AUTO_DELETE > 0:
             notification_msg = await message.reply(
                 f"<b>This file will be deleted in {get_exp_time(FILE_AUTO_DELETE)}. Please save or forward it to your saved messages before it gets deleted.</b>"
             )
-            reload_url = f"https://t.me/{client.username}?start={message.command[1]}"
-            asyncio.create_task(
-                schedule_auto_delete(client, [file_msg], notification_msg, FILE_AUTO_DELETE, reload_url)
+            await auto_delete.schedule(
+                message.chat.id, [sent_msg.id], FILE_AUTO_DELETE,
+                notification_id=notification_msg.id, start_payload=message.command[1]
             )
         
     except Exception as e:
         logger.error(f"Error sending file to user: {e}")
         await message.reply_text("❌ Error sending file!")
 
+# Most message IDs a single messages.ForwardMessages call accepts
+FORWARD_CHUNK = 100
+
+async def forward_batch_files(client: Client, chat_id: int, files: list) -> tuple:
+    """Forward files in bulk, one call per run of up to 100 posts from the same channel
+
+    Client.forward_messages cannot hide the author, so messages.ForwardMessages
+    is invoked directly with drop_author. Returns the sent messages and the
+    number of files that failed.
+    """
+    sent = []
+    failed = 0
+    to_peer = await client.resolve_peer(chat_id)
+    for channel_id, run in groupby(files, key=lambda f: f[0]):
+        message_ids = [f[1] for f in run]
+        try:
+            from_peer = await client.resolve_peer(channel_id)
+        except Exception as e:
+            failed += len(message_ids)
+            logger.error(f"Error resolving channel {channel_id}: {e}")
+            continue
+
+        for start in range(0, len(message_ids), FORWARD_CHUNK):
+            chunk = message_ids[start:start + FORWARD_CHUNK]
+            forward = lambda: client.invoke(
+                raw.functions.messages.ForwardMessages(
+                    from_peer=from_peer,
+                    to_peer=to_peer,
+                    id=chunk,
+                    random_id=[client.rnd_id() for _ in chunk],
+                    drop_author=True,
+                    noforwards=Config.PROTECT_CONTENT or None
+                )
+            )
+            try:
+                try:
+                    updates = await forward()
+                except FloodWait as e:
+                    await asyncio.sleep(e.value)
+                    updates = await forward()
+                # Posts that no longer exist are skipped without an error
+                msgs = [
+                    update.message for update in updates.updates
+                    if isinstance(update, (raw.types.UpdateNewMessage, raw.types.UpdateNewChannelMessage))
+                ]
+                sent.extend(msgs)
+                failed += len(chunk) - len(msgs)
+            except Exception as e:
+                failed += len(chunk)
+                logger.error(f"Error forwarding messages {chunk[0]}-{chunk[-1]} from {channel_id}: {e}")
+    return sent, failed
+
+async def copy_batch_files(client: Client, chat_id: int, files: list) -> tuple:
+    """Copy files one by one with a per-file caption
+
+    Returns the sent messages and the number of files that failed.
+    """
+    sent = []
+    failed = 0
+    for i, (channel_id, message_id, file_name, file_size) in enumerate(files, 1):
+        caption = f"📁 **File {i}/{len(files)}**\n"
+        caption += f"**Name:** `{file_name}`\n"
+        caption += f"**Size:** `{get_size(file_size)}`"
+        
+        copy = lambda: client.copy_message(
+            chat_id=chat_id,
+            from_chat_id=channel_id,
+            message_id=message_id,
+            caption=caption,
+            protect_content=Config.PROTECT_CONTENT
+        )
+        try:
+            try:
+                copied_msg = await copy()
+            except FloodWait as e:
+                await asyncio.sleep(e.value)
+                copied_msg = await copy()
+            sent.append(copied_msg)
+        except Exception as e:
+            failed += 1
+            logger.error(f"Error sending file {i}: {e}")
+    return sent, failed
+
 async def send_batch_to_user(client: Client, message: Message, batch_data: dict):
     """Send batch files to user"""
     try:
-        file_ids = batch_data.get('file_ids', [])
+        # Collect (channel_id, message_id, name, size) for every file in the batch
+        if batch_data.get('batch_type') == 'range':
+            # Range batches are resolved on access, through the cache shared by every user of the link
+            range_files = await get_range_files(
+                client, batch_data['channel_id'],
+                batch_data['first_message_id'], batch_data['last_message_id']
+            )
+            files = [(batch_data['channel_id'], *range_file) for range_file in range_files]
+        else:
+            files = []
+            for file_id in batch_data.get('file_ids', []):
+                file_data = await client.db.get_file(file_id)
+                if file_data:
+                    files.append((file_data['channel_id'], file_data['message_id'],
+                                  file_data.get('file_name', 'Unknown'), file_data.get('file_size', 0)))
         
-        if not file_ids:
+        if not files:
             await message.reply_text("❌ No files found in this batch!")
             return
         
-        await message.reply_text(f"📦 **Batch Files:** {len(file_ids)} files\n\nSending files...")
+        await message.reply_text(f"📦 **Batch Files:** {len(files)} files\n\nSending files...")
         
-        codeflix_msgs = []
-        for i, file_id in enumerate(file_ids, 1):
-            file_data = await db.get_file(file_id)
-            if file_data:
-                try:
-                    channel_id = file_data['channel_id']
-                    message_id = file_data['message_id']
-                    
-                    file_msg = await client.get_messages(channel_id, message_id)
-                    if file_msg:
-                        caption = f"📁 **File {i}/{len(file_ids)}**\n"
-                        caption += f"**Name:** `{file_data.get('file_name', 'Unknown')}`\n"
-                        caption += f"**Size:** `{file_data.get('file_size_human', 'Unknown')}`"
-                        
-                        copied_msg = await file_msg.copy(
-                            chat_id=message.chat.id,
-                            caption=caption,
-                            protect_content=PROTECT_CONTENT
-                        )
-                        codeflix_msgs.append(copied_msg)
-                        
-                        # Small delay between files
-                        await asyncio.sleep(0.5)
-                        
-                except Exception as e:
-                    logger.error(f"Error sending file {i}: {e}")
-                    continue
+        if Config.BATCH_FILE_CAPTIONS:
+            codeflix_msgs, failed = await copy_batch_files(client, message.chat.id, files)
+        else:
+            codeflix_msgs, failed = await forward_batch_files(client, message.chat.id, files)
         
-        await message.reply_text("✅ All files sent successfully!")
+        if not failed:
+            await message.reply_text("✅ All files sent successfully!")
+        elif codeflix_msgs:
+            await message.reply_text(f"⚠️ Sent {len(codeflix_msgs)} of {len(files)} files, {failed} could not be sent.")
+        else:
+            await message.reply_text("❌ None of the batch files could be sent!")
+            return
         
         # Schedule auto-delete if enabled
-        FILE_AUTO_DELETE = await db.get_del_timer()
+        FILE_AUTO_DELETE = await get_delete_delay(client)
         if FILE_AUTO_DELETE > 0:
             notification_msg = await message.reply(
                 f"<b>These files will be deleted in {get_exp_time(FILE_AUTO_DELETE)}. Please save or forward them to your saved messages before they get deleted.</b>"
             )
-            reload_url = f"https://t.me/{client.username}?start={message.command[1]}"
-            asyncio.create_task(
-                schedule_auto_delete(client, codeflix_msgs, notification_msg, FILE_AUTO_DELETE, reload_url)
+            await auto_delete.schedule(
+                message.chat.id, [msg.id for msg in codeflix_msgs], FILE_AUTO_DELETE,
+                notification_id=notification_msg.id, start_payload=message.command[1]
             )
         
     except Exception as e:
         logger.error(f"Error sending batch to user: {e}")
         await message.reply_text("❌ Error sending batch files!")
 
-async def schedule_auto_delete(client, messages, notification_msg, delay, reload_url):
-    """Schedule message deletion after delay"""
-    try:
-        await asyncio.sleep(delay)
-        
-        # Delete all messages
-        delete_tasks = []
-        for msg in messages:
-            if msg:
-                delete_tasks.append(msg.delete())
-        
-        if delete_tasks:
-            await asyncio.gather(*delete_tasks, return_exceptions=True)
-        
-        # Update notification with retry option if URL provided
-        if reload_url:
-            try:
-                keyboard = InlineKeyboardMarkup(
-                    [[InlineKeyboardButton("ɢᴇᴛ ғɪʟᴇ ᴀɢᴀɪɴ!", url=reload_url)]]
-                )
-                await notification_msg.edit(
-                    "<b>ʏᴏᴜʀ ᴠɪᴅᴇᴏ / ꜰɪʟᴇ ɪꜱ ꜱᴜᴄᴄᴇꜱꜱꜰᴜʟʟʏ ᴅᴇʟᴇᴛᴇᴅ !!\n\nᴄʟɪᴄᴋ ʙᴇʟᴏᴡ ʙᴜᴛᴛᴏɴ ᴛᴏ ɢᴇᴛ ʏᴏᴜʀ ᴅᴇʟᴇᴛᴇᴅ ᴠɪᴅᴇᴏ / ꜰɪʟᴇ 👇</b>",
-                    reply_markup=keyboard
-                )
-            except Exception as e:
-                logger.error(f"Error updating notification: {e}")
-        
-    except Exception as e:
-        logger.error(f"Error in auto-delete: {e}")
-
-async def not_joined(client: Client, message: Message):
-    """Handle force subscription requirement"""
+async def not_joined(client: Client, message: Message, subscriptions: dict = None):
+    """Handle force subscription requirement
+    
+    subscriptions is the channel -> joined map from check_subscriptions;
+    it is only computed here when the caller did not already do so.
+    """
     temp = await message.reply("<b><i>ᴡᴀɪᴛ ᴀ sᴇᴄ..</i></b>")
 
     user_id = message.from_user.id
     buttons = []
-    count = 0
+
+    async def channel_button(chat_id):
+        mode = await client.db.get_channel_mode(chat_id)  # fetch mode 
+        data = await get_chat_info(client, chat_id)
+
+        name = data.title
+
+        # Public channels link by username; private ones take a pooled invite link
+        if data.username:
+            link = f"https://t.me/{data.username}"
+        else:
+            link = await invite_links.get(client, chat_id, join_request=mode == "on")
+
+        return [InlineKeyboardButton(text=name, url=link)]
 
     try:
-        all_channels = await db.show_channels()  # Should return list of (chat_id, mode) tuples
-        for chat_id in all_channels:
-            mode = await db.get_channel_mode(chat_id)  # fetch mode 
+        await message.reply_chat_action(ChatAction.TYPING)
 
-            await message.reply_chat_action(ChatAction.TYPING)
+        if subscriptions is None:
+            subscriptions = await check_subscriptions(client, user_id)
+        missing = [chat_id for chat_id, joined in subscriptions.items() if not joined]
 
-            if not await is_subscribed(client, user_id, chat_id):
-                try:
-                    # Cache chat info
-                    if chat_id in chat_data_cache:
-                        data = chat_data_cache[chat_id]
-                    else:
-                        data = await client.get_chat(chat_id)
-                        chat_data_cache[chat_id] = data
-
-                    name = data.title
-
-                    # Generate proper invite link based on the mode
-                    if mode == "on" and not data.username:
-                        invite = await client.create_chat_invite_link(
-                            chat_id=chat_id,
-                            creates_join_request=True,
-                            expire_date=datetime.utcnow() + timedelta(seconds=FSUB_LINK_EXPIRY) if FSUB_LINK_EXPIRY else None
-                            )
-                        link = invite.invite_link
-
-                    else:
-                        if data.username:
-                            link = f"https://t.me/{data.username}"
-                        else:
-                            invite = await client.create_chat_invite_link(
-                                chat_id=chat_id,
-                                expire_date=datetime.utcnow() + timedelta(seconds=FSUB_LINK_EXPIRY) if FSUB_LINK_EXPIRY else None)
-                            link = invite.invite_link
-
-                    buttons.append([InlineKeyboardButton(text=name, url=link)])
-                    count += 1
-                    await temp.edit(f"<b>{'! ' * count}</b>")
-
-                except Exception as e:
-                    logger.error(f"Error with chat {chat_id}: {e}")
-                    return await temp.edit(
-                        f"<b><i>! Error, Contact developer to solve the issues</i></b>\n"
-                        f"<blockquote expandable><b>Reason:</b> {e}</blockquote>"
-                    )
+        # Resolve every missing channel's button at once
+        results = await asyncio.gather(*(channel_button(chat_id) for chat_id in missing), return_exceptions=True)
+        for chat_id, result in zip(missing, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error with chat {chat_id}: {result}")
+                return await temp.edit(
+                    f"<b><i>! Error, Contact developer to solve the issues</i></b>\n"
+                    f"<blockquote expandable><b>Reason:</b> {result}</blockquote>"
+                )
+            buttons.append(result)
 
         # Retry Button
         try:
@@ -390,8 +456,8 @@ async def not_joined(client: Client, message: Message):
             pass
 
         await message.reply_photo(
-            photo=FORCE_PIC,
-            caption=FORCE_MSG.format(
+            photo=random.choice(Config.PICS),
+            caption=Config.FORCE_SUB_MESSAGE.format(
                 first=message.from_user.first_name,
                 last=message.from_user.last_name,
                 username=None if not message.from_user.username else '@' + message.from_user.username,
@@ -426,7 +492,7 @@ async def refresh_force_sub(client: Client, callback_query: CallbackQuery):
 @Client.on_message(filters.command('commands') & filters.private)
 async def commands_handler(client: Client, message: Message):        
     reply_markup = InlineKeyboardMarkup([[InlineKeyboardButton("• ᴄʟᴏsᴇ •", callback_data="close")]])
-    await message.reply(text=CMD_TXT, reply_markup=reply_markup, quote=True)
+    await message.reply(text=Config.COMMANDS_MESSAGE, reply_markup=reply_markup, quote=True)
 
 @Client.on_message(filters.private & filters.media & ~filters.command(['start']))
 async def handle_private_media(client: Client, message: Message):
@@ -434,7 +500,7 @@ async def handle_private_media(client: Client, message: Message):
     user_id = message.from_user.id
     
     # Check if user is admin or owner
-    if not await db.is_admin(user_id):
+    if not await client.db.is_admin(user_id):
         await message.reply_text(
             "❌ Only admins can upload files!\n\n"
             "Use /genlink command to generate links for existing channel posts."
@@ -442,8 +508,7 @@ async def handle_private_media(client: Client, message: Message):
         return
     
     # Check if user is banned
-    banned_users = await db.get_ban_users()
-    if user_id in banned_users:
+    if await client.db.is_user_banned(user_id):
         await message.reply_text("⚠️ You are banned from using this bot!")
         return
     
@@ -454,26 +519,31 @@ async def handle_private_media(client: Client, message: Message):
         return
     
     try:
-        # Forward file to channel
-        forwarded_msg = await message.forward(Config.CHANNEL_ID)
-        
-        # Save file data
-        file_data = {
-            'user_id': user_id,
-            'channel_id': Config.CHANNEL_ID,
-            'message_id': forwarded_msg.id,
-            'file_name': get_name(message),
-            'file_size': file_size,
-            'file_size_human': f"{file_size / (1024*1024):.2f} MB" if file_size > 1024*1024 else f"{file_size / 1024:.2f} KB",
-            'file_type': get_file_type(message),
-            'file_hash': get_hash(message),
-            'upload_date': message.date.strftime("%Y-%m-%d %H:%M:%S") if message.date else "Unknown"
-        }
-        
-        file_id = await db.save_file("", file_data)
+        # Reuse the stored copy if this media was uploaded before
+        existing = await client.db.find_file_by_hash(get_hash(message))
+        if existing:
+            file_id, file_data = existing
+        else:
+            # Forward file to channel
+            forwarded_msg = await message.forward(Config.CHANNEL_ID)
+            
+            # Save file data
+            file_data = {
+                'user_id': user_id,
+                'channel_id': Config.CHANNEL_ID,
+                'message_id': forwarded_msg.id,
+                'file_name': get_name(message),
+                'file_size': file_size,
+                'file_type': get_file_type(message),
+                'file_hash': get_hash(message),
+                'media_file_id': get_media_file_id(message),
+                'upload_date': message.date
+            }
+            
+            file_id = await client.db.save_file("", file_data)
         
         # Generate link
-        encoded_data = encode(file_id)
+        encoded_data = encode_link(file_id)
         link = f"https://t.me/{client.username}?start={encoded_data}"
         
         # Apply URL shortener if enabled
@@ -486,9 +556,9 @@ async def handle_private_media(client: Client, message: Message):
         ])
         
         await message.reply_text(
-            f"✅ **File uploaded successfully!**\n\n"
+            f"{'♻️ **File already stored, reusing its link!**' if existing else '✅ **File uploaded successfully!**'}\n\n"
             f"📁 **Name:** `{file_data['file_name']}`\n"
-            f"📊 **Size:** `{file_data['file_size_human']}`\n"
+            f"📊 **Size:** `{get_size(file_data['file_size'])}`\n"
             f"🔗 **Link:** `{link}`\n\n"
             f"👆 Use the buttons above to share the file!",
             reply_markup=keyboard
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Progress reporting for long-running admin operations
+
+Operations report every step. The reporter edits the status message at
+most once per interval, skips edits that would not change anything and
+appends throughput and ETA to the text.
+"""
+
+import asyncio
+import time
+import logging
+from typing import Callable, Optional
+from pyrogram.errors import FloodWait, MessageNotModified
+from pyrogram.types import Message
+from config import Config
+from helper_func import get_readable_time
+
+logger = logging.getLogger(__name__)
+
+
+class ProgressReporter:
+    def __init__(self, message: Message, total: int, render: Callable[[], str],
+                 interval: Optional[float] = None, done: int = 0):
+        """render builds the status body; it is only called when an edit is due.
+        done is where a resumed operation starts counting from."""
+        self.message = message
+        self.total = total
+        self.render = render
+        self.interval = interval if interval is not None else Config.PROGRESS_INTERVAL
+        self.done = done
+
+        self._initial = done
+        self._started = time.monotonic()
+        self._next_edit = self._started + self.interval
+        self._last_body: Optional[str] = None
+        self._last_done: Optional[int] = None
+        self._editing: bool = False
+
+        # Metrics
+        self.edits: int = 0
+        self.skipped: int = 0
+        self.flood_waits: int = 0
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self._started
+
+    @property
+    def rate(self) -> float:
+        """Steps per second since this reporter started"""
+        elapsed = self.elapsed
+        return (self.done - self._initial) / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta(self) -> Optional[float]:
+        rate = self.rate
+        if not rate:
+            return None
+        return max(0, self.total - self.done) / rate
+
+    def footer(self) -> str:
+        percent = (self.done / self.total) * 100 if self.total else 100
+        eta = self.eta
+        eta_text = "calculating..." if eta is None else get_readable_time(int(eta)) or "0s"
+        return (
+            f"⏳ **Progress:** `{self.done}/{self.total}` (`{percent:.1f}%`)\n"
+            f"⚡ **Speed:** `{self.rate:.1f}/s`\n"
+            f"🕒 **ETA:** `{eta_text}`"
+        )
+
+    async def update(self, done: Optional[int] = None, advance: int = 0):
+        """Record progress; edits the message only when the interval has passed"""
+        if done is not None:
+            self.done = done
+        self.done += advance
+
+        if self._editing or time.monotonic() < self._next_edit:
+            return
+        self._next_edit = time.monotonic() + self.interval
+
+        body = self.render()
+        if body == self._last_body and self.done == self._last_done:
+            self.skipped += 1
+            return
+        self._last_body, self._last_done = body, self.done
+        await self._edit(f"{body}\n\n{self.footer()}")
+
+    async def show(self):
+        """Edit the message right away, e.g. to replace a "please wait" text"""
+        self._next_edit = 0.0
+        await self.update()
+
+    async def finish(self, text: str, **kwargs):
+        """Show the final result; waits out a FloodWait instead of dropping it"""
+        self._next_edit = float("inf")
+        while self._editing:
+            await asyncio.sleep(0.05)
+        await self._edit(text, final=True, **kwargs)
+
+    async def _edit(self, text: str, final: bool = False, **kwargs):
+        self._editing = True
+        try:
+            for _ in range(2 if final else 1):
+                try:
+                    await self.message.edit_text(text, **kwargs)
+                    self.edits += 1
+                    return
+                except MessageNotModified:
+                    return
+                except FloodWait as e:
+                    self.flood_waits += 1
+                    if not final:
+                        # Drop this update; the next one goes out once the wait is over
+                        self._next_edit = time.monotonic() + e.value
+                        return
+                    await asyncio.sleep(e.value)
+        except Exception as e:
+            logger.error(f"Error updating progress message: {e}")
+        finally:
+            self._editing = False
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Rate limiting for bulk Telegram API work
+"""
+
+import asyncio
+import time
+from typing import Dict, Optional
+from config import Config
+
+
+class TokenBucket:
+    """Async token bucket shared by everything that makes bulk API calls
+
+    A FloodWait reported by any caller pauses the whole bucket, so other
+    workers stop instead of running into the same limit.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        # Waiters are served in arrival order
+        self._lock = asyncio.Lock()
+
+        # Metrics
+        self.acquired: int = 0
+        self.flood_waits: int = 0
+        self.waited: float = 0.0
+
+    async def acquire(self, tokens: float = 1):
+        """Wait until tokens are available and take them"""
+        started = time.monotonic()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    break
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+        self.acquired += 1
+        self.waited += time.monotonic() - started
+
+    def pause(self, seconds: float):
+        """Stop handing out tokens for the given time (e.g. after a FloodWait)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+        # Refill starts when the pause ends, not from the last acquire
+        self._updated = self._paused_until
+        self.flood_waits += 1
+
+    def stats(self) -> Dict:
+        """Get limiter statistics"""
+        return {
+            'rate': self.rate,
+            'acquired': self.acquired,
+            'flood_waits': self.flood_waits,
+            'waited': self.waited,
+            'paused': max(0.0, self._paused_until - time.monotonic())
+        }
+
+
+# Global limiter for bulk API calls
+api_limiter = TokenBucket(Config.API_RATE_LIMIT, Config.API_BURST)
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Expiry reap benchmark for the in-memory store
+
+Fills the store with files of which a small share is due, then times a
+reap pass through the expiry heap, an idle pass with nothing due, and
+the full scan over every record that cleanup used to do. Run it from the
+repository root:
+
+    python scripts/bench_expiry.py [due_percent] [record counts...]
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.database import Database
+from database.records import FileRecord
+
+
+def fill(db: Database, records: int, due_percent: float):
+    now = time.time()
+    due = int(records * due_percent / 100)
+    for i in range(records):
+        # The first `due` records are older than the auto delete time
+        created_at = now - db.auto_delete_time - 1 - i % 60 if i < due else now - i % 60
+        db._store_file(f"file_{i}", FileRecord(
+            user_id=1000 + i % 500, channel_id=-1001234567890, message_id=i,
+            file_name=f"file_{i}.mkv", file_size=1024, file_type="document",
+            created_at=created_at,
+        ))
+
+
+def full_scan(db: Database) -> list:
+    cutoff = time.time() - db.auto_delete_time
+    return [file_id for file_id, record in db.files.items() if record.created_at < cutoff]
+
+
+async def run(records: int, due_percent: float) -> dict:
+    db = Database()
+    fill(db, records, due_percent)
+
+    started = time.perf_counter()
+    expired = full_scan(db)
+    scan_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    deleted = await db.cleanup_expired_files()
+    reap_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    await db.cleanup_expired_files()
+    idle_time = time.perf_counter() - started
+
+    assert deleted == len(expired)
+    return {'deleted': deleted, 'reap': reap_time, 'idle': idle_time, 'scan': scan_time}
+
+
+async def main():
+    due_percent = float(sys.argv[1]) if len(sys.argv) > 1 else 1
+    counts = [int(arg) for arg in sys.argv[2:]] or [10000, 100000, 500000]
+
+    print(f"{due_percent:g}% of records due")
+    print(f"{'records':>8}  {'deleted':>8}  {'reap':>10}  {'idle pass':>10}  {'full scan':>10}")
+    for records in counts:
+        result = await run(records, due_percent)
+        print(f"{records:>8}  {result['deleted']:>8}  {result['reap'] * 1000:>8.1f}ms  "
+              f"{result['idle'] * 1e6:>8.0f}us  {result['scan'] * 1000:>8.1f}ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
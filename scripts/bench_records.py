@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Per-record memory of the file store, measured with tracemalloc
+
+Builds the same channel-post files as the dicts the plugins used to store
+(derived size and date strings included) and as FileRecord objects, and
+reports the traced bytes per record. Two payloads are measured:
+
+- realistic: every record has its own name, hash and date strings
+- container: payload values are shared, so only the container and the
+  derived fields count
+
+Run it from the repository root:
+
+    python scripts/bench_records.py [records]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.records import DATE_FORMAT, FileRecord, format_size
+
+CHANNEL_ID = -1001234567890
+SHARED_NAME = "shared_file_name.mkv"
+SHARED_HASH = "AgADshared_unique_file_id"
+
+
+def payload(index: int, shared: bool) -> dict:
+    return {
+        'user_id': 0,
+        'channel_id': CHANNEL_ID,
+        'message_id': index,
+        'file_name': SHARED_NAME if shared else f"Some.Show.S01E{index % 100:02d}.{index}.1080p.mkv",
+        'file_size': 1024 * 1024 + index,
+        'file_type': "document",
+        'file_hash': SHARED_HASH if shared else f"AgAD{index:020d}",
+        'auto_generated': True,
+        'upload_ts': 1700000000 + index,
+    }
+
+
+def old_record(index: int, shared: bool) -> dict:
+    data = payload(index, shared)
+    data['upload_date'] = datetime.fromtimestamp(data.pop('upload_ts')).strftime(DATE_FORMAT)
+    data['file_size_human'] = format_size(data['file_size'])
+    data['created_at'] = time.time()
+    data['access_count'] = 0
+    return data
+
+
+def new_record(index: int, shared: bool) -> FileRecord:
+    record = FileRecord.from_dict(payload(index, shared))
+    record.created_at = time.time()
+    return record
+
+
+def measure(build, records: int, shared: bool) -> float:
+    store = [None] * records  # allocated before tracing, like the dict slots of Database.files
+    tracemalloc.start()
+    for i in range(records):
+        store[i] = build(i, shared)
+    traced, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return traced / records
+
+
+def main():
+    records = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+    print(f"{records} records")
+    for name, shared in (("realistic", False), ("container", True)):
+        before = measure(old_record, records, shared)
+        after = measure(new_record, records, shared)
+        print(f"{name:<10} dict {before:>6.0f} B  FileRecord {after:>6.0f} B  "
+              f"({(after - before) / before * 100:+.0f}%)")
+
+
+if __name__ == "__main__":
+    main()
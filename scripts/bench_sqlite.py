@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+save_file / get_file benchmark for the database backends
+
+Runs the same workload against the in-memory store and the SQLite (WAL)
+backend and reports throughput, plus how many statements the SQLite
+writer committed. Run it from the repository root:
+
+    python scripts/bench_sqlite.py [files] [reads]
+"""
+
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.database import Database
+from database.sqlite_database import SQLiteDatabase
+
+
+def file_data(index: int) -> dict:
+    return {
+        'file_name': f"file_{index}.mkv",
+        'file_size': 1024 * index,
+        'file_type': "document",
+        'file_hash': f"hash_{index}",
+        'channel_id': -1001234567890,
+        'message_id': index,
+        'user_id': 1000 + index % 50,
+    }
+
+
+async def run(db: Database, files: int, reads: int) -> dict:
+    await db.initialize(None)
+
+    started = time.perf_counter()
+    file_ids = [await db.save_file(f"file_{i}", file_data(i)) for i in range(files)]
+    save_time = time.perf_counter() - started
+
+    # Popular links get most of the traffic; reads arrive in bursts, so the
+    # write-behind writer commits between them
+    started = time.perf_counter()
+    for i in range(reads):
+        await db.get_file(random.choice(file_ids[:max(1, files // 10)]))
+        if i % 1000 == 999:
+            await asyncio.sleep(0)
+    read_time = time.perf_counter() - started
+
+    await db.close()
+    return {'save': files / save_time, 'read': reads / read_time}
+
+
+async def main():
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    reads = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+
+    print(f"{files} save_file calls, {reads} get_file calls")
+    result = await run(Database(), files, reads)
+    print(f"memory  save {result['save']:>10,.0f}/s  get {result['read']:>10,.0f}/s")
+
+    with tempfile.TemporaryDirectory() as directory:
+        db = SQLiteDatabase(os.path.join(directory, "bench.db"))
+
+        statements = 0
+        written = 0
+        commit = db._commit
+
+        def counting_commit(ops):
+            nonlocal statements, written
+            statements += len(ops)
+            written += sum(len(str(params)) for _, params in ops)
+            commit(ops)
+
+        db._commit = counting_commit
+        db.flush_interval = 0
+        result = await run(db, files, reads)
+        print(f"sqlite  save {result['save']:>10,.0f}/s  get {result['read']:>10,.0f}/s  "
+              f"({statements} statements, {written / 1024:,.0f} KiB of parameters committed)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test configuration: config.py validates the required settings on import
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+for name, value in {
+    "API_HASH": "test",
+    "APP_ID": "1",
+    "TG_BOT_TOKEN": "test",
+    "OWNER_ID": "1",
+    "CHANNEL_ID": "-1001",
+}.items():
+    os.environ.setdefault(name, value)
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MongoDB backend tests, run against mongomock-motor
+
+    pip install pytest mongomock-motor && python -m pytest tests
+"""
+
+import asyncio
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from pymongo.errors import DuplicateKeyError
+
+from database import mongo_database
+from database.mongo_database import LOCATION_INDEX, MongoDatabase
+
+CHANNEL_ID = -1001234567890
+
+
+def file_data(message_id, **extra):
+    return {
+        'file_name': f"file_{message_id}.mkv",
+        'file_size': 1024,
+        'file_type': "document",
+        'channel_id': CHANNEL_ID,
+        'message_id': message_id,
+        'user_id': 42,
+        **extra,
+    }
+
+
+@pytest.fixture
+def make_db(monkeypatch):
+    # Databases made in one test talk to the same server
+    client = mongomock_motor.AsyncMongoMockClient()
+    monkeypatch.setattr(mongo_database, "AsyncIOMotorClient", lambda uri: client)
+
+    def make():
+        return MongoDatabase("mongodb://localhost", "test_filestore")
+
+    return make
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_location_index_is_unique_for_posts_only(make_db):
+    async def scenario():
+        db = make_db()
+        await db.initialize(None)
+        index = (await db.files_col.index_information())[LOCATION_INDEX]
+        await db.files_col.insert_one({'_id': "a", 'channel_id': CHANNEL_ID, 'message_id': 5})
+        with pytest.raises(DuplicateKeyError):
+            await db.files_col.insert_one({'_id': "b", 'channel_id': CHANNEL_ID, 'message_id': 5})
+        # Files that are not channel posts may share a null location
+        await db.files_col.insert_one({'_id': "c", 'channel_id': None, 'message_id': None})
+        await db.files_col.insert_one({'_id': "d", 'channel_id': None, 'message_id': None})
+        await db.close()
+        return index
+
+    index = run(scenario())
+    assert index['unique']
+    assert index['partialFilterExpression'] == {'message_id': {'$type': 'number'}}
+
+
+def test_non_unique_location_index_is_replaced(make_db):
+    async def scenario():
+        db = make_db()
+        await db.files_col.create_index([('channel_id', 1), ('message_id', 1)])
+        await db.initialize(None)
+        index = (await db.files_col.index_information())[LOCATION_INDEX]
+        await db.close()
+        return index
+
+    assert run(scenario())['unique']
+
+
+def test_save_file_reuses_record_of_same_post(make_db):
+    async def scenario():
+        db = make_db()
+        await db.initialize(None)
+        first = await db.save_file("", file_data(7))
+        second = await db.save_file("", file_data(7))
+        count = await db.files_col.count_documents({'message_id': 7})
+        total = db.total_files
+        await db.close()
+        return first, second, count, total
+
+    first, second, count, total = run(scenario())
+    assert first == second
+    assert count == 1
+    assert total == 1
+
+
+def test_concurrent_saves_of_same_post_store_one_record(make_db):
+    async def scenario():
+        db = make_db()
+        await db.initialize(None)
+        ids = await asyncio.gather(*(db.save_file("", file_data(9)) for _ in range(10)))
+        count = await db.files_col.count_documents({'message_id': 9})
+        await db.close()
+        return ids, count
+
+    ids, count = run(scenario())
+    assert len(set(ids)) == 1
+    assert count == 1
+
+
+def test_files_without_message_id_are_never_merged(make_db):
+    async def scenario():
+        db = make_db()
+        await db.initialize(None)
+        first = await db.save_file("", file_data(None, channel_id=None))
+        second = await db.save_file("", file_data(None, channel_id=None))
+        count = await db.files_col.count_documents({})
+        await db.close()
+        return first, second, count
+
+    first, second, count = run(scenario())
+    assert first != second
+    assert count == 2
+
+
+def test_save_files_many_deduplicates_posts(make_db):
+    async def scenario():
+        db = make_db()
+        await db.initialize(None)
+        stored = await db.save_file("", file_data(1))
+        ids = await db.save_files_many([file_data(1), file_data(2), file_data(2), file_data(None), file_data(None)])
+        count = await db.files_col.count_documents({})
+        await db.close()
+        return stored, ids, count
+
+    stored, ids, count = run(scenario())
+    assert ids[0] == stored
+    assert ids[1] == ids[2]
+    assert ids[3] != ids[4]
+    assert count == 4
+
+
+def test_get_file_buffers_read_counts(make_db):
+    async def scenario():
+        db = make_db()
+        await db.initialize(None)
+        file_id = await db.save_file("", file_data(3))
+        db.file_cache.clear()
+        for _ in range(3):
+            record = await db.get_file(file_id)
+        hits = db._file_hits[file_id]
+        await db.close()
+        return record, hits
+
+    record, hits = run(scenario())
+    assert record['file_name'] == "file_3.mkv"
+    assert record.access_count == 3
+    assert hits == 3
+
+
+def test_find_range_batch_returns_stored_range(make_db):
+    async def scenario():
+        db = make_db()
+        await db.initialize(None)
+        batch = {
+            'user_id': 42, 'channel_id': CHANNEL_ID, 'batch_type': 'range',
+            'first_message_id': 10, 'last_message_id': 20, 'total_files': 11,
+        }
+        batch_id = await db.save_batch("", batch)
+        found = await db.find_range_batch(CHANNEL_ID, 10, 20)
+        other = await db.find_range_batch(CHANNEL_ID, 10, 21)
+        await db.delete_batch(batch_id)
+        deleted = await db.find_range_batch(CHANNEL_ID, 10, 20)
+        await db.close()
+        return batch_id, found, other, deleted
+
+    batch_id, found, other, deleted = run(scenario())
+    assert found[0] == batch_id
+    assert found[1]['last_message_id'] == 20
+    assert other is None
+    assert deleted is None
+
+
+def test_find_files_by_locations_looks_up_posts_at_once(make_db):
+    async def scenario():
+        db = make_db()
+        await db.initialize(None)
+        ids = await db.save_files_many([file_data(1), file_data(2), file_data(4)])
+        found = await db.find_files_by_locations(CHANNEL_ID, [1, 2, 3, 4])
+        await db.close()
+        return ids, found
+
+    ids, found = run(scenario())
+    assert sorted(found) == [1, 2, 4]
+    assert [found[message_id][0] for message_id in (1, 2, 4)] == ids
+    assert found[4][1]['file_name'] == "file_4.mkv"
+
+
+def test_join_requests_persist_while_request_mode_is_on(make_db):
+    async def scenario():
+        db = make_db()
+        await db.initialize(None)
+        await db.set_channel_mode(CHANNEL_ID, "on")
+        await db.req_user(CHANNEL_ID, 42)
+        await db.req_user(CHANNEL_ID, 43)
+        await db.del_req_user(CHANNEL_ID, 43)
+
+        reloaded = make_db()
+        await reloaded.initialize(None)
+        loaded = (
+            await reloaded.get_channel_mode(CHANNEL_ID),
+            await reloaded.req_user_exist(CHANNEL_ID, 42),
+            await reloaded.req_user_exist(CHANNEL_ID, 43),
+        )
+
+        await reloaded.set_channel_mode(CHANNEL_ID, "off")
+        cleared = (await reloaded.get_channel_mode(CHANNEL_ID), await reloaded.req_user_exist(CHANNEL_ID, 42))
+        stored = await db.join_requests_col.count_documents({})
+        await db.close()
+        return loaded, cleared, stored
+
+    loaded, cleared, stored = run(scenario())
+    assert loaded == ("on", True, False)
+    assert cleared == ("off", False)
+    assert stored == 0